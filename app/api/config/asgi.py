@@ -17,6 +17,19 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 # is populated before importing code that may import ORM models.
 django_asgi_app = get_asgi_application()
 
+from django.conf import settings  # noqa: E402
+from secret.func import start_expiry_scheduler  # noqa: E402
+
+# Without pg_cron nothing in the database removes expired rows, so do it from here instead. Partitioned tables
+# also need upcoming partitions created ahead of time, and attachments deleted once expired, which pg_cron does not
+# do.
+if (
+    not settings.USE_PG_CRON
+    or settings.PARTITION_EXPIRING_TABLES
+    or settings.SECRET_ATTACHMENT_LOCATION
+):
+    start_expiry_scheduler()
+
 application = ProtocolTypeRouter(
     {
         "http": django_asgi_app,
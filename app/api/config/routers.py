@@ -0,0 +1,48 @@
+import random
+
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from core.base.functions.database import mark_written, recently_written
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends read-only lookups to the read replicas in `DATABASE_REPLICAS`, and everything else to `default`.
+
+    Only querysets marked with `ReplicaQuerySet.read_only()` may be read from a replica; any other read stays on
+    the primary, so a row that is read and then updated or consumed is always read where it is written. A
+    read-only lookup also stays on the primary while any of its lookup values were written in the last
+    `REPLICA_STICKY_SECONDS` (see `mark_written`), so a secret can be checked straight after it was created.
+
+    Writes, including consume-once deletes, and migrations always go to `default`.
+    """
+
+    def __init__(self):
+        self.replicas = list(settings.DATABASE_REPLICAS)
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or not hints.get("read_only"):
+            return "default"
+
+        if recently_written(model, hints.get("lookups") or {}):
+            return "default"
+
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+@receiver(post_save, dispatch_uid="config.routers.mark_written")
+def mark_saved_rows_written(sender, instance, **kwargs):
+    # connected when Django first loads the routers, which is before any query is made.
+    mark_written(instance)
@@ -11,6 +11,7 @@
 #
 # ---------------------------------------------------------------------------------------------------------------------
 
+import copy
 import datetime
 import sys
 from pathlib import Path
@@ -34,6 +35,17 @@ ASGI_APPLICATION = "config.asgi.application"
 SECRET_KEY = env("SECRET_KEY")
 ALLOWED_HOSTS = env.list("ALLOWED_HOSTS")
 USE_PG_CRON = env.bool("USE_PG_CRON", default=True)
+# Without pg_cron, expired rows are purged by a scheduler inside the ASGI process (see secret.func).
+EXPIRY_PURGE_INTERVAL_SECONDS = env.int("EXPIRY_PURGE_INTERVAL_SECONDS", default=60)
+EXPIRY_PURGE_CHUNK_SIZE = env.int("EXPIRY_PURGE_CHUNK_SIZE", default=1000)
+# Optionally range partition secrets and verifications on burn_at so expiry drops whole partitions (see
+# secret.partitions). Applied by the secret app's migrations, so set it before running `migrate`.
+PARTITION_EXPIRING_TABLES = env.bool("PARTITION_EXPIRING_TABLES", default=False)
+PARTITION_INTERVAL = env("PARTITION_INTERVAL", default="day")
+PARTITION_PREMAKE = env.int("PARTITION_PREMAKE", default=7)
+
+if PARTITION_INTERVAL not in ["hour", "day"]:
+    raise Exception("Unsupported partition interval, env: PARTITION_INTERVAL")
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Debug settings
@@ -57,11 +69,16 @@ UI_VIEW_SECRET_URL = env("UI_VIEW_SECRET_URL")
 ALLOW_EMAIL = env.bool("ALLOW_EMAIL")
 EMAIL_VERIFICATION_EXPIRY_SECONDS = env.int("EMAIL_VERIFICATION_EXPIRY_SECONDS")
 REQUIRE_VERIFICATION = env.bool("REQUIRE_VERIFICATION")
+# How verifications are bound to the sender/recipient addresses: "hmac" (keyed from SECRET_KEY) or "argon2".
+EMAIL_BINDING_MODE = env("EMAIL_BINDING_MODE", default="hmac")
 MAIL_ESP = env("MAIL_ESP")
 ESP_API_KEY = env("ESP_API_KEY")
 MAILER_FROM_EMAIL = env("MAILER_FROM_EMAIL")
 MAILER_REPLY_TO_EMAIL = env("MAILER_REPLY_TO_EMAIL")
 
+if EMAIL_BINDING_MODE not in ["hmac", "argon2"]:
+    raise Exception("Unsupported email binding mode, env: EMAIL_BINDING_MODE")
+
 if ALLOW_EMAIL and MAIL_ESP not in [
     "sendgrid",
     "mandrill",
@@ -89,6 +106,13 @@ ANYMAIL = {
     "SPARKPOST_API_KEY": env("ESP_API_KEY") if MAIL_ESP == "sparkpost" else None,
 }
 
+# Emails are queued in the outbox by the API and sent by the `send_queued_mail` worker.
+MAIL_OUTBOX_BATCH_SIZE = env.int("MAIL_OUTBOX_BATCH_SIZE", default=50)
+MAIL_OUTBOX_POLL_SECONDS = env.float("MAIL_OUTBOX_POLL_SECONDS", default=1.0)
+MAIL_OUTBOX_MAX_ATTEMPTS = env.int("MAIL_OUTBOX_MAX_ATTEMPTS", default=5)
+MAIL_OUTBOX_RETRY_SECONDS = env.int("MAIL_OUTBOX_RETRY_SECONDS", default=30)
+MAIL_OUTBOX_CLAIM_SECONDS = env.int("MAIL_OUTBOX_CLAIM_SECONDS", default=300)
+
 # ---------------------------------------------------------------------------------------------------------------------
 # Cache Configuration
 # ---------------------------------------------------------------------------------------------------------------------
@@ -102,6 +126,15 @@ CACHES = {
 if env("CACHE_CLIENT_CLASS", default=None) is not None:
     CACHES["default"]["OPTIONS"] = {"CACHE_CLIENT_CLASS": env("CACHE_CLIENT_CLASS")}
 
+# Don't let a slow redis hold up requests, the rate limiting lets requests through when the cache times out.
+if CACHES["default"]["BACKEND"] == "django_redis.cache.RedisCache":
+    CACHES["default"].setdefault("OPTIONS", {}).update(
+        {
+            "SOCKET_CONNECT_TIMEOUT": env.float("CACHE_SOCKET_TIMEOUT", default=0.5),
+            "SOCKET_TIMEOUT": env.float("CACHE_SOCKET_TIMEOUT", default=0.5),
+        }
+    )
+
 # Application definition
 INSTALLED_APPS = [
     "django.contrib.contenttypes",
@@ -113,11 +146,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so that every request is measured, including those turned away by the next one.
+    "core.base.middleware.metrics.RecordRequestMetrics",
+    # then throttled clients are turned away before anything else runs.
+    "core.base.middleware.throttling.RejectDeniedClients",
     "django.middleware.security.SecurityMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "core.base.middleware.data.ConvertRequestEmptyStringToNull",
 ]
 
 TEMPLATES = [
@@ -147,10 +183,11 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [],
     "DEFAULT_PERMISSION_CLASSES": [],
     "DEFAULT_RENDERER_CLASSES": [
-        "djangorestframework_camel_case.render.CamelCaseJSONRenderer",
+        "core.base.api.renderers.CamelCaseORJSONRenderer",
     ],
     "DEFAULT_PARSER_CLASSES": (
-        "djangorestframework_camel_case.parser.CamelCaseJSONParser",
+        # also converts empty strings to null, see core.base.api.parsers.
+        "core.base.api.parsers.CamelCaseNullJSONParser",
     ),
     "EXCEPTION_HANDLER": "core.base.exception_handler.exception_handler.custom_exception_handler",
     "DATETIME_FORMAT": "%Y-%m-%dT%H:%M:%S.%fZ",
@@ -162,6 +199,9 @@ REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_RATES": {},
 }
 
+# How long, at most, a worker turns a throttled client away itself (see core.base.middleware.throttling).
+THROTTLE_DENY_SECONDS = env.int("THROTTLE_DENY_SECONDS", default=60)
+
 if env.bool("APPLY_PER_VIEW_THROTTLING", default=False) is True:
     REST_FRAMEWORK["DEFAULT_THROTTLE_CLASSES"].append(
         "core.base.api.throttling.AnonRateThrottlePerView"
@@ -182,9 +222,43 @@ DATABASES = {
         "PASSWORD": env("POSTGRES_PASSWORD"),
         "HOST": env("POSTGRES_HOST"),
         "PORT": "5432",
+        "OPTIONS": {},
     },
 }
 
+# Connections are taken from a psycopg 3 connection pool instead of being opened for each request. Without the pool,
+# CONN_MAX_AGE can be used to keep a connection open per worker thread instead. With either, CONN_HEALTH_CHECKS tests
+# a connection before it is used, so one dropped by the server or a proxy isn't given to a request.
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = env.bool(
+    "CONN_HEALTH_CHECKS", default=True
+)
+
+if env.bool("DATABASE_POOL", default=True):
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": env.int("DATABASE_POOL_MIN_SIZE", default=2),
+        "max_size": env.int("DATABASE_POOL_MAX_SIZE", default=10),
+        # seconds a request waits for a free connection before failing.
+        "timeout": env.float("DATABASE_POOL_TIMEOUT", default=10.0),
+        "max_idle": env.float("DATABASE_POOL_MAX_IDLE", default=600.0),
+        "max_lifetime": env.float("DATABASE_POOL_MAX_LIFETIME", default=3600.0),
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=0)
+
+# Read replicas of the default database, on the same port and with the same credentials. Read-only lookups are sent
+# to them by config.routers.PrimaryReplicaRouter, except for a while after the rows they look up were written.
+DATABASE_REPLICAS = []
+
+for number, host in enumerate(env.list("POSTGRES_REPLICA_HOSTS", default=[]), 1):
+    alias = f"replica_{number}"
+    DATABASES[alias] = copy.deepcopy(DATABASES["default"])
+    DATABASES[alias]["HOST"] = host
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+
+REPLICA_STICKY_SECONDS = env.int("REPLICA_STICKY_SECONDS", default=10)
+DATABASE_ROUTERS = ["config.routers.PrimaryReplicaRouter"] if DATABASE_REPLICAS else []
+
 # ---------------------------------------------------------------------------------------------------------------------
 # Internationalization
 # ---------------------------------------------------------------------------------------------------------------------
@@ -228,6 +302,16 @@ LOGGING = {
             "propagate": True,
             "level": "INFO",
         },
+        "core": {
+            "handlers": _LOG_HANDLERS,
+            "propagate": True,
+            "level": "INFO",
+        },
+        "secret": {
+            "handlers": _LOG_HANDLERS,
+            "propagate": True,
+            "level": "INFO",
+        },
     },
 }
 
@@ -259,6 +343,60 @@ PASSWORD_HASHERS = [
     "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
 ]
 
+# Passphrase and email hashing runs in a pool of worker processes (see core.base.functions.hashing) so that
+# Argon2 doesn't hold up the web server. Set HASHING_POOL_SIZE=0 to hash in the web server process instead.
+HASHING_POOL_SIZE = env.int("HASHING_POOL_SIZE", default=2)
+HASHING_POOL_MAX_QUEUE = env.int("HASHING_POOL_MAX_QUEUE", default=32)
+HASHING_POOL_START_METHOD = env("HASHING_POOL_START_METHOD", default="spawn")
+
+# Secrets at least SECRET_COMPRESSION_THRESHOLD bytes long are stored compressed with SECRET_COMPRESSION, one of
+# "zlib", "lzma", "bz2" or "none" (see core.base.functions.compression).
+SECRET_COMPRESSION = env("SECRET_COMPRESSION", default="zlib")
+SECRET_COMPRESSION_THRESHOLD = env.int("SECRET_COMPRESSION_THRESHOLD", default=1024)
+
+if SECRET_COMPRESSION not in ["zlib", "lzma", "bz2", "none"]:
+    raise Exception("Unsupported secret compression, env: SECRET_COMPRESSION")
+
+# Secrets stored in at least SECRET_STREAM_THRESHOLD bytes are sent by /api/secret/retrieve/ as they are read, in
+# pieces of SECRET_STREAM_CHUNK_SIZE characters, instead of being rendered as a whole.
+SECRET_STREAM_THRESHOLD = env.int("SECRET_STREAM_THRESHOLD", default=65536)
+SECRET_STREAM_CHUNK_SIZE = env.int("SECRET_STREAM_CHUNK_SIZE", default=8192)
+
+# Files attached to secrets through /api/secret/attachment/ are kept in the SECRET_ATTACHMENT_STORE at
+# SECRET_ATTACHMENT_LOCATION (a directory for the default store), in chunks of SECRET_ATTACHMENT_CHUNK_SIZE bytes,
+# see secret.attachments. Empty to turn attachments off.
+SECRET_ATTACHMENT_STORE = env(
+    "SECRET_ATTACHMENT_STORE", default="secret.attachments.FileSystemAttachmentStore"
+)
+SECRET_ATTACHMENT_LOCATION = env("SECRET_ATTACHMENT_LOCATION", default="")
+SECRET_ATTACHMENT_MAX_BYTES = env.int("SECRET_ATTACHMENT_MAX_BYTES", default=104857600)
+SECRET_ATTACHMENT_CHUNK_SIZE = env.int("SECRET_ATTACHMENT_CHUNK_SIZE", default=1048576)
+
+# The most secrets that can be created in one request to /api/secret/bulk/.
+SECRET_BULK_MAX_ITEMS = env.int("SECRET_BULK_MAX_ITEMS", default=100)
+
+# Secrets expiring within SECRET_HOT_STORE_MAX_SECONDS and no larger than SECRET_HOT_STORE_MAX_BYTES are kept in the
+# SECRET_HOT_STORE at SECRET_HOT_STORE_LOCATION instead of Postgres, see secret.storage. Empty to keep them all in
+# Postgres.
+SECRET_HOT_STORE = env("SECRET_HOT_STORE", default="secret.storage.RedisSecretStore")
+SECRET_HOT_STORE_LOCATION = env("SECRET_HOT_STORE_LOCATION", default="")
+SECRET_HOT_STORE_MAX_SECONDS = env.int("SECRET_HOT_STORE_MAX_SECONDS", default=3600)
+SECRET_HOT_STORE_MAX_BYTES = env.int("SECRET_HOT_STORE_MAX_BYTES", default=65536)
+SECRET_HOT_STORE_SOCKET_TIMEOUT = env.float(
+    "SECRET_HOT_STORE_SOCKET_TIMEOUT", default=0.5
+)
+
+# Per process Prometheus metrics, see core.base.functions.metrics. /api/metrics/ asks for METRICS_TOKEN as a bearer
+# token, and counts the live secrets in the database at most once every METRICS_LIVE_SECONDS.
+METRICS_ENABLED = env.bool("METRICS_ENABLED", default=False)
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+METRICS_LIVE_SECONDS = env.int("METRICS_LIVE_SECONDS", default=30)
+
+if METRICS_ENABLED and not METRICS_TOKEN:
+    raise Exception(
+        "METRICS_TOKEN is required when METRICS_ENABLED, env: METRICS_TOKEN"
+    )
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -0,0 +1,106 @@
+from unittest.mock import patch
+from uuid import uuid4
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from secret.models import Secret
+from secret.storage import primary_store
+from .routers import PrimaryReplicaRouter
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"], REPLICA_STICKY_SECONDS=10)
+class PrimaryReplicaRouterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+
+    def db_for(self, queryset):
+        return self.router.db_for_read(queryset.model, **queryset._hints)
+
+    def test_01_read_only_lookups_use_replica(self):
+        self.assertEqual(
+            self.db_for(Secret.objects.live().read_only(secret_id=uuid4())), "replica_1"
+        )
+        self.assertEqual(
+            self.db_for(Secret.objects.read_only(fulfilment_id=uuid4()).live()),
+            "replica_1",
+        )
+
+    def test_02_other_reads_and_writes_use_primary(self):
+        self.assertEqual(
+            self.db_for(Secret.objects.live().filter(secret_id=uuid4())), "default"
+        )
+        self.assertEqual(self.router.db_for_write(Secret), "default")
+        self.assertTrue(self.router.allow_migrate("default", "secret"))
+        self.assertFalse(self.router.allow_migrate("replica_1", "secret"))
+
+    def test_03_sticky_after_write(self):
+        secret = Secret.objects.create(secret_text="text", expiry_seconds=3600)
+
+        self.assertEqual(
+            self.db_for(Secret.objects.read_only(secret_id=secret.secret_id)),
+            "default",
+        )
+
+        secret.fulfilment_id = uuid4()
+        secret.save()
+
+        self.assertEqual(
+            self.db_for(Secret.objects.read_only(fulfilment_id=secret.fulfilment_id)),
+            "default",
+        )
+
+        cache.clear()
+
+        self.assertEqual(
+            self.db_for(Secret.objects.read_only(secret_id=secret.secret_id)),
+            "replica_1",
+        )
+
+    def test_04_primary_when_cache_unavailable(self):
+        with patch.object(cache, "get_many", side_effect=ConnectionError):
+            self.assertEqual(
+                self.db_for(Secret.objects.read_only(secret_id=uuid4())), "default"
+            )
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_05_no_replicas(self):
+        router = PrimaryReplicaRouter()
+        queryset = Secret.objects.read_only(secret_id=uuid4())
+
+        self.assertEqual(router.db_for_read(Secret, **queryset._hints), "default")
+
+    @override_settings(DATABASE_ROUTERS=["config.routers.PrimaryReplicaRouter"])
+    def test_06_consume_uses_primary(self):
+        secret = Secret.objects.create(secret_text="text", expiry_seconds=3600)
+        cache.clear()
+
+        queryset = Secret.objects.live().read_only(secret_id=secret.secret_id)
+        self.assertEqual(queryset.db, "replica_1")
+
+        consumed = queryset.consume()
+
+        self.assertEqual([s.secret_id for s in consumed], [secret.secret_id])
+        self.assertEqual(consumed[0]._state.db, "default")
+
+    def test_07_sticky_in_lookups(self):
+        secrets = async_to_sync(primary_store.acreate_many)(
+            [{"secret_text": "text", "expiry_seconds": 3600}] * 2
+        )
+        secret_ids = [secret.secret_id for secret in secrets]
+
+        # bulk_create doesn't send post_save, so the store marks the rows itself.
+        self.assertEqual(
+            self.db_for(Secret.objects.read_only(secret_id__in=secret_ids)),
+            "default",
+        )
+
+        cache.clear()
+
+        self.assertEqual(
+            self.db_for(Secret.objects.read_only(secret_id__in=secret_ids)),
+            "replica_1",
+        )
@@ -1,6 +1,8 @@
 from django.urls import re_path, include
 from django.http import HttpResponse
 
+from core.base.api.metrics import handle_metrics
+
 
 def health_check(request):
     return HttpResponse(status=200)
@@ -13,6 +15,7 @@ api_urlpatterns = [
     ),
     re_path(r"^verify/", include(("secret.api.verify", "verify"), namespace="verify")),
     re_path(r"^health-check/", health_check, name="health_check"),
+    re_path(r"^metrics/$", handle_metrics, name="handle_metrics"),
 ]
 
 urlpatterns = [
@@ -0,0 +1,154 @@
+import re
+
+from django.conf import settings
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from djangorestframework_camel_case.settings import api_settings
+from djangorestframework_camel_case.util import (
+    camel_to_underscore,
+    camelize_re,
+    underscore_to_camel,
+)
+
+
+def json_underscoreize_options() -> dict:
+    """
+    Returns the `JSON_UNDERSCOREIZE` options from `REST_FRAMEWORK`, on top of djangorestframework_camel_case's
+    defaults. (That package only reads its own `JSON_CAMEL_CASE` setting.)
+    """
+    options = dict(api_settings.defaults["JSON_UNDERSCOREIZE"])
+    options.update(
+        getattr(settings, "REST_FRAMEWORK", {}).get("JSON_UNDERSCOREIZE", {})
+    )
+    return options
+
+
+def declared_field_names() -> set:
+    """
+    Collects the names of the fields declared on every serializer class that has been imported.
+    """
+    # imported here as DRF's serializers import the views, whose settings import our renderer.
+    from rest_framework.serializers import BaseSerializer
+
+    names = set()
+    classes = [BaseSerializer]
+
+    while classes:
+        cls = classes.pop()
+        classes.extend(cls.__subclasses__())
+        names.update(getattr(cls, "_declared_fields", {}).keys())
+
+    return names
+
+
+class KeyTranslator:
+    """
+    Translates dictionary keys between snake_case and camelCase, remembering every translation.
+
+    `djangorestframework_camel_case` runs a regex over every key of every request and response. Our payloads
+    only ever use a few dozen distinct keys, so after the first lookup each translation is a dict hit. The
+    serializers' declared field names are translated up front; any other key is translated on first use, up to
+    `max_size` keys per direction so that clients sending random keys can't grow the cache without bound.
+
+    Attributes:
+        options (dict): The `JSON_UNDERSCOREIZE` settings, used when converting camelCase to snake_case.
+        max_size (int): The most keys remembered per direction.
+    """
+
+    def __init__(self, options: dict = None, max_size: int = 4096):
+        self.options = options or {}
+        self.max_size = max_size
+
+        self._to_camel = {}
+        self._to_underscore = {}
+        self._warmed = False
+
+    def warm(self):
+        """
+        Translates the declared serializer field names in both directions. This runs on the first translation,
+        by which point the URL configuration has imported every serializer.
+        """
+        self._warmed = True
+
+        for name in declared_field_names():
+            self.underscore(self.camel(name))
+
+    def camel(self, key: str) -> str:
+        try:
+            return self._to_camel[key]
+        except KeyError:
+            pass
+
+        if not self._warmed:
+            self.warm()
+            return self.camel(key)
+
+        new_key = re.sub(camelize_re, underscore_to_camel, key) if "_" in key else key
+
+        if len(self._to_camel) < self.max_size:
+            self._to_camel[key] = new_key
+
+        return new_key
+
+    def underscore(self, key: str) -> str:
+        try:
+            return self._to_underscore[key]
+        except KeyError:
+            pass
+
+        if not self._warmed:
+            self.warm()
+            return self.underscore(key)
+
+        new_key = camel_to_underscore(key, **self.options)
+
+        if len(self._to_underscore) < self.max_size:
+            self._to_underscore[key] = new_key
+
+        return new_key
+
+
+def translate_keys(data, translate, ignore_fields=(), ignore_keys=()):
+    """
+    Recursively rebuilds dicts and lists in `data` with their keys passed through `translate`.
+
+    This follows `djangorestframework_camel_case`'s camelize/underscoreize: values under `ignore_fields` are
+    copied untouched, and keys in `ignore_keys` keep their original name.
+
+    Parameters:
+        data: The parsed or to be rendered data.
+        translate (callable): Maps a str key to its new name, e.g. `KeyTranslator.camel`.
+        ignore_fields (iterable): Keys whose values are not translated.
+        ignore_keys (iterable): Keys that are not translated themselves.
+
+    Returns:
+        The translated copy of `data`.
+    """
+    if isinstance(data, dict):
+        new_dict = {}
+
+        for key, value in data.items():
+            if isinstance(key, Promise):
+                key = force_str(key)
+
+            new_key = translate(key) if isinstance(key, str) else key
+
+            if key not in ignore_fields and new_key not in ignore_fields:
+                value = translate_keys(value, translate, ignore_fields, ignore_keys)
+
+            if key in ignore_keys or new_key in ignore_keys:
+                new_dict[key] = value
+            else:
+                new_dict[new_key] = value
+
+        return new_dict
+
+    if isinstance(data, (list, tuple)):
+        return [
+            translate_keys(item, translate, ignore_fields, ignore_keys) for item in data
+        ]
+
+    if isinstance(data, Promise):
+        return force_str(data)
+
+    return data
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from core.base.functions.metrics import CONTENT_TYPE, render_metrics
+
+
+def handle_metrics(request):
+    """
+    Returns this process's metrics in the Prometheus text format. METRICS_TOKEN must be given as a bearer token,
+    and every request is refused while it isn't set. Left as a plain Django view, outside of the API's renderers
+    and throttles, so a scrape is cheap and never throttled.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404()
+
+    if not settings.METRICS_TOKEN or not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,75 @@
+import json
+
+from django.conf import settings
+from djangorestframework_camel_case.parser import CamelCaseJSONParser
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from core.base.api.camel_case import json_underscoreize_options, translate_keys
+from core.base.api.renderers import CamelCaseORJSONRenderer
+from core.base.functions.data import replace_with_null
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class CamelCaseNullJSONParser(CamelCaseJSONParser):
+    """
+    A camelCase JSON parser that also converts empty string values to None (null).
+
+    Doing this in the parser means each body is decoded and parsed once, and the conversion works on the parsed
+    data instead of re-encoding the body. Only JSON requests reach this parser, so other content types are
+    left alone.
+
+    Bodies are parsed with orjson when it is installed, and keys are translated through the same cached
+    `KeyTranslator` as `CamelCaseORJSONRenderer`.
+    """
+
+    json_underscoreize = json_underscoreize_options()
+    translator = CamelCaseORJSONRenderer.translator
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+
+        try:
+            body = stream.read()
+
+            if orjson:
+                # orjson reads UTF-8 bytes directly, anything else is decoded first.
+                if encoding.lower().replace("-", "") != "utf8":
+                    body = body.decode(encoding)
+                data = orjson.loads(body)
+            else:
+                data = json.loads(body.decode(encoding))
+
+        except ValueError as exc:
+            # UnicodeDecodeError and orjson.JSONDecodeError are ValueErrors too.
+            raise ParseError("JSON parse error - %s" % str(exc))
+
+        # Replace all empty string values with None
+        replace_with_null(data, "")
+
+        return translate_keys(
+            data,
+            self.translator.underscore,
+            ignore_fields=self.json_underscoreize.get("ignore_fields") or (),
+            ignore_keys=self.json_underscoreize.get("ignore_keys") or (),
+        )
+
+
+class OctetStreamParser(BaseParser):
+    """
+    Reads an application/octet-stream body as it is, e.g. a payload the client has already encrypted, so it can be
+    stored without being base64 encoded into a JSON body and parsed again. Any other fields are sent next to it,
+    see `secret.api.serializers.octet_stream_data`.
+
+    Only views that take raw bodies list this parser, every other view still refuses them.
+    """
+
+    media_type = "application/octet-stream"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream.read()
@@ -0,0 +1,136 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.base.api.camel_case import (
+    KeyTranslator,
+    json_underscoreize_options,
+    translate_keys,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+_encoder = JSONEncoder()
+
+
+def orjson_default(obj):
+    # orjson already handles dicts, lists, str, numbers, UUIDs and dataclasses. Everything else (Decimal, lazy
+    # strings, datetimes, querysets, ...) is encoded the way DRF's JSONEncoder would.
+    return _encoder.default(obj)
+
+
+class StreamedString:
+    """
+    A string value that `CamelCaseORJSONRenderer.render_stream` writes out one piece at a time.
+
+    Attributes:
+        chunks (iterable of str): The string's pieces, in order.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+
+class CamelCaseORJSONRenderer(JSONRenderer):
+    """
+    Renders responses as camelCase JSON using orjson, falling back to DRF's stdlib renderer.
+
+    Keys are translated through a shared `KeyTranslator` instead of a regex per key. The stdlib renderer is still
+    used when orjson is not installed, when the client asks for indented output, or for values orjson can't
+    encode (e.g. integers larger than 64 bits).
+    """
+
+    json_underscoreize = json_underscoreize_options()
+    translator = KeyTranslator(json_underscoreize)
+
+    orjson_options = (
+        (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        data = translate_keys(
+            data,
+            self.translator.camel,
+            ignore_fields=self.json_underscoreize.get("ignore_fields") or (),
+            ignore_keys=self.json_underscoreize.get("ignore_keys") or (),
+        )
+
+        renderer_context = renderer_context or {}
+
+        if orjson and not self.get_indent(accepted_media_type, renderer_context):
+            try:
+                ret = orjson.dumps(
+                    data, default=orjson_default, option=self.orjson_options
+                )
+            except TypeError:
+                pass
+            else:
+                # like DRF, escape the two line terminators that are valid in JSON strings but not in javascript.
+                return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                    b"\xe2\x80\xa9", b"\\u2029"
+                )
+
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def render_stream(self, data: dict):
+        """
+        Renders `data` like `render`, a piece at a time. `StreamedString` values are written out as they are read,
+        so their whole string is never held at once, nor any copy of it.
+
+        Parameters:
+            data (dict): A flat dict of values, some of which may be `StreamedString`s.
+
+        Returns:
+            Iterator[bytes]: The same bytes `render(data)` returns, split into pieces.
+        """
+        ignore_keys = self.json_underscoreize.get("ignore_keys") or ()
+        separator = b"{"
+
+        for key, value in data.items():
+            key = self.render(key if key in ignore_keys else self.translator.camel(key))
+
+            if not isinstance(value, StreamedString):
+                # rendered in a list, as render() renders None as an empty body.
+                yield separator + key + b":" + self.render([value])[1:-1]
+
+            else:
+                yield separator + key + b':"'
+
+                for chunk in value.chunks:
+                    # an encoded string without its quotes, escaped as it would be in the whole string.
+                    yield self.render(chunk)[1:-1]
+
+                yield b'"'
+
+            separator = b","
+
+        yield b"}" if separator == b"," else b"{}"
+
+
+class OctetStreamRenderer(BaseRenderer):
+    """
+    Renders bytes as they are, for clients that ask for application/octet-stream. Anything else a view answers
+    with (errors, mostly) is rendered by `CamelCaseORJSONRenderer` and sent as application/json instead.
+    """
+
+    media_type = "application/octet-stream"
+    format = "bin"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return bytes(data)
+
+        response = (renderer_context or {}).get("response")
+
+        if response is not None:
+            response["Content-Type"] = CamelCaseORJSONRenderer.media_type
+
+        return CamelCaseORJSONRenderer().render(data, renderer_context=renderer_context)
@@ -0,0 +1,76 @@
+import json
+from io import BytesIO
+
+from django.test import TestCase
+from rest_framework.exceptions import ParseError
+
+from .parsers import CamelCaseNullJSONParser, OctetStreamParser
+
+
+class TestCamelCaseNullJSONParser(TestCase):
+    def setUp(self):
+        self.parser = CamelCaseNullJSONParser()
+
+    def test_01_empty_string_to_null_conversion(self):
+        stream = BytesIO(json.dumps({"name": "", "age": 25}).encode())
+
+        data = self.parser.parse(stream)
+
+        self.assertEqual(data, {"name": None, "age": 25})
+
+    def test_02_nested_and_camel_case(self):
+        body = {"secretText": "", "items": ["", "a", {"innerKey": ""}]}
+        stream = BytesIO(json.dumps(body).encode())
+
+        data = self.parser.parse(stream)
+
+        self.assertEqual(
+            data, {"secret_text": None, "items": [None, "a", {"inner_key": None}]}
+        )
+
+    def test_03_invalid_json(self):
+        with self.assertRaises(ParseError):
+            self.parser.parse(BytesIO(b"{invalid_json}"))
+
+    def test_04_unicode_decode_error(self):
+        with self.assertRaises(ParseError):
+            self.parser.parse(BytesIO(b"\x80\x81\x82"))
+
+
+class TestEmptyStringToNullRequests(TestCase):
+
+    def test_01_json_request(self):
+        response = self.client.post(
+            "/api/secret/check/",
+            data=json.dumps({"secretId": ""}),
+            content_type="application/json",
+        )
+
+        # the empty id became null, so it is rejected as missing rather than not found.
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["field"], "secret_id")
+        self.assertEqual(
+            response.json()["errors"][0]["detail"], "This field may not be null."
+        )
+
+    def test_02_non_json_request(self):
+        response = self.client.post("/api/secret/check/", data={"secretId": ""})
+
+        # only JSON bodies are parsed, anything else is refused before it is read.
+        self.assertEqual(response.status_code, 415)
+
+
+class TestOctetStreamParser(TestCase):
+
+    def test_01_body_as_is(self):
+        body = bytes(range(256))
+
+        self.assertEqual(OctetStreamParser().parse(BytesIO(body)), body)
+
+    def test_02_only_where_listed(self):
+        # /api/secret/check/ takes JSON only.
+        response = self.client.post(
+            "/api/secret/check/", data=b"x", content_type="application/octet-stream"
+        )
+
+        self.assertEqual(response.status_code, 415)
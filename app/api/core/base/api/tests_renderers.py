@@ -0,0 +1,151 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from io import BytesIO
+from uuid import uuid4
+
+from django.test import TestCase
+from django.utils.translation import gettext_lazy
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from djangorestframework_camel_case.util import underscoreize
+
+from .camel_case import KeyTranslator, json_underscoreize_options
+from .parsers import CamelCaseNullJSONParser
+from .renderers import CamelCaseORJSONRenderer, OctetStreamRenderer, StreamedString
+
+
+class TestCamelCaseORJSONRenderer(TestCase):
+    def setUp(self):
+        self.renderer = CamelCaseORJSONRenderer()
+
+    def test_01_matches_camel_case_renderer(self):
+        data = {
+            "secret_id": str(uuid4()),
+            "burn_at": 1234567890,
+            "email_response": None,
+            "errors": [{"field": "secret_text", "detail": "ünïcödé  "}],
+            "nested": {"passphrase_protected": True, "field_1": 1.5},
+            "metadata": {"keep_this_key": "x"},
+        }
+
+        self.assertEqual(
+            json.loads(self.renderer.render(data)),
+            json.loads(CamelCaseJSONRenderer().render(data)),
+        )
+        self.assertIn(b"\\u2028", self.renderer.render(data))
+
+    def test_02_drf_types(self):
+        data = {
+            "amount": Decimal("1.50"),
+            "at": datetime(2024, 1, 2, 3, 4, 5, 678000),
+            "secret_id": uuid4(),
+            "label": gettext_lazy("secret not found"),
+        }
+
+        self.assertEqual(
+            json.loads(self.renderer.render(data)),
+            json.loads(CamelCaseJSONRenderer().render(data)),
+        )
+
+    def test_03_none_and_large_ints(self):
+        self.assertEqual(self.renderer.render(None), b"")
+
+        # too large for orjson, handled by the stdlib renderer.
+        self.assertEqual(
+            json.loads(self.renderer.render({"big_number": 2**70})),
+            {"bigNumber": 2**70},
+        )
+
+    def test_04_indent(self):
+        rendered = self.renderer.render(
+            {"burn_at": 1}, accepted_media_type="application/json; indent=4"
+        )
+        self.assertEqual(rendered, b'{\n    "burnAt": 1\n}')
+
+    def test_05_render_stream(self):
+        text = 'line "quoted" \\ ünïcödé \u2028 \U0001d11e\n' * 100
+        data = {
+            "secret_text": text,
+            "burn_at": 1234567890,
+            "passphrase_encrypted": False,
+            "email_response": None,
+        }
+        chunks = [text[offset : offset + 7] for offset in range(0, len(text), 7)]
+
+        streamed = list(
+            self.renderer.render_stream({**data, "secret_text": StreamedString(chunks)})
+        )
+
+        self.assertGreater(len(streamed), len(chunks))
+        self.assertEqual(b"".join(streamed), self.renderer.render(data))
+        self.assertEqual(b"".join(self.renderer.render_stream({})), b"{}")
+
+
+class TestOctetStreamRenderer(TestCase):
+
+    def test_01_bytes_and_errors(self):
+        renderer = OctetStreamRenderer()
+        response = {}
+
+        self.assertEqual(renderer.render(memoryview(b"\x00\xff")), b"\x00\xff")
+        self.assertEqual(
+            renderer.render({"error_code": 1}, renderer_context={"response": response}),
+            b'{"errorCode":1}',
+        )
+        self.assertEqual(response["Content-Type"], "application/json")
+
+
+class TestCamelCaseNullJSONParserKeys(TestCase):
+
+    def test_01_matches_camel_case_parser(self):
+        body = json.dumps(
+            {
+                "secretId": "a",
+                "expirySeconds": 60,
+                "field1": [{"innerKey": "x"}],
+                "metadata": {"keepThisKey": "x"},
+                "HTTPHeader": "y",
+            }
+        ).encode()
+
+        options = json_underscoreize_options()
+
+        self.assertEqual(
+            CamelCaseNullJSONParser().parse(BytesIO(body)),
+            underscoreize(json.loads(body), **options),
+        )
+
+        # the REST_FRAMEWORK options are applied.
+        self.assertTrue(options["no_underscore_before_number"])
+        self.assertEqual(
+            CamelCaseNullJSONParser().parse(BytesIO(body))["metadata"],
+            {"keepThisKey": "x"},
+        )
+
+    def test_02_other_encoding(self):
+        body = json.dumps({"secretText": "ünïcödé"}, ensure_ascii=False).encode(
+            "latin-1"
+        )
+
+        data = CamelCaseNullJSONParser().parse(
+            BytesIO(body), parser_context={"encoding": "latin-1"}
+        )
+
+        self.assertEqual(data, {"secret_text": "ünïcödé"})
+
+
+class TestKeyTranslator(TestCase):
+
+    def test_01_warmed_from_serializers(self):
+        translator = KeyTranslator()
+        translator.warm()
+
+        self.assertEqual(translator._to_camel["secret_id"], "secretId")
+        self.assertEqual(translator._to_underscore["burnAt"], "burn_at")
+
+    def test_02_bounded(self):
+        translator = KeyTranslator(max_size=0)
+        translator.warm()
+
+        self.assertEqual(translator.camel("some_random_key"), "someRandomKey")
+        self.assertNotIn("some_random_key", translator._to_camel)
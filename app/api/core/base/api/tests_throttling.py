@@ -51,3 +51,97 @@ class TestAnonRateThrottlePerView(APITestCase):
 
         self.assertEqual(response1_again.status_code, 429)
         self.assertEqual(response2_again.status_code, 429)
+
+
+class TestSlidingWindowRateThrottle(APITestCase):
+
+    class ExampleView(APIView):
+        throttle_classes = [AnonRateThrottlePerView]
+
+        def get(self, request, *args, **kwargs):
+            return Response({}, status=status.HTTP_200_OK)
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.view = TestSlidingWindowRateThrottle.ExampleView()
+
+    def make_throttle(self, now):
+        throttle = AnonRateThrottlePerView()
+        throttle.timer = lambda: now
+        return throttle
+
+    def allow(self, now):
+        return self.make_throttle(now).allow_request(self.factory.get("/"), self.view)
+
+    @patch("core.base.api.throttling.AnonRateThrottlePerView.get_rate")
+    def test_01_sliding_window(self, mock):
+        mock.return_value = "4/min"
+
+        # 4 requests at the end of one window...
+        self.assertTrue(all(self.allow(6000 + 55) for _ in range(4)))
+        self.assertFalse(self.allow(6000 + 56))
+
+        # ...(5 attempts, counting the throttled one) still count for half of the next window: 2.5 + 1 is
+        # allowed, 2.5 + 2 is not.
+        self.assertTrue(self.allow(6060 + 30))
+        self.assertFalse(self.allow(6060 + 30))
+
+        # two windows later they are forgotten.
+        self.assertTrue(self.allow(6180))
+
+    @patch("core.base.api.throttling.AnonRateThrottlePerView.get_rate")
+    def test_02_wait(self, mock):
+        mock.return_value = "1/min"
+
+        throttle = self.make_throttle(6010)
+        self.assertTrue(throttle.allow_request(self.factory.get("/"), self.view))
+
+        throttle = self.make_throttle(6010)
+        self.assertFalse(throttle.allow_request(self.factory.get("/"), self.view))
+        self.assertEqual(throttle.wait(), 50)
+
+    @patch("core.base.api.throttling.AnonRateThrottlePerView.get_rate")
+    def test_03_per_endpoint_keys(self, mock):
+        from secret.api.secret import handle_store_secret
+        from secret.api.verify import handle_verify_request
+
+        mock.return_value = "1/day"
+        throttle = AnonRateThrottlePerView()
+        request = self.factory.get("/")
+
+        self.assertEqual(
+            throttle.get_cache_key(request, handle_store_secret.cls()),
+            "throttle_secret.api.secret.handle_store_secret_127.0.0.1",
+        )
+        self.assertNotEqual(
+            throttle.get_cache_key(request, handle_store_secret.cls()),
+            throttle.get_cache_key(request, handle_verify_request.cls()),
+        )
+
+    @patch("core.base.api.throttling.AnonRateThrottlePerView.get_rate")
+    def test_04_fails_open(self, mock):
+        from core.base.api.throttling import throttle_stats
+
+        mock.return_value = "1/day"
+        failed_open = throttle_stats()["failed_open"]
+
+        with patch.object(cache, "incr", side_effect=TimeoutError("slow")):
+            self.assertTrue(self.allow(6000))
+            self.assertTrue(self.allow(6000))
+
+        self.assertEqual(throttle_stats()["failed_open"], failed_open + 2)
+
+    @patch("core.base.api.throttling.get_redis_client")
+    @patch("core.base.api.throttling.AnonRateThrottlePerView.get_rate")
+    def test_05_redis_pipeline(self, mock, mock_get_redis_client):
+        mock.return_value = "2/min"
+        pipe = mock_get_redis_client.return_value.pipeline.return_value
+        pipe.execute.return_value = [3, True, b"1"]
+
+        throttle = self.make_throttle(6030)
+        self.assertFalse(throttle.allow_request(self.factory.get("/"), self.view))
+
+        self.assertEqual((throttle.current, throttle.previous), (3, 1))
+        pipe.incr.assert_called_once()
+        pipe.expire.assert_called_once_with(pipe.incr.call_args[0][0], 120)
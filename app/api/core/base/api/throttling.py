@@ -1,7 +1,218 @@
-from rest_framework.throttling import AnonRateThrottle
+import logging
+import threading
+import time
 
+from django.conf import settings
+from rest_framework.throttling import AnonRateThrottle, SimpleRateThrottle
 
-class AnonRateThrottlePerView(AnonRateThrottle):
+from core.base.functions.metrics import Collected
+
+logger = logging.getLogger(__name__)
+
+_stats = {"allowed": 0, "throttled": 0, "failed_open": 0, "rejected_early": 0}
+_stats_lock = threading.Lock()
+
+
+def _record(outcome: str):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def throttle_stats() -> dict:
+    """
+    Returns how many requests the sliding window throttles have `allowed` and `throttled`, how many were let
+    through because the cache could not be reached (`failed_open`), and how many the deny list middleware
+    `rejected_early`, since the process started.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+Collected(
+    "secretburner_throttle_requests_total",
+    "Requests seen by the rate throttles, by outcome.",
+    throttle_stats,
+    type="counter",
+    label="outcome",
+)
+
+
+class DenyList:
+    """
+    An in-process record of clients that are currently throttled, so that `core.base.middleware.throttling` can
+    turn away their next requests before the body is read or the cache is asked.
+
+    Entries are keyed by (path, ident) and only kept for up to `max_seconds`, so a worker's list stays small and
+    recovers quickly if it gets out of step with the shared cache. It holds at most `max_size` entries.
+    """
+
+    def __init__(self, max_seconds: float, max_size: int = 10000):
+        self.max_seconds = max_seconds
+        self.max_size = max_size
+
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: tuple, seconds: float, now: float = None):
+        now = time.time() if now is None else now
+        expires_at = now + min(seconds, self.max_seconds)
+
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                self._entries = {k: v for k, v in self._entries.items() if v > now}
+
+            if len(self._entries) < self.max_size:
+                self._entries[key] = expires_at
+
+    def retry_after(self, key: tuple, now: float = None):
+        """
+        Returns the seconds left on `key`'s entry, or None if it isn't denied.
+        """
+        expires_at = self._entries.get(key)
+
+        if expires_at is None:
+            return None
+
+        now = time.time() if now is None else now
+
+        if expires_at <= now:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+
+        return expires_at - now
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+deny_list = DenyList(max_seconds=settings.THROTTLE_DENY_SECONDS)
+
+
+def get_redis_client(cache):
+    """
+    Returns the raw redis client behind a django-redis cache, or None for any other cache backend.
+    """
+    try:
+        from django_redis.cache import RedisCache
+    except ImportError:  # pragma: no cover
+        return None
+
+    if isinstance(cache, RedisCache):
+        return cache.client.get_client(write=True)
+
+    return None
+
+
+def view_name(view) -> str:
+    """
+    Returns a name unique to the view. `@api_view` classes are all created as `WrappedAPIView` and then renamed
+    after their function, so the module is included to tell apart functions with the same name.
+    """
+    return f"{view.__class__.__module__}.{view.__class__.__name__}"
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    A rate throttle using a sliding window counter, so each request costs a constant amount of work.
+
+    DRF's `SimpleRateThrottle` keeps a list of request timestamps per client and reads, trims and writes the whole
+    list on every request, which is O(limit) and races between workers. Instead, this keeps one counter per
+    fixed window. The rate is estimated from the current window's count plus the previous window's count,
+    weighted by how much of the previous window still overlaps the sliding window.
+
+    On django-redis caches the counter is incremented, given its expiry and read back with the previous
+    window's count in one MULTI/EXEC pipeline. Other caches use `incr`, which is atomic in the local memory
+    cache but not the database cache, where concurrent requests may be under counted.
+
+    Every attempt is counted, including throttled ones, so a client has to back off to get through again. If the
+    cache raises (e.g. a redis socket timeout) the request is allowed and counted under `failed_open` in
+    `throttle_stats()`. Throttled clients are added to `deny_list` for their path until they may retry.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        self.window_start = self.now - self.now % self.duration
+
+        try:
+            self.current, self.previous = self.hit(self.key)
+
+        except Exception as e:
+            logger.warning("Throttle cache unavailable, allowing request: %s", e)
+            _record("failed_open")
+            return True
+
+        weight = 1 - (self.now - self.window_start) / self.duration
+
+        if self.previous * weight + self.current > self.num_requests:
+            _record("throttled")
+            deny_list.add(
+                (request.path_info, self.get_ident(request)), self.wait(), self.now
+            )
+            return self.throttle_failure()
+
+        _record("allowed")
+        return self.throttle_success()
+
+    def hit(self, key: str) -> tuple:
+        """
+        Counts a request against the current window.
+
+        Returns:
+            tuple: The request counts of the current window (including this request) and of the previous window.
+        """
+        window = int(self.window_start // self.duration)
+        current_key, previous_key = f"{key}_{window}", f"{key}_{window - 1}"
+
+        # keep each window long enough to be the previous window of the next one.
+        timeout = self.duration * 2
+
+        client = get_redis_client(self.cache)
+
+        if client is not None:
+            pipe = client.pipeline()
+            pipe.incr(self.cache.make_key(current_key))
+            pipe.expire(self.cache.make_key(current_key), timeout)
+            pipe.get(self.cache.make_key(previous_key))
+            current, _, previous = pipe.execute()
+
+            return int(current), int(previous or 0)
+
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # add() does nothing if another request created the counter in the meantime.
+            self.cache.add(current_key, 0, timeout)
+            current = self.cache.incr(current_key)
+
+        return current, self.cache.get(previous_key, 0)
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        """
+        Returns the seconds until the estimated rate allows one more request.
+        """
+        elapsed = self.now - self.window_start
+        remaining = self.num_requests - self.current - 1
+
+        if remaining < 0 or not self.previous:
+            return self.duration - elapsed
+
+        # solve previous * (1 - t / duration) + current + 1 <= num_requests for t.
+        return max(self.duration * (1 - remaining / self.previous) - elapsed, 0)
+
+
+class AnonRateThrottlePerView(SlidingWindowRateThrottle, AnonRateThrottle):
     """
     A custom anonymous rate throttle that generates unique cache keys per view.
 
@@ -34,4 +245,4 @@ class AnonRateThrottlePerView(AnonRateThrottle):
         ident = self.get_ident(
             request
         )  # Get the identifier for the request, typically the IP address.
-        return f"throttle_{view.__class__.__name__}_{ident}"
+        return f"throttle_{view_name(view)}_{ident}"
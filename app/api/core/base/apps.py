@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreBaseConfig(AppConfig):
     name = "core.base"
     verbose_name = "Base"
+
+    def ready(self):
+        from core.base.functions.database import install_query_counter
+
+        connection_created.connect(
+            install_query_counter, dispatch_uid="install_query_counter"
+        )
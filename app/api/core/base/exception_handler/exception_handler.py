@@ -1,6 +1,20 @@
 import copy
 import json
-from rest_framework.views import exception_handler
+import threading
+from collections import OrderedDict
+from rest_framework.exceptions import APIException, ParseError, Throttled
+from rest_framework.response import Response
+from rest_framework.views import exception_handler, set_rollback
+
+# The most distinct error bodies kept pre-rendered, see `error_cache_key`. The least recently used are dropped.
+ERROR_RESPONSE_CACHE_SIZE = 256
+
+# errors whose message changes from one request to the next, e.g. with the seconds to wait or the position of a
+# JSON syntax error, so caching them would only push out the errors that do repeat.
+UNCACHED_ERRORS = (Throttled, ParseError)
+
+_error_responses = OrderedDict()
+_error_responses_lock = threading.Lock()
 
 
 def list_values_to_message(list_data):
@@ -74,6 +88,26 @@ def format_and_flatten_data(data, data_key, data_branching):
     return result
 
 
+def format_field_errors(data):
+    """
+    Formats a serializer's errors like the body of an error response, for errors that are returned alongside
+    other results instead of raised, e.g. one item of a batch.
+
+    Parameters:
+        data (dict or list): The serializer's `errors`.
+
+    Returns:
+        dict: The flattened `errors` and their summary as `detail`.
+    """
+    branching = isinstance(data, dict) and len(data) > 1
+    flattened_data = format_and_flatten_data(data, "", branching)
+
+    return {
+        "detail": convert_to_detail_string(flattened_data),
+        "errors": flattened_data,
+    }
+
+
 def format_error_data(error_message="", code=None):
     data = {}
 
@@ -88,6 +122,99 @@ def format_error_data(error_message="", code=None):
     return data, content
 
 
+def error_data(detail: str, code: str = None) -> dict:
+    """
+    Returns the body of an error response with a single message, as `custom_exception_handler` formats it.
+    """
+    data = {"detail": detail, "errors": [{"detail": detail}]}
+
+    if code:
+        data["code"] = code
+
+    return data
+
+
+def _cached_error(key):
+    with _error_responses_lock:
+        cached = _error_responses.get(key)
+
+        if cached is not None:
+            _error_responses.move_to_end(key)
+
+        return cached
+
+
+def _cache_error(key, cached):
+    with _error_responses_lock:
+        _error_responses[key] = cached
+
+        while len(_error_responses) > ERROR_RESPONSE_CACHE_SIZE:
+            _error_responses.popitem(last=False)
+
+
+class PreRenderedResponse(Response):
+    """
+    A Response for a cached error. The body is rendered once per renderer and media type, then reused by every
+    later response for the same error.
+
+    Attributes:
+        rendered (dict): Rendered bodies keyed by (renderer class, accepted media type), shared between responses.
+    """
+
+    def __init__(self, data, rendered, status=None, headers=None):
+        super().__init__(data, status=status, headers=headers)
+        self.rendered = rendered
+
+    @property
+    def rendered_content(self):
+        key = (type(self.accepted_renderer), self.accepted_media_type)
+        content = self.rendered.get(key)
+
+        if content is None:
+            content = super().rendered_content
+            self.rendered[key] = content
+            return content
+
+        renderer = self.accepted_renderer
+        if self.content_type is not None:
+            self["Content-Type"] = self.content_type
+        elif renderer.charset is not None:
+            self["Content-Type"] = f"{renderer.media_type}; charset={renderer.charset}"
+        else:
+            self["Content-Type"] = renderer.media_type
+
+        return content
+
+
+def error_cache_key(exc):
+    """
+    Returns the key an exception's error body is cached under, or None if it shouldn't be cached.
+
+    Only exceptions with a single, fixed message are cached, e.g. `ValidationError("secret not found")` or
+    `ServiceBusyError()`. These make up nearly all errors on the API, especially from clients guessing ids.
+    Field errors, anything else with several messages and the `UNCACHED_ERRORS` are formatted as usual.
+
+    Parameters:
+        exc: Exception instance that has been raised.
+
+    Returns:
+        tuple: (exception type, shape of the detail, message, code), or None.
+    """
+    if not isinstance(exc, APIException) or isinstance(exc, UNCACHED_ERRORS):
+        return None
+
+    detail = exc.detail
+
+    if isinstance(detail, str):
+        shape = "str"
+    elif isinstance(detail, list) and len(detail) == 1 and isinstance(detail[0], str):
+        shape, detail = "list", detail[0]
+    else:
+        return None
+
+    return type(exc), shape, str(detail), getattr(exc, "default_code", None)
+
+
 def custom_exception_handler(exc, context):
     """
     Custom exception handler that reformat and standardizes error responses from Django REST Framework.
@@ -98,7 +225,30 @@ def custom_exception_handler(exc, context):
 
     Returns:
         Response: Modified Response object with standardized error structure.
+
+    Description:
+        Errors with a single message (see `error_cache_key`) are formatted and rendered once, then served from
+        a cache of up to `ERROR_RESPONSE_CACHE_SIZE` bodies.
     """
+    key = error_cache_key(exc)
+    cached = _cached_error(key) if key is not None else None
+
+    if cached is not None:
+        # what rest_framework's exception_handler would do, without building a response we'd throw away.
+        headers = {}
+        if getattr(exc, "auth_header", None):
+            headers["WWW-Authenticate"] = exc.auth_header
+        if getattr(exc, "wait", None):
+            headers["Retry-After"] = "%d" % exc.wait
+
+        set_rollback()
+
+        detail, code, rendered = cached
+        # each response gets its own data, only the immutable message and code are shared.
+        return PreRenderedResponse(
+            error_data(detail, code), rendered, status=exc.status_code, headers=headers
+        )
+
     response = exception_handler(exc, context)
 
     if response is not None:
@@ -109,15 +259,31 @@ def custom_exception_handler(exc, context):
             response.data["detail"] = str(original_data["detail"])
             response.data["errors"] = [{"detail": response.data["detail"]}]
         else:
-            branching = isinstance(original_data, dict) and len(original_data) > 1
-            flattened_data = format_and_flatten_data(original_data, "", branching)
+            errors = format_field_errors(original_data)
 
-            response.data["errors"] = flattened_data
-            response.data["detail"] = convert_to_detail_string(flattened_data)
+            response.data["errors"] = errors["errors"]
+            response.data["detail"] = errors["detail"]
 
         # Add exception code if available. In most cases this will be "invalid" which is rest_frameworks default
         # validation error code.
         if getattr(exc, "default_code", None):
             response.data["code"] = exc.default_code
 
+        if key is not None:
+            rendered = {}
+            _cache_error(
+                key, (response.data["detail"], response.data.get("code"), rendered)
+            )
+
+            return PreRenderedResponse(
+                response.data,
+                rendered,
+                status=response.status_code,
+                headers={
+                    name: value
+                    for name, value in response.items()
+                    if name != "Content-Type"
+                },
+            )
+
     return response
@@ -1,7 +1,19 @@
-from rest_framework.exceptions import ValidationError
+from collections import OrderedDict
+from unittest.mock import patch
+from uuid import uuid4
+
+from rest_framework.exceptions import (
+    NotAuthenticated,
+    NotFound,
+    ParseError,
+    Throttled,
+    ValidationError,
+)
 
 from core.base.exception_handler.exception_handler import (
+    PreRenderedResponse,
     convert_to_detail_string,
+    error_cache_key,
     list_values_to_message,
     format_and_flatten_data,
     custom_exception_handler,
@@ -189,3 +201,90 @@ class ExceptionHandlerTest(APITestCase):
         self.assertNotIn("is_processed", data)
 
         self.assertIsInstance(content, bytes)
+
+
+class PreRenderedErrorTest(APITestCase):
+
+    def test_01_error_cache_key(self):
+        self.assertEqual(
+            error_cache_key(ValidationError("secret not found")),
+            (ValidationError, "list", "secret not found", "invalid"),
+        )
+        self.assertEqual(
+            error_cache_key(NotFound()),
+            (NotFound, "str", "Not found.", "not_found"),
+        )
+
+        # field errors and plain exceptions keep the usual formatting.
+        self.assertIsNone(error_cache_key(ValidationError({"field": ["bad"]})))
+        self.assertIsNone(error_cache_key(ValidationError(["one", "two"])))
+        self.assertIsNone(error_cache_key(ValueError("boom")))
+
+        # messages that change from one request to the next.
+        self.assertIsNone(error_cache_key(Throttled(wait=30)))
+        self.assertIsNone(error_cache_key(ParseError("JSON parse error - line 1")))
+
+    @patch(
+        "core.base.exception_handler.exception_handler._error_responses", OrderedDict()
+    )
+    def test_02_same_data_as_uncached(self):
+        first = custom_exception_handler(ValidationError("secret not found"), None)
+        second = custom_exception_handler(ValidationError("secret not found"), None)
+
+        self.assertIsInstance(second, PreRenderedResponse)
+        self.assertEqual(first.data, second.data)
+        # changing one response's data doesn't change the next.
+        second.data["detail"] = "changed"
+        third = custom_exception_handler(ValidationError("secret not found"), None)
+        self.assertEqual(
+            third.data,
+            {
+                "errors": [{"detail": "secret not found"}],
+                "detail": "secret not found",
+                "code": "invalid",
+            },
+        )
+
+    @patch(
+        "core.base.exception_handler.exception_handler._error_responses", OrderedDict()
+    )
+    def test_03_headers_kept(self):
+        for _ in range(2):
+            # set by rest_framework's views from the authenticator.
+            exc = NotAuthenticated()
+            exc.auth_header = "Bearer"
+            response = custom_exception_handler(exc, None)
+
+        self.assertIsInstance(response, PreRenderedResponse)
+        self.assertEqual(response["WWW-Authenticate"], "Bearer")
+
+        # not cached, but still formatted as usual.
+        response = custom_exception_handler(Throttled(wait=30), None)
+        self.assertNotIsInstance(response, PreRenderedResponse)
+        self.assertEqual(response["Retry-After"], "30")
+
+    @patch(
+        "core.base.exception_handler.exception_handler._error_responses", OrderedDict()
+    )
+    def test_04_rendered_once(self):
+        url = "/api/secret/retrieve/"
+
+        first = self.client.post(url, {"secret_id": str(uuid4())}, format="json")
+        second = self.client.post(url, {"secret_id": str(uuid4())}, format="json")
+
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(second["Content-Type"], "application/json")
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second.json()["detail"], "secret not found")
+
+    @patch("core.base.exception_handler.exception_handler.ERROR_RESPONSE_CACHE_SIZE", 2)
+    def test_05_cache_bounded(self):
+        with patch(
+            "core.base.exception_handler.exception_handler._error_responses",
+            OrderedDict(),
+        ) as cache:
+            for message in ["first", "second", "first", "third"]:
+                custom_exception_handler(ValidationError(message), None)
+
+        # the least recently used error made way for the newest.
+        self.assertEqual([key[2] for key in cache], ["first", "third"])
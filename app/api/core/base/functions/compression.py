@@ -0,0 +1,118 @@
+import bz2
+import codecs
+import lzma
+import zlib
+
+CODECS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+    "bz2": (bz2.compress, bz2.decompress),
+}
+
+# incremental decompressors, for `iter_decompress_text`.
+DECOMPRESSORS = {
+    "zlib": zlib.decompressobj,
+    "lzma": lzma.LZMADecompressor,
+    "bz2": bz2.BZ2Decompressor,
+}
+
+
+def compress_text(text: str, codec: str, threshold: int) -> tuple:
+    """
+    Compresses `text` if it is at least `threshold` bytes long once encoded and the result is smaller.
+
+    Parameters:
+        text (str): The text to compress.
+        codec (str): One of `CODECS`, or "none" to never compress.
+        threshold (int): The smallest encoded size, in bytes, worth compressing.
+
+    Returns:
+        tuple: (codec, bytes) when compressed, otherwise (None, None) and `text` should be stored as it is.
+    """
+    if codec == "none" or text is None:
+        return None, None
+
+    if codec not in CODECS:
+        raise ValueError(f"Unsupported compression codec: {codec}")
+
+    encoded = text.encode("utf-8")
+
+    if len(encoded) < threshold:
+        return None, None
+
+    compress, _ = CODECS[codec]
+    compressed = compress(encoded)
+
+    # random or already compressed data can grow, keep those as text.
+    if len(compressed) >= len(encoded):
+        return None, None
+
+    return codec, compressed
+
+
+def decompress_text(codec: str, data) -> str:
+    """
+    Reverses `compress_text`.
+
+    Parameters:
+        codec (str): The codec recorded when the data was compressed.
+        data (bytes | memoryview): The compressed bytes.
+
+    Returns:
+        str: The original text.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unsupported compression codec: {codec}")
+
+    _, decompress = CODECS[codec]
+    return decompress(bytes(data)).decode("utf-8")
+
+
+def iter_decompress_text(codec: str, data, chunk_size: int):
+    """
+    Reverses `compress_text` a piece at a time, so the whole text is never held in memory at once.
+
+    Parameters:
+        codec (str): The codec recorded when the data was compressed.
+        data (bytes | memoryview): The compressed bytes.
+        chunk_size (int): The most bytes decompressed at a time.
+
+    Returns:
+        Iterator[str]: The original text in pieces of about `chunk_size` bytes once encoded.
+    """
+    if codec not in DECOMPRESSORS:
+        raise ValueError(f"Unsupported compression codec: {codec}")
+
+    decompressor = DECOMPRESSORS[codec]()
+    # multi-byte characters may be split between pieces.
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    data = memoryview(data)
+
+    # the input is fed in pieces too, as one piece of well compressed input can hold the whole text.
+    for offset in range(0, len(data), chunk_size):
+        if codec == "zlib":
+            chunk = decompressor.decompress(
+                data[offset : offset + chunk_size], chunk_size
+            )
+            yield decoder.decode(chunk)
+
+            while decompressor.unconsumed_tail:
+                chunk = decompressor.decompress(
+                    decompressor.unconsumed_tail, chunk_size
+                )
+                yield decoder.decode(chunk)
+
+        else:
+            chunk = decompressor.decompress(
+                data[offset : offset + chunk_size], max_length=chunk_size
+            )
+            yield decoder.decode(chunk)
+
+            while not decompressor.needs_input and not decompressor.eof:
+                chunk = decompressor.decompress(b"", max_length=chunk_size)
+                yield decoder.decode(chunk)
+
+    if codec == "zlib":
+        yield decoder.decode(decompressor.flush(), final=True)
+    else:
+        yield decoder.decode(b"", final=True)
@@ -1,3 +1,4 @@
+import hashlib
 import secrets
 import string
 
@@ -71,3 +72,13 @@ class RandomStringGenerator:
             repeatedly choosing random characters from the pre-defined set.
         """
         return "".join(secrets.choice(self.characters) for _ in range(self.length))
+
+
+def token_digest(token: str) -> bytes:
+    """
+    Returns the SHA-256 digest of a random token, so that the token can be stored and looked up by its digest.
+
+    Tokens from `RandomStringGenerator` are long enough that an unkeyed digest can't be reversed, and Postgres
+    computes the same digest with `sha256(convert_to(token, 'UTF8'))`.
+    """
+    return hashlib.sha256(token.encode()).digest()
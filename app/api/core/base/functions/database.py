@@ -0,0 +1,173 @@
+import contextvars
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from core.base.functions.metrics import Collected
+
+logger = logging.getLogger(__name__)
+
+# psycopg_pool only reports counters that have changed from zero, so every key is filled in.
+POOL_STAT_KEYS = (
+    "pool_min",
+    "pool_max",
+    "pool_size",
+    "pool_available",
+    "requests_waiting",
+    "requests_num",
+    "requests_queued",
+    "requests_wait_ms",
+    "requests_errors",
+    "usage_ms",
+    "connections_num",
+    "connections_ms",
+    "connections_errors",
+    "connections_lost",
+)
+
+
+def pool_stats(alias: str = "default"):
+    """
+    Returns a snapshot of the connection pool behind a database alias.
+
+    Parameters:
+        alias (str): The alias in `settings.DATABASES`.
+
+    Returns:
+        dict: The pool's size (`pool_size` open, `pool_available` idle), the requests `requests_waiting` for a
+              connection now, and since the pool opened: connections handed out (`requests_num`), those that had
+              to wait (`requests_queued`) and the total ms spent waiting (`requests_wait_ms`), failed checkouts
+              (`requests_errors`), and the number and total ms of connections opened to the server
+              (`connections_num`, `connections_ms`). Returns None if the alias isn't pooled.
+    """
+    pool = getattr(connections[alias], "pool", None)
+
+    if pool is None:
+        return None
+
+    stats = pool.get_stats()
+
+    return {key: stats.get(key, 0) for key in POOL_STAT_KEYS}
+
+
+def pool_gauge(key: str, scale: float = 1):
+    """
+    Returns a collector of one `pool_stats` key for every pooled database alias.
+    """
+
+    def collect():
+        pools = {alias: pool_stats(alias) for alias in settings.DATABASES}
+        return {alias: stats[key] * scale for alias, stats in pools.items() if stats}
+
+    return collect
+
+
+Collected(
+    "secretburner_db_pool_connections",
+    "Connections open in the pool.",
+    pool_gauge("pool_size"),
+    label="alias",
+)
+Collected(
+    "secretburner_db_pool_available_connections",
+    "Idle connections in the pool.",
+    pool_gauge("pool_available"),
+    label="alias",
+)
+Collected(
+    "secretburner_db_pool_waiting_requests",
+    "Requests waiting for a connection from the pool.",
+    pool_gauge("requests_waiting"),
+    label="alias",
+)
+Collected(
+    "secretburner_db_pool_wait_seconds_total",
+    "Time spent waiting for a connection from the pool.",
+    pool_gauge("requests_wait_ms", 0.001),
+    type="counter",
+    label="alias",
+)
+
+# a one item list, so queries run in threads by sync_to_async are counted in the request's own counter.
+_query_count = contextvars.ContextVar("query_count", default=None)
+
+
+def start_counting_queries():
+    """
+    Starts counting the queries run in the current context, e.g. for one request.
+
+    Returns:
+        list: A one item list holding the number of queries run since.
+    """
+    counter = [0]
+    _query_count.set(counter)
+    return counter
+
+
+def count_queries(execute, sql, params, many, context):
+    """
+    A database execute wrapper that adds each query to the counter from `start_counting_queries`, if any.
+    """
+    counter = _query_count.get()
+
+    if counter is not None:
+        counter[0] += 1
+
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """
+    Adds `count_queries` to a connection when it's opened, connected to the `connection_created` signal.
+    """
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def sticky_key(model, field: str, value) -> str:
+    return f"db_sticky_{model._meta.label_lower}_{field}_{value}"
+
+
+def mark_written(*instances):
+    """
+    Records that `instances` were just written, so reads looking them up by one of their model's
+    `replica_sticky_fields` go to the primary for `REPLICA_STICKY_SECONDS`, until the replicas have caught up.
+    The write has already happened, so a cache error is only logged; `recently_written` then also fails over to
+    the primary.
+    """
+    keys = {
+        sticky_key(type(instance), field, getattr(instance, field)): 1
+        for instance in instances
+        for field in getattr(type(instance), "replica_sticky_fields", ())
+        if getattr(instance, field) is not None
+    }
+
+    if not keys:
+        return
+
+    try:
+        cache.set_many(keys, timeout=settings.REPLICA_STICKY_SECONDS)
+    except Exception as e:
+        logger.warning("Could not record write for replica routing: %s", e)
+
+
+def recently_written(model, lookups: dict) -> bool:
+    """
+    Returns whether a row matching any of the exact or `__in` `lookups` (field name to value) was recently
+    written. If the cache can't be reached this assumes it was, so the read goes to the primary.
+    """
+    keys = []
+    for lookup, value in lookups.items():
+        field, _, kind = lookup.partition("__")
+        values = value if kind == "in" else [value]
+        keys.extend(sticky_key(model, field, value) for value in values)
+
+    if not keys:
+        return False
+
+    try:
+        return bool(cache.get_many(keys))
+    except Exception:
+        return True
@@ -0,0 +1,223 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from core.base.exceptions import ServiceBusyError
+from core.base.functions.metrics import Collected, Histogram
+
+HASHING_SECONDS = Histogram(
+    "secretburner_hashing_duration_seconds",
+    "Time taken by password hashes and checks (Argon2), from submission to completion.",
+)
+
+
+def _init_worker():
+    """
+    Prepares a freshly started pool process so that Django's password hashers can read the settings.
+    """
+    django.setup()
+
+
+class HashingService:
+    """
+    Runs password hashing and verification (Argon2 by default) in a bounded pool of worker processes.
+
+    Argon2 is deliberately CPU and memory hard. Running it on the request thread holds the GIL for tens of
+    milliseconds per call and starves cheap requests. This service moves that work to other processes and
+    caps the number of hashes that may be running or waiting at any one time. Once the cap is reached new
+    work is rejected immediately with a `ServiceBusyError` (HTTP 503) rather than queueing without limit.
+
+    Attributes:
+        pool_size (int): Number of worker processes. 0 runs the hashes in the calling process instead.
+        max_queue (int): Number of hashes allowed to wait for a free worker before rejecting.
+    """
+
+    def __init__(self, pool_size: int, max_queue: int, start_method: str = "spawn"):
+        self.pool_size = pool_size
+        self.max_queue = max_queue
+        self.start_method = start_method
+
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return max(self.pool_size, 1) + self.max_queue
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    def _acquire(self):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise ServiceBusyError()
+            self._in_flight += 1
+
+    def _release(self, started: float):
+        elapsed = time.perf_counter() - started
+        HASHING_SECONDS.observe(elapsed)
+
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            self._total_seconds += elapsed
+            self._max_seconds = max(self._max_seconds, elapsed)
+
+    def submit(self, fn, *args) -> Future:
+        """
+        Queues `fn(*args)` on the pool.
+
+        Parameters:
+            fn (callable): A picklable, module level function.
+            *args: Picklable arguments for `fn`.
+
+        Returns:
+            Future: Resolves to the return value of `fn`.
+
+        Raises:
+            ServiceBusyError: When the pool and its queue are already full.
+        """
+        self._acquire()
+        started = time.perf_counter()
+
+        try:
+            with self._lock:
+                executor = self._get_executor()
+
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # a worker died (e.g. OOM killed), start a new pool and try once more.
+                with self._lock:
+                    self._executor = None
+                    executor = self._get_executor()
+                future = executor.submit(fn, *args)
+
+        except Exception:
+            self._release(started)
+            raise
+
+        future.add_done_callback(lambda _: self._release(started))
+        return future
+
+    def run(self, fn, *args):
+        if self.pool_size <= 0:
+            return self._run_inline(fn, *args)
+        return self.submit(fn, *args).result()
+
+    async def arun(self, fn, *args):
+        if self.pool_size <= 0:
+            return await sync_to_async(self._run_inline)(fn, *args)
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def _run_inline(self, fn, *args):
+        self._acquire()
+        started = time.perf_counter()
+
+        try:
+            return fn(*args)
+        finally:
+            self._release(started)
+
+    def stats(self) -> dict:
+        """
+        Returns a snapshot of the service's metrics.
+
+        Returns:
+            dict: `in_flight` hashes (running or queued), `queue_depth` (waiting for a worker), the number
+                  `completed` and `rejected`, and the mean and max latency in seconds, measured from submission
+                  to completion.
+        """
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.pool_size),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "latency_mean_seconds": (
+                    self._total_seconds / self._completed if self._completed else 0.0
+                ),
+                "latency_max_seconds": self._max_seconds,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_hashing_service() -> HashingService:
+    global _service
+
+    with _service_lock:
+        if _service is None:
+            _service = HashingService(
+                pool_size=settings.HASHING_POOL_SIZE,
+                max_queue=settings.HASHING_POOL_MAX_QUEUE,
+                start_method=settings.HASHING_POOL_START_METHOD,
+            )
+        return _service
+
+
+def make_password(password: str) -> str:
+    return get_hashing_service().run(hashers.make_password, password)
+
+
+def check_password(password: str, encoded: str) -> bool:
+    return get_hashing_service().run(hashers.check_password, password, encoded)
+
+
+async def amake_password(password: str) -> str:
+    return await get_hashing_service().arun(hashers.make_password, password)
+
+
+async def acheck_password(password: str, encoded: str) -> bool:
+    return await get_hashing_service().arun(hashers.check_password, password, encoded)
+
+
+def hashing_gauge(key: str):
+    return lambda: get_hashing_service().stats()[key]
+
+
+Collected(
+    "secretburner_hashing_in_flight",
+    "Hashes running or waiting for a worker.",
+    hashing_gauge("in_flight"),
+)
+Collected(
+    "secretburner_hashing_queue_depth",
+    "Hashes waiting for a worker.",
+    hashing_gauge("queue_depth"),
+)
+Collected(
+    "secretburner_hashing_rejected_total",
+    "Hashes rejected because the pool and its queue were full.",
+    hashing_gauge("rejected"),
+    type="counter",
+)
@@ -1,25 +1,31 @@
+import logging
 from typing import List
 from django.conf import settings
-from django.core.mail import send_mail as django_send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
 from django.template.loader import get_template
 
 from core.base.functions.data import contains_invalid_characters
+from core.base.functions.metrics import Collected, Counter, Histogram
+from core.base.functions.time import seconds_from_now_timestamp
+from core.base.models import OutboxEmail
 
+logger = logging.getLogger(__name__)
 
-def send_mail(*args, **kwargs):
-    """
-    Sends an email only if the email sending feature is enabled in the settings.
-
-    This function wraps Django's `send_mail` function, adding a conditional check to ensure
-    that emails are only sent when the `ALLOW_EMAIL` setting is true. This is useful for
-    controlling email sending in different environments (e.g., development, testing, production).
-
-    Parameters:
-        *args: Variable length argument list passed directly to `django_send_mail`.
-        **kwargs: Arbitrary keyword arguments passed directly to `django_send_mail`.
-    """
-    if settings.ALLOW_EMAIL is True:
-        django_send_mail(*args, **kwargs)
+MAIL_RENDER_SECONDS = Histogram(
+    "secretburner_mail_render_duration_seconds",
+    "Time taken to render a queued email's templates.",
+)
+MAIL_SEND_SECONDS = Histogram(
+    "secretburner_mail_send_duration_seconds",
+    "Time taken to hand a rendered email to the email backend.",
+)
+MAILS = Counter(
+    "secretburner_mail_total",
+    "Queued emails sent, failed and dropped after their last attempt.",
+    labels=("outcome",),
+)
 
 
 def build_email_templates(
@@ -53,26 +59,221 @@ def build_email_templates(
     return rendered_html, rendered_text
 
 
-def render_and_send_mail(
-    subject: str, template_name: str, context: object, recipient_list: List[str]
-):
+def validate_template_name(template_name: str):
     # check the template. If there are any characters that are 0-9, a-Z or hyphens/underscores,
     # just bail out of this function.
     if contains_invalid_characters(template_name):
         raise Exception("Invalid template name")
 
-    # render the templates
-    rendered_html, rendered_text = build_email_templates(
-        html_template=f"email/html/{template_name}.html",
-        text_template=f"email/text/{template_name}.txt",
+
+def queue_mail(
+    subject: str,
+    template_name: str,
+    context: dict,
+    recipient_list: List[str],
+    priority: int = OutboxEmail.PRIORITY_NOTIFICATION,
+):
+    """
+    Adds an email to the outbox for the `send_queued_mail` worker to render and send.
+
+    Nothing is queued when the `ALLOW_EMAIL` setting is off.
+
+    Parameters:
+        subject (str): The subject line of the email.
+        template_name (str): Name of the html/text template pair in `email/`.
+        context (dict): JSON serializable context used to render the templates.
+        recipient_list (list of str): Addresses to send the email to.
+        priority (int): Lower values are sent first. See `OutboxEmail`.
+
+    Returns:
+        OutboxEmail or None: The queued email, if one was queued.
+    """
+    validate_template_name(template_name)
+
+    if settings.ALLOW_EMAIL is not True:
+        return None
+
+    return OutboxEmail.objects.create(
+        subject=subject,
+        template_name=template_name,
         context=context,
+        recipient_list=recipient_list,
+        priority=priority,
     )
 
-    # send the email
-    send_mail(
+
+async def aqueue_mail(
+    subject: str,
+    template_name: str,
+    context: dict,
+    recipient_list: List[str],
+    priority: int = OutboxEmail.PRIORITY_NOTIFICATION,
+):
+    """
+    Async version of `queue_mail`, used by the API views.
+    """
+    validate_template_name(template_name)
+
+    if settings.ALLOW_EMAIL is not True:
+        return None
+
+    return await OutboxEmail.objects.acreate(
         subject=subject,
-        message=rendered_text,
-        from_email=settings.MAILER_FROM_EMAIL,
+        template_name=template_name,
+        context=context,
         recipient_list=recipient_list,
-        html_message=rendered_html,
+        priority=priority,
+    )
+
+
+async def aqueue_mails(emails: List[dict]):
+    """
+    Adds several emails to the outbox in one insert, e.g. one per recipient of a batch of secrets.
+
+    Parameters:
+        emails (list of dict): The keyword arguments of `queue_mail` for each email.
+
+    Returns:
+        list of OutboxEmail: The queued emails, none if the `ALLOW_EMAIL` setting is off.
+    """
+    for email in emails:
+        validate_template_name(email["template_name"])
+
+    if settings.ALLOW_EMAIL is not True or not emails:
+        return []
+
+    # bulk_create skips OutboxEmail.save(), so send_after is set here.
+    send_after = seconds_from_now_timestamp(0)
+
+    return await OutboxEmail.objects.abulk_create(
+        [OutboxEmail(send_after=send_after, **email) for email in emails]
+    )
+
+
+def build_outbox_message(outbox_email: OutboxEmail):
+    """
+    Renders a queued email into a message ready to be handed to the email backend.
+
+    Parameters:
+        outbox_email (OutboxEmail): The queued email.
+
+    Returns:
+        EmailMultiAlternatives: The rendered message with both text and html parts.
+    """
+    validate_template_name(outbox_email.template_name)
+
+    rendered_html, rendered_text = build_email_templates(
+        html_template=f"email/html/{outbox_email.template_name}.html",
+        text_template=f"email/text/{outbox_email.template_name}.txt",
+        context=outbox_email.context,
     )
+
+    message = EmailMultiAlternatives(
+        subject=outbox_email.subject,
+        body=rendered_text,
+        from_email=settings.MAILER_FROM_EMAIL,
+        to=outbox_email.recipient_list,
+    )
+    message.attach_alternative(rendered_html, "text/html")
+
+    return message
+
+
+def claim_queued_mail(batch_size: int) -> list:
+    """
+    Claims up to `batch_size` emails that are due, verification codes first, in a short transaction of its own.
+
+    Rows are picked with `SELECT ... FOR UPDATE SKIP LOCKED` so several workers can drain the outbox at the same
+    time. Each claimed email counts as an attempt and isn't due again for `MAIL_OUTBOX_CLAIM_SECONDS`, so other
+    workers leave it alone while it is being sent, and it is retried if this worker stops before it's done.
+
+    Returns:
+        list of OutboxEmail: The claimed emails.
+    """
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(send_after__lte=seconds_from_now_timestamp(0))
+            .order_by("priority", "send_after")[:batch_size]
+        )
+
+        if batch:
+            OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                attempts=F("attempts") + 1,
+                send_after=seconds_from_now_timestamp(
+                    settings.MAIL_OUTBOX_CLAIM_SECONDS
+                ),
+            )
+
+    for outbox_email in batch:
+        outbox_email.attempts += 1
+
+    return batch
+
+
+def send_queued_mail(batch_size: int = None):
+    """
+    Sends one batch of queued emails over a single backend connection.
+
+    The batch is claimed with `claim_queued_mail`, then sent outside of any transaction so no row locks are held
+    while the ESP is waited on. Each email is deleted as soon as it has been sent, so if the worker stops part way
+    only the email being sent at the time can go out twice. A failed email is retried with an exponential
+    back-off until `MAIL_OUTBOX_MAX_ATTEMPTS` is reached, at which point it is dropped.
+
+    Parameters:
+        batch_size (int, optional): Maximum number of emails to send. Defaults to `MAIL_OUTBOX_BATCH_SIZE`.
+
+    Returns:
+        tuple: The number of emails sent and the number that failed.
+    """
+    batch = claim_queued_mail(batch_size or settings.MAIL_OUTBOX_BATCH_SIZE)
+    sent, failed = 0, 0
+
+    if not batch:
+        return sent, failed
+
+    with get_connection() as connection:
+        for outbox_email in batch:
+            try:
+                with MAIL_RENDER_SECONDS.time():
+                    message = build_outbox_message(outbox_email)
+
+                with MAIL_SEND_SECONDS.time():
+                    connection.send_messages([message])
+
+            except Exception as e:
+                failed += 1
+                MAILS.inc(outcome="failed")
+
+                if outbox_email.attempts >= settings.MAIL_OUTBOX_MAX_ATTEMPTS:
+                    MAILS.inc(outcome="dropped")
+                    logger.error(
+                        "Dropping email %s after %s attempts: %s",
+                        outbox_email.pk,
+                        outbox_email.attempts,
+                        e,
+                    )
+                    outbox_email.delete()
+                    continue
+
+                outbox_email.last_error = str(e)
+                outbox_email.send_after = seconds_from_now_timestamp(
+                    settings.MAIL_OUTBOX_RETRY_SECONDS
+                    * 2 ** (outbox_email.attempts - 1)
+                )
+                outbox_email.save(update_fields=["last_error", "send_after"])
+                continue
+
+            OutboxEmail.objects.filter(pk=outbox_email.pk).delete()
+            sent += 1
+            MAILS.inc(outcome="sent")
+
+    return sent, failed
+
+
+Collected(
+    "secretburner_mail_outbox",
+    "Emails waiting in the outbox, including those waiting to be retried.",
+    lambda: OutboxEmail.objects.count(),
+    cache_seconds=settings.METRICS_LIVE_SECONDS,
+)
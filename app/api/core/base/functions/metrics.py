@@ -0,0 +1,276 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+# seconds, from a fast lookup to a slow Argon2 hash or email.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name: str, labels: dict, value) -> str:
+    if labels:
+        name += "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+    return f"{name} {value}"
+
+
+class Metric:
+    """
+    A metric kept in this process and rendered by `render_metrics` in the Prometheus text format, e.g. for
+    /api/metrics/. Recording one is a dict update under a lock, cheap enough for every request.
+
+    Attributes:
+        name (str): The metric's name, unique in the process.
+        help (str): What it measures, rendered as its `# HELP` line.
+        labels (tuple of str): The names of the labels each value is recorded with.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+        self._values = {}
+        self._lock = threading.Lock()
+
+        register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self):
+        """
+        Returns (name, labels, value) for each value recorded.
+        """
+        with self._lock:
+            values = dict(self._values)
+
+        for key, value in values.items():
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labels: tuple = (), buckets=DEFAULT_BUCKETS
+    ):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labels)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # the first bucket the value fits in, or the +Inf one past the end.
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            counts = self._values.get(key)
+
+            if counts is None:
+                # one count per bucket including +Inf, then the sum.
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+
+        for key, counts in values.items():
+            labels = dict(zip(self.labels, key))
+            total = 0
+
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                total += count
+                yield f"{self.name}_bucket", {**labels, "le": bound}, total
+
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, total
+
+
+def cached_collect(collect, seconds: float):
+    """
+    Returns `collect`, reusing what it returned for `seconds`, e.g. to share one database query between the
+    `Collected` metrics it feeds.
+    """
+    lock = threading.Lock()
+    cached = [None, None]  # when it was collected, and what.
+
+    def collect_cached():
+        now = time.monotonic()
+
+        with lock:
+            if cached[0] is not None and now - cached[0] < seconds:
+                return cached[1]
+
+        value = collect()
+
+        with lock:
+            cached[:] = now, value
+
+        return value
+
+    return collect_cached
+
+
+class Collected(Metric):
+    """
+    A metric read when it is rendered instead of recorded as things happen, e.g. from one of the `*_stats()`
+    functions, so it costs nothing in between scrapes.
+
+    Attributes:
+        collect (callable): Returns the value, or a dict of values keyed by the value of the metric's one label,
+                            or None to leave the metric out.
+        cache_seconds (float): How long a value is reused for, for collectors that query the database.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        collect,
+        type: str = "gauge",
+        label: str = None,
+        cache_seconds: float = 0,
+    ):
+        self.type = type
+        self.collect = collect
+        self.cache_seconds = cache_seconds
+        self._collect = cached_collect(collect, cache_seconds)
+        super().__init__(name, help, (label,) if label else ())
+
+    def samples(self):
+        value = self._collect()
+
+        if value is None:
+            return
+
+        if not self.labels:
+            yield self.name, {}, value
+            return
+
+        for label_value, labelled in value.items():
+            yield self.name, {self.labels[0]: label_value}, labelled
+
+
+def register(metric: Metric):
+    with _registry_lock:
+        if metric.name in _registry:
+            raise ValueError(f"Metric already registered: {metric.name}")
+
+        _registry[metric.name] = metric
+
+
+def render_metrics() -> str:
+    """
+    Returns every registered metric in the Prometheus text format. A metric whose collector fails is left out
+    and logged, so the rest are still reported.
+    """
+    with _registry_lock:
+        metrics = list(_registry.values())
+
+    lines = []
+
+    for metric in metrics:
+        try:
+            samples = [_format_sample(*sample) for sample in metric.samples()]
+
+        except Exception as e:
+            logger.warning("Failed to collect metric %s: %s", metric.name, e)
+            continue
+
+        lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(samples)
+
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        token = self.server.token
+
+        # as /api/metrics/ does, nothing is served without a token.
+        if not token or not constant_time_compare(
+            self.headers.get("Authorization", ""), f"Bearer {token}"
+        ):
+            self.send_response(401)
+            self.send_header("WWW-Authenticate", "Bearer")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = render_metrics().encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(
+    port: int, token: str, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """
+    Serves `render_metrics` over HTTP from a daemon thread, for processes other than the API, e.g. the
+    `send_queued_mail` worker, whose metrics /api/metrics/ can't report.
+
+    Parameters:
+        port (int): The port to listen on.
+        token (str): The bearer token a scrape must give, as METRICS_TOKEN is for /api/metrics/. Every request
+                     is refused when it is empty.
+        host (str): The address to listen on, only this host's by default.
+
+    Returns:
+        ThreadingHTTPServer: The server, already serving.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.token = token
+    thread = threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    )
+    thread.start()
+
+    return server
@@ -0,0 +1,53 @@
+import unittest
+from .compression import compress_text, decompress_text, iter_decompress_text
+
+
+class TestCompressionFunctions(unittest.TestCase):
+
+    def test_01_round_trip(self):
+        text = "apiVersion: v1\nkind: Config\n" * 200
+
+        for codec in ["zlib", "lzma", "bz2"]:
+            used, compressed = compress_text(text, codec=codec, threshold=1024)
+
+            self.assertEqual(used, codec)
+            self.assertLess(len(compressed), len(text))
+            self.assertEqual(decompress_text(used, compressed), text)
+
+    def test_02_below_threshold(self):
+        self.assertEqual(
+            compress_text("short secret", codec="zlib", threshold=1024), (None, None)
+        )
+
+    def test_03_disabled(self):
+        self.assertEqual(
+            compress_text("x" * 4096, codec="none", threshold=0), (None, None)
+        )
+
+    def test_04_kept_as_text_when_compression_grows_it(self):
+        # the codec's header alone is larger than a tiny text.
+        self.assertEqual(compress_text("ab", codec="zlib", threshold=0), (None, None))
+
+    def test_05_unicode(self):
+        text = "pässwörd ✓\n" * 500
+        codec, compressed = compress_text(text, codec="zlib", threshold=0)
+
+        self.assertEqual(decompress_text(codec, memoryview(compressed)), text)
+
+    def test_06_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            compress_text("x" * 4096, codec="snappy", threshold=0)
+
+    def test_07_iter_decompress(self):
+        text = "pässwörd ✓\n" * 50000 + "KEY=value\n" * 50000
+
+        for codec in ["zlib", "lzma", "bz2"]:
+            _, compressed = compress_text(text, codec=codec, threshold=0)
+            pieces = list(iter_decompress_text(codec, memoryview(compressed), 4096))
+
+            self.assertEqual("".join(pieces), text)
+            # a multi-byte character split between pieces is carried over to the next one.
+            self.assertLessEqual(max(len(piece.encode()) for piece in pieces), 4096 + 3)
+
+        with self.assertRaises(ValueError):
+            list(iter_decompress_text("snappy", b"", 4096))
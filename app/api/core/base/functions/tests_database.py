@@ -0,0 +1,33 @@
+import unittest
+from unittest.mock import PropertyMock, patch
+from uuid import uuid4
+
+from django.db import connection, connections
+from django.test import TestCase
+
+from secret.models import Secret
+from .database import POOL_STAT_KEYS, pool_stats
+
+
+class PoolStatsTest(TestCase):
+
+    @unittest.skipUnless(
+        connection.settings_dict["OPTIONS"].get("pool"), "DATABASE_POOL is off"
+    )
+    def test_01_pool_stats(self):
+        Secret.objects.filter(secret_id=uuid4()).first()
+
+        stats = pool_stats()
+
+        self.assertEqual(set(stats), set(POOL_STAT_KEYS))
+        self.assertGreaterEqual(stats["requests_num"], 1)
+        self.assertGreaterEqual(stats["pool_size"], 1)
+
+    def test_02_not_pooled(self):
+        with patch.object(
+            type(connections["default"]),
+            "pool",
+            new_callable=PropertyMock,
+            return_value=None,
+        ):
+            self.assertIsNone(pool_stats())
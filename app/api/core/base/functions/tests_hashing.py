@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.base.exceptions import ServiceBusyError
+from .hashing import HashingService
+
+
+def _fail():
+    raise ValueError("boom")
+
+
+class TestHashingService(unittest.TestCase):
+
+    def test_01_inline_hash_and_check(self):
+        service = HashingService(pool_size=0, max_queue=0)
+
+        encoded = service.run(make_password, "my_secret_passphrase")
+
+        self.assertTrue(check_password("my_secret_passphrase", encoded))
+        self.assertTrue(service.run(check_password, "my_secret_passphrase", encoded))
+        self.assertEqual(service.stats()["completed"], 2)
+        self.assertEqual(service.stats()["in_flight"], 0)
+
+    def test_02_pool_hash_and_check(self):
+        service = HashingService(pool_size=1, max_queue=1)
+
+        try:
+            encoded = asyncio.run(service.arun(make_password, "my_secret_passphrase"))
+            self.assertTrue(
+                service.run(check_password, "my_secret_passphrase", encoded)
+            )
+            self.assertFalse(service.run(check_password, "wrong", encoded))
+        finally:
+            service.shutdown()
+
+        stats = service.stats()
+        self.assertEqual(stats["completed"], 3)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreater(stats["latency_max_seconds"], 0)
+
+    def test_03_rejects_when_saturated(self):
+        service = HashingService(pool_size=0, max_queue=0)
+
+        # occupy the only slot.
+        service._acquire()
+
+        with self.assertRaises(ServiceBusyError):
+            service.run(make_password, "my_secret_passphrase")
+
+        self.assertEqual(service.stats()["rejected"], 1)
+
+    def test_04_slot_released_on_error(self):
+        service = HashingService(pool_size=0, max_queue=0)
+
+        with self.assertRaises(ValueError):
+            service.run(_fail)
+
+        self.assertEqual(service.stats()["in_flight"], 0)
+
+
+class TestHashingServiceBusyResponse(APITestCase):
+
+    @patch("core.base.functions.hashing.get_hashing_service")
+    def test_01_busy_returns_503(self, mock_get_hashing_service):
+        service = HashingService(pool_size=0, max_queue=0)
+        service._acquire()
+        mock_get_hashing_service.return_value = service
+
+        response = self.client.post(
+            "/api/secret/",
+            {"secret_text": "secret", "expiry_seconds": 120, "passphrase": "pass"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.data["code"], "service_busy")
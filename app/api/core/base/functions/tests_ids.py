@@ -0,0 +1,42 @@
+import unittest
+import uuid
+from unittest.mock import patch
+
+from .ids import parse_uuid, uuid7
+
+
+class TestIds(unittest.TestCase):
+
+    def test_01_uuid7_version_and_variant(self):
+        value = uuid7()
+
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+
+    def test_02_uuid7_timestamp(self):
+        with patch(
+            "core.base.functions.ids.time.time_ns",
+            return_value=1_700_000_000_123_456_789,
+        ):
+            value = uuid7()
+
+        self.assertEqual(value.int >> 80, 1_700_000_000_123)
+
+    def test_03_uuid7_time_ordered(self):
+        with patch("core.base.functions.ids.time.time_ns") as time_ns:
+            time_ns.side_effect = [n * 1_000_000 for n in range(1, 101)]
+            values = [uuid7() for _ in range(100)]
+
+        self.assertEqual(sorted(values), values)
+        self.assertEqual(sorted(str(v) for v in values), [str(v) for v in values])
+        self.assertEqual(len(set(values)), 100)
+
+    def test_04_parse_uuid(self):
+        value = uuid.uuid4()
+
+        self.assertEqual(parse_uuid(str(value)), value)
+        self.assertEqual(parse_uuid(value.hex), value)
+        self.assertEqual(parse_uuid(str(value).upper()), value)
+        self.assertEqual(parse_uuid(value), value)
+        self.assertIsNone(parse_uuid("some-secret-id"))
+        self.assertIsNone(parse_uuid(None))
@@ -1,26 +1,21 @@
 import unittest
 from unittest.mock import patch, MagicMock
-from .mail import send_mail, build_email_templates, render_and_send_mail, settings
+from django.core import mail
+from django.test import TestCase, override_settings
+from core.base.models import OutboxEmail
+from asgiref.sync import async_to_sync
+from .mail import (
+    aqueue_mails,
+    build_email_templates,
+    queue_mail,
+    send_queued_mail,
+)
 
 
 class EmailFunctionTests(unittest.TestCase):
 
-    @patch("core.base.functions.mail.django_send_mail")
-    @patch("core.base.functions.mail.settings")
-    def test_01_send_mail_enabled(self, mock_settings, mock_send_mail):
-        mock_settings.ALLOW_EMAIL = True
-        send_mail("Subject", "Message", "from@localhost", ["to@localhost"])
-        mock_send_mail.assert_called_once()
-
-    @patch("core.base.functions.mail.django_send_mail")
-    @patch("core.base.functions.mail.settings")
-    def test_02_send_mail_disabled(self, mock_settings, mock_send_mail):
-        mock_settings.ALLOW_EMAIL = False
-        send_mail("Subject", "Message", "from@localhost", ["to@localhost"])
-        mock_send_mail.assert_not_called()
-
     @patch("core.base.functions.mail.get_template")
-    def test_03_build_email_templates(self, mock_get_template):
+    def test_01_build_email_templates(self, mock_get_template):
         # Mock the template and its render method
         mock_template = MagicMock()
         mock_template.render.return_value = "Rendered Content"
@@ -38,39 +33,138 @@ class EmailFunctionTests(unittest.TestCase):
         mock_template.render.assert_called_with({"key": "value"})
 
 
-class TestRenderAndSendMail(unittest.TestCase):
+class TestMailOutbox(TestCase):
+
+    @patch("core.base.functions.mail.settings")
+    def test_01_queue_mail(self, mock_settings):
+        mock_settings.ALLOW_EMAIL = True
+
+        outbox_email = queue_mail(
+            "Test Subject", "verify-email", {"code": "123456"}, ["to@example.com"]
+        )
+
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+        self.assertEqual(outbox_email.priority, OutboxEmail.PRIORITY_NOTIFICATION)
+        self.assertIsNotNone(outbox_email.send_after)
+
+    @patch("core.base.functions.mail.settings")
+    def test_02_queue_mail_disabled(self, mock_settings):
+        mock_settings.ALLOW_EMAIL = False
+
+        self.assertIsNone(
+            queue_mail("Test Subject", "verify-email", {}, ["to@example.com"])
+        )
+        self.assertEqual(OutboxEmail.objects.count(), 0)
+
+    def test_03_queue_mail_invalid_template(self):
+        with self.assertRaisesMessage(Exception, "Invalid template name"):
+            queue_mail("Test Subject", "../verify-email", {}, ["to@example.com"])
+
+        self.assertEqual(OutboxEmail.objects.count(), 0)
+
+    @override_settings(ALLOW_EMAIL=True)
+    def test_03a_queue_mails(self):
+        emails = [
+            {
+                "subject": "Test Subject",
+                "template_name": "secret-ready",
+                "context": {"secret_url": url},
+                "recipient_list": [recipient],
+            }
+            for url, recipient in [("a", "a@example.com"), ("b", "b@example.com")]
+        ]
+
+        with self.assertNumQueries(1):
+            async_to_sync(aqueue_mails)(emails)
+
+        self.assertEqual(
+            list(
+                OutboxEmail.objects.order_by("id").values_list(
+                    "recipient_list", flat=True
+                )
+            ),
+            [["a@example.com"], ["b@example.com"]],
+        )
+        self.assertFalse(OutboxEmail.objects.filter(send_after__isnull=True).exists())
+
+        with override_settings(ALLOW_EMAIL=False):
+            self.assertEqual(async_to_sync(aqueue_mails)(emails), [])
+        self.assertEqual(OutboxEmail.objects.count(), 2)
 
-    @patch("core.base.functions.mail.send_mail")
     @patch("core.base.functions.mail.build_email_templates")
-    def test_render_and_send_mail_valid(
-        self, mock_build_email_templates, mock_send_mail
-    ):
-        # Mock the return value of build_email_templates
+    def test_04_send_queued_mail_priority(self, mock_build_email_templates):
         mock_build_email_templates.return_value = (
             "<html>Content</html>",
             "Text Content",
         )
+        OutboxEmail.objects.create(
+            subject="Notification",
+            template_name="secret-ready",
+            recipient_list=["to@example.com"],
+        )
+        OutboxEmail.objects.create(
+            subject="Verification",
+            template_name="verify-email",
+            recipient_list=["to@example.com"],
+            priority=OutboxEmail.PRIORITY_VERIFICATION,
+        )
 
-        subject = "Test Subject"
-        template_name = "test_template"
-        context = {"key": "value"}
-        recipient_list = ["recipient@example.com"]
+        # only one fits in the batch, and it has to be the verification code.
+        self.assertEqual(send_queued_mail(batch_size=1), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Verification")
+        self.assertEqual(mail.outbox[0].alternatives[0][0], "<html>Content</html>")
 
-        # Call the function
-        render_and_send_mail(subject, template_name, context, recipient_list)
+        self.assertEqual(send_queued_mail(batch_size=1), (1, 0))
+        self.assertEqual(mail.outbox[1].subject, "Notification")
+        self.assertEqual(OutboxEmail.objects.count(), 0)
 
-        # Assert build_email_templates was called with the correct arguments
-        mock_build_email_templates.assert_called_once_with(
-            html_template=f"email/html/{template_name}.html",
-            text_template=f"email/text/{template_name}.txt",
-            context=context,
+    @override_settings(MAIL_OUTBOX_MAX_ATTEMPTS=2)
+    @patch("core.base.functions.mail.build_email_templates")
+    def test_05_send_queued_mail_retries(self, mock_build_email_templates):
+        mock_build_email_templates.side_effect = Exception("ESP is down")
+        outbox_email = OutboxEmail.objects.create(
+            subject="Notification",
+            template_name="secret-ready",
+            recipient_list=["to@example.com"],
         )
 
-        # Assert send_mail was called with the correct arguments
-        mock_send_mail.assert_called_once_with(
-            subject=subject,
-            message="Text Content",
-            from_email=settings.MAILER_FROM_EMAIL,
-            recipient_list=recipient_list,
-            html_message="<html>Content</html>",
-        )
+        self.assertEqual(send_queued_mail(), (0, 1))
+
+        # backed off, so it isn't picked up again straight away.
+        outbox_email.refresh_from_db()
+        self.assertEqual(outbox_email.attempts, 1)
+        self.assertEqual(outbox_email.last_error, "ESP is down")
+        self.assertEqual(send_queued_mail(), (0, 0))
+
+        # dropped once it runs out of attempts.
+        OutboxEmail.objects.update(send_after=0)
+        self.assertEqual(send_queued_mail(), (0, 1))
+        self.assertEqual(OutboxEmail.objects.count(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    @patch("core.base.functions.mail.build_email_templates")
+    def test_06_send_queued_mail_stopped_part_way(self, mock_build_email_templates):
+        # the worker is stopped while rendering the second email.
+        mock_build_email_templates.side_effect = [
+            ("<html>Content</html>", "Text Content"),
+            KeyboardInterrupt,
+        ]
+        for subject in ["First", "Second"]:
+            OutboxEmail.objects.create(
+                subject=subject,
+                template_name="secret-ready",
+                recipient_list=["to@example.com"],
+            )
+
+        with self.assertRaises(KeyboardInterrupt):
+            send_queued_mail()
+
+        # the first was deleted as soon as it was sent, so it won't go out again.
+        self.assertEqual([message.subject for message in mail.outbox], ["First"])
+        outbox_email = OutboxEmail.objects.get()
+        self.assertEqual(outbox_email.subject, "Second")
+
+        # the second is still claimed, and retried once the claim runs out.
+        self.assertEqual(outbox_email.attempts, 1)
+        self.assertEqual(send_queued_mail(), (0, 0))
@@ -0,0 +1,209 @@
+from unittest.mock import Mock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from . import metrics
+from .metrics import (
+    Collected,
+    Counter,
+    Histogram,
+    cached_collect,
+    render_metrics,
+    serve_metrics,
+)
+
+
+class MetricsTest(TestCase):
+
+    def metric(self, cls, name, *args, **kwargs):
+        metric = cls(name, *args, **kwargs)
+        self.addCleanup(metrics._registry.pop, name)
+        return metric
+
+    def test_01_counter(self):
+        counter = self.metric(
+            Counter, "test_total", 'Counts "things".', labels=("kind",)
+        )
+        counter.inc(kind="a")
+        counter.inc(2, kind='b"\n')
+        counter.inc(kind="a")
+
+        self.assertIn(
+            '# HELP test_total Counts \\"things\\".\n'
+            "# TYPE test_total counter\n"
+            'test_total{kind="a"} 2\n'
+            'test_total{kind="b\\"\\n"} 2\n',
+            render_metrics(),
+        )
+
+        with self.assertRaises(ValueError):
+            Counter("test_total", "Registered twice.")
+
+    def test_02_histogram(self):
+        histogram = self.metric(
+            Histogram, "test_seconds", "Times things.", buckets=(0.1, 1.0)
+        )
+        for value in [0.05, 0.1, 0.5, 3.0]:
+            histogram.observe(value)
+
+        self.assertIn(
+            "# TYPE test_seconds histogram\n"
+            'test_seconds_bucket{le="0.1"} 2\n'
+            'test_seconds_bucket{le="1.0"} 3\n'
+            'test_seconds_bucket{le="+Inf"} 4\n'
+            "test_seconds_sum 3.65\n"
+            "test_seconds_count 4\n",
+            render_metrics(),
+        )
+
+    def test_03_collected(self):
+        collect = Mock(return_value={"up": 1, "down": 0})
+        self.metric(
+            Collected,
+            "test_state",
+            "A state.",
+            collect,
+            label="state",
+            cache_seconds=60,
+        )
+        self.metric(Collected, "test_failing", "Fails.", Mock(side_effect=RuntimeError))
+
+        for _ in range(2):
+            rendered = render_metrics()
+
+        self.assertIn(
+            'test_state{state="up"} 1\ntest_state{state="down"} 0\n', rendered
+        )
+        self.assertEqual(collect.call_count, 1)
+        # a failing collector is left out, without the others.
+        self.assertNotIn("test_failing", rendered)
+
+    def test_04_shared_collect(self):
+        collect = Mock(return_value={"a": 1, "b": 2})
+        shared = cached_collect(collect, 60)
+        self.metric(Collected, "test_a", "A.", lambda: shared()["a"])
+        self.metric(Collected, "test_b", "B.", lambda: shared()["b"])
+
+        rendered = render_metrics()
+
+        self.assertIn("test_a 1\n", rendered)
+        self.assertIn("test_b 2\n", rendered)
+        self.assertEqual(collect.call_count, 1)
+
+    def test_05_serve_metrics(self):
+        server = serve_metrics(0, "test-token")
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        host, port = server.server_address
+        self.assertEqual(host, "127.0.0.1")
+
+        def scrape(**headers):
+            request = Request(f"http://{host}:{port}/", headers=headers)
+
+            try:
+                with urlopen(request, timeout=5) as response:
+                    return response.status
+            except HTTPError as e:
+                return e.code
+
+        self.assertEqual(scrape(), 401)
+        self.assertEqual(scrape(Authorization="Bearer wrong-token"), 401)
+        self.assertEqual(scrape(Authorization="Bearer test-token"), 200)
+
+        # never served without a token.
+        server.token = ""
+        self.assertEqual(scrape(Authorization="Bearer "), 401)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN="test-token")
+class MetricsApiTest(APITestCase):
+
+    def scrape(self, **headers):
+        return self.client.get(
+            reverse("api:handle_metrics"),
+            headers={"authorization": "Bearer test-token", **headers},
+        )
+
+    def sample(self, rendered: str, line: str) -> float:
+        for sample in rendered.splitlines():
+            if sample.startswith(line + " "):
+                return float(sample.rsplit(" ", 1)[1])
+
+        return 0.0
+
+    def test_01_requests_recorded(self):
+        view = 'view="api:secret:handle_retrieve_secret_check"'
+        lines = [
+            f'secretburner_http_requests_total{{{view},method="POST",status="400"}}',
+            f"secretburner_http_request_duration_seconds_count{{{view}}}",
+            f"secretburner_http_request_db_queries_sum{{{view}}}",
+        ]
+        rendered = self.scrape().content.decode()
+        before = [self.sample(rendered, line) for line in lines]
+
+        self.client.post(
+            reverse("api:secret:handle_retrieve_secret_check"),
+            {"secretId": "0190d6a0-0000-7000-8000-000000000000"},
+            format="json",
+        )
+
+        response = self.scrape()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8"
+        )
+
+        rendered = response.content.decode()
+        requests, seconds, queries = [
+            self.sample(rendered, line) - sample for line, sample in zip(lines, before)
+        ]
+        self.assertEqual(requests, 1)
+        self.assertEqual(seconds, 1)
+        # the secret was looked up in the database.
+        self.assertGreaterEqual(queries, 1)
+        self.assertEqual(
+            self.sample(rendered, 'secretburner_live_secrets{kind="secret"}'), 0
+        )
+        self.assertIn("secretburner_hashing_in_flight 0", rendered)
+        self.assertIn(
+            'secretburner_throttle_requests_total{outcome="throttled"}', rendered
+        )
+
+    def test_01a_unknown_methods_share_a_label(self):
+        view = 'view="api:secret:handle_retrieve_secret_check"'
+        line = f'secretburner_http_requests_total{{{view},method="other",status="405"}}'
+        before = self.sample(self.scrape().content.decode(), line)
+
+        for method in ["FOO1", "FOO2"]:
+            self.client.generic(
+                method, reverse("api:secret:handle_retrieve_secret_check")
+            )
+
+        rendered = self.scrape().content.decode()
+        self.assertEqual(self.sample(rendered, line) - before, 2)
+        self.assertNotIn('method="FOO1"', rendered)
+
+    def test_02_token(self):
+        response = self.client.get(reverse("api:handle_metrics"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.scrape(authorization="Bearer wrong-token")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.assertEqual(self.scrape().status_code, status.HTTP_200_OK)
+
+        # never served without a token.
+        with override_settings(METRICS_TOKEN=""):
+            response = self.scrape(authorization="Bearer ")
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_03_disabled(self):
+        response = self.scrape()
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,98 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.base.functions.database import pool_stats
+from core.base.functions.ids import uuid7
+from secret.models import Secret
+
+
+def time_per_call(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the /api/secret/check/ lookup on a new connection per request with one checked out of a "
+        "connection pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="The database alias whose server is benchmarked.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=200,
+            help="Requests made on each kind of connection.",
+        )
+
+    def handle(self, *args, **options):
+        settings_dict = connections[options["database"]].settings_dict
+        pool_options = settings_dict["OPTIONS"].get("pool") or {}
+        if pool_options is True:
+            pool_options = {}
+
+        cases = [
+            (
+                "connect per request",
+                "benchmark_unpooled",
+                {k: v for k, v in settings_dict["OPTIONS"].items() if k != "pool"},
+            ),
+            (
+                "pool checkout",
+                "benchmark_pooled",
+                {**settings_dict["OPTIONS"], "pool": pool_options},
+            ),
+        ]
+
+        secret_id = uuid7()
+        results = []
+
+        for name, alias, db_options in cases:
+            connection = connections.create_connection(options["database"])
+            connection.settings_dict = {
+                **settings_dict,
+                "OPTIONS": db_options,
+                "CONN_MAX_AGE": 0,
+                "CONN_HEALTH_CHECKS": False,
+            }
+            connection.alias = alias
+            connections[alias] = connection
+
+            def request():
+                # the lookup /api/secret/check/ makes, then the end of the request closes (or returns) the
+                # connection as Django's request_finished handler would.
+                Secret.objects.using(alias).live().filter(secret_id=secret_id).one()
+                connection.close()
+
+            # the first request opens the pool.
+            request()
+
+            try:
+                seconds = time_per_call(request, options["iterations"])
+                stats = pool_stats(alias)
+            finally:
+                connection.close_pool()
+                del connections[alias]
+
+            results.append(seconds)
+            self.stdout.write(f"{name}: {seconds * 1000:.3f} ms per request")
+
+            if stats:
+                self.stdout.write(
+                    f"  pool: {stats['connections_num']} connections opened, "
+                    f"{stats['requests_num']} checkouts, {stats['requests_queued']} waited "
+                    f"{stats['requests_wait_ms']} ms in total"
+                )
+
+        self.stdout.write(
+            f"{options['iterations']} iterations, pool checkout is {results[0] / results[1]:.1f}x faster"
+        )
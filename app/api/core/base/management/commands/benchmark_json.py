@@ -0,0 +1,88 @@
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from djangorestframework_camel_case.parser import CamelCaseJSONParser
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+
+from core.base.api.parsers import CamelCaseNullJSONParser
+from core.base.api.renderers import CamelCaseORJSONRenderer
+
+
+def build_payload(size: int) -> dict:
+    # a secret at the size limit, shaped like a request to /api/secret/.
+    line = "export SOME_SETTING_NAME=c29tZSByYW5kb20gbG9va2luZyB2YWx1ZQ==\n"
+    return {
+        "secret_text": (line * (size // len(line) + 1))[:size],
+        "expiry_seconds": 3600,
+        "passphrase": "",
+        "recipient_email": "recipient@example.com",
+        "sender_email": "sender@example.com",
+        "verified_token": "0123456789abcdef",
+    }
+
+
+def time_per_call(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations
+
+
+class Command(BaseCommand):
+    help = "Compares the camelCase JSON renderer and parser with djangorestframework_camel_case's."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=512000,
+            help="Characters of secret text in the payload.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=200,
+            help="Times each renderer and parser is run.",
+        )
+
+    def handle(self, *args, **options):
+        payload = build_payload(options["size"])
+        body = CamelCaseJSONRenderer().render(payload)
+
+        self.stdout.write(
+            f"payload: {len(body)} bytes, {options['iterations']} iterations"
+        )
+
+        current_renderer, new_renderer = (
+            CamelCaseJSONRenderer(),
+            CamelCaseORJSONRenderer(),
+        )
+        current_parser, new_parser = CamelCaseJSONParser(), CamelCaseNullJSONParser()
+
+        cases = [
+            (
+                "render",
+                current_renderer,
+                lambda: current_renderer.render(payload),
+                new_renderer,
+                lambda: new_renderer.render(payload),
+            ),
+            (
+                "parse",
+                current_parser,
+                lambda: current_parser.parse(BytesIO(body)),
+                new_parser,
+                lambda: new_parser.parse(BytesIO(body)),
+            ),
+        ]
+
+        for name, current, current_fn, new, new_fn in cases:
+            current_seconds = time_per_call(current_fn, options["iterations"])
+            new_seconds = time_per_call(new_fn, options["iterations"])
+
+            self.stdout.write(
+                f"{name}: {type(current).__name__} {current_seconds * 1000:.3f} ms, "
+                f"{type(new).__name__} {new_seconds * 1000:.3f} ms "
+                f"({current_seconds / new_seconds:.1f}x)"
+            )
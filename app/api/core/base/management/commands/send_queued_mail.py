@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.base.functions.mail import send_queued_mail
+from core.base.functions.metrics import serve_metrics
+
+
+class Command(BaseCommand):
+    help = "Renders and sends queued emails from the outbox in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Send a single batch and exit instead of polling.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.MAIL_OUTBOX_BATCH_SIZE,
+            help="Maximum number of emails to send per batch.",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            help="Serve the worker's Prometheus metrics, e.g. the email render and send times, on this port. "
+            "Scrapes must give METRICS_TOKEN as a bearer token.",
+        )
+        parser.add_argument(
+            "--metrics-host",
+            default="127.0.0.1",
+            help="The address to serve the worker's metrics on. Defaults to 127.0.0.1.",
+        )
+
+    def handle(self, *args, **options):
+        if options["metrics_port"]:
+            if not settings.METRICS_TOKEN:
+                raise CommandError("METRICS_TOKEN is required to serve metrics.")
+
+            serve_metrics(
+                options["metrics_port"],
+                settings.METRICS_TOKEN,
+                host=options["metrics_host"],
+            )
+
+        try:
+            while True:
+                sent, failed = send_queued_mail(batch_size=options["batch_size"])
+
+                if sent or failed:
+                    self.stdout.write(f"sent {sent} email(s), {failed} failed")
+
+                if options["once"]:
+                    break
+
+                # only wait when the outbox was drained, otherwise carry straight on with the next batch.
+                if sent + failed < options["batch_size"]:
+                    time.sleep(settings.MAIL_OUTBOX_POLL_SECONDS)
+
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,101 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+from core.base.functions.database import start_counting_queries
+from core.base.functions.metrics import Counter, Histogram
+
+REQUESTS = Counter(
+    "secretburner_http_requests_total",
+    "Requests answered, by view, method and status.",
+    labels=("view", "method", "status"),
+)
+REQUEST_SECONDS = Histogram(
+    "secretburner_http_request_duration_seconds",
+    "Time taken to answer a request, up to its headers for streamed responses, by view.",
+    labels=("view",),
+)
+REQUEST_QUERIES = Histogram(
+    "secretburner_http_request_db_queries",
+    "Database queries run per request, by view.",
+    labels=("view",),
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+
+# the methods labelled as they are. A client may send any other.
+METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+
+
+def method_label(request) -> str:
+    """
+    Returns the request's method, or "other" for methods outside `METHODS`, so made-up methods can't grow the
+    metrics without limit.
+    """
+    return request.method if request.method in METHODS else "other"
+
+
+def view_label(request) -> str:
+    """
+    Returns the namespaced url name of the view a request is for, also when it was answered before being routed,
+    e.g. by `RejectDeniedClients`. Unknown paths share one label, so they can't grow the metrics without limit.
+    """
+    match = getattr(request, "resolver_match", None)
+
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return "unmatched"
+
+    return match.view_name
+
+
+class RecordRequestMetrics:
+    """
+    Middleware that records the count, latency and database queries of every request, by view. Not used when
+    METRICS_ENABLED is off.
+
+    Attributes:
+        get_response: The next middleware or view in the chain.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        queries, started = start_counting_queries(), time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, started, queries)
+
+        return response
+
+    async def __acall__(self, request):
+        queries, started = start_counting_queries(), time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, started, queries)
+
+        return response
+
+    def record(self, request, response, started: float, queries: list):
+        view = view_label(request)
+
+        REQUEST_SECONDS.observe(time.perf_counter() - started, view=view)
+        REQUEST_QUERIES.observe(queries[0], view=view)
+        REQUESTS.inc(
+            view=view, method=method_label(request), status=response.status_code
+        )
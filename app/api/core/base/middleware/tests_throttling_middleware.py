@@ -0,0 +1,113 @@
+import json
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APITestCase
+
+from core.base.api.throttling import DenyList, deny_list, throttle_stats
+from .throttling import RejectDeniedClients
+
+
+class TestDenyList(TestCase):
+
+    def test_01_add_and_expire(self):
+        denied = DenyList(max_seconds=60)
+        denied.add(("/api/secret/", "1.2.3.4"), 10, now=1000)
+
+        self.assertEqual(denied.retry_after(("/api/secret/", "1.2.3.4"), now=1005), 5)
+        self.assertIsNone(denied.retry_after(("/api/secret/", "5.6.7.8"), now=1005))
+        self.assertIsNone(denied.retry_after(("/api/secret/", "1.2.3.4"), now=1010))
+
+    def test_02_capped(self):
+        denied = DenyList(max_seconds=60, max_size=1)
+        denied.add(("/a/", "1.2.3.4"), 86400, now=1000)
+        denied.add(("/b/", "1.2.3.4"), 10, now=1000)
+
+        self.assertEqual(denied.retry_after(("/a/", "1.2.3.4"), now=1000), 60)
+        self.assertIsNone(denied.retry_after(("/b/", "1.2.3.4"), now=1000))
+
+
+class TestRejectDeniedClients(TestCase):
+
+    def setUp(self):
+        deny_list.clear()
+        self.factory = RequestFactory()
+        self.get_response = Mock()
+        self.middleware = RejectDeniedClients(self.get_response)
+
+    def tearDown(self):
+        deny_list.clear()
+
+    def test_01_passes_through(self):
+        request = self.factory.post("/api/secret/")
+
+        response = self.middleware(request)
+
+        self.assertEqual(response, self.get_response.return_value)
+
+    def test_02_rejects_denied_client(self):
+        deny_list.add(("/api/secret/", "127.0.0.1"), 30)
+        rejected_early = throttle_stats()["rejected_early"]
+        request = self.factory.post(
+            "/api/secret/", data=b"x" * 1000, content_type="application/json"
+        )
+
+        response = self.middleware(request)
+
+        self.get_response.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+        self.assertEqual(json.loads(response.content)["code"], "throttled")
+        self.assertEqual(throttle_stats()["rejected_early"], rejected_early + 1)
+
+        # the body was never read.
+        self.assertFalse(hasattr(request, "_body"))
+
+        # other paths are still served.
+        self.middleware(self.factory.post("/api/secret/check/"))
+        self.get_response.assert_called_once()
+
+
+@patch("core.base.api.throttling.AnonRateThrottlePerView.get_rate")
+class TestRejectDeniedClientsRequests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        deny_list.clear()
+
+    def tearDown(self):
+        deny_list.clear()
+
+    def test_01_throttle_fills_deny_list(self, mock):
+        from secret.api.secret import handle_retrieve_secret_check
+        from core.base.api.throttling import AnonRateThrottlePerView
+
+        mock.return_value = "1/min"
+        url = "/api/secret/check/"
+
+        # the time is fixed, so both answers count down from the same moment.
+        with patch.object(
+            handle_retrieve_secret_check.cls,
+            "throttle_classes",
+            [AnonRateThrottlePerView],
+        ), patch.object(
+            AnonRateThrottlePerView, "timer", Mock(return_value=1000.5)
+        ), patch(
+            "time.time", return_value=1000.5
+        ):
+            self.assertEqual(self.client.post(url, {}, format="json").status_code, 400)
+
+            throttled = self.client.post(url, {}, format="json")
+            self.assertEqual(throttled.status_code, 429)
+
+            with patch(
+                "core.base.api.throttling.AnonRateThrottlePerView.allow_request"
+            ) as allow_request:
+                rejected = self.client.post(url, {}, format="json")
+
+        # the third request never reached the throttle.
+        allow_request.assert_not_called()
+        self.assertEqual(rejected.status_code, 429)
+        self.assertEqual(rejected.json()["detail"], throttled.json()["detail"])
+        self.assertIsNotNone(deny_list.retry_after((url, "127.0.0.1"), now=1000.5))
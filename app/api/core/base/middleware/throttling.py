@@ -0,0 +1,62 @@
+import math
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from core.base.api.throttling import _record, deny_list
+from core.base.exception_handler.exception_handler import format_error_data
+
+
+class RejectDeniedClients:
+    """
+    Middleware that answers 429 straight away for clients the rate throttle has recently throttled on this path.
+
+    The throttle adds each client it throttles to `deny_list`. While the client is on it, this middleware returns
+    the same error the throttle would have, before the request body is read, parsed or the cache is asked. Once
+    the entry runs out the request is handled as usual and the throttle decides again.
+
+    Attributes:
+        get_response: The next middleware or view in the chain.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        return self.reject(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.reject(request) or await self.get_response(request)
+
+    def reject(self, request):
+        """
+        Returns a 429 response if the client is on the deny list for this path, otherwise None.
+        """
+        ident = BaseThrottle().get_ident(request)
+        retry_after = deny_list.retry_after((request.path_info, ident))
+
+        if retry_after is None:
+            return None
+
+        _record("rejected_early")
+
+        wait = math.ceil(retry_after)
+        _, content = format_error_data(
+            str(Throttled(wait=wait).detail), code=Throttled.default_code
+        )
+
+        response = HttpResponse(content, status=429, content_type="application/json")
+        response["Retry-After"] = str(wait)
+
+        return response
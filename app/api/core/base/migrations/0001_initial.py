@@ -0,0 +1,43 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEmail",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("subject", models.TextField()),
+                ("template_name", models.TextField()),
+                ("context", models.JSONField(default=dict)),
+                ("recipient_list", models.JSONField(default=list)),
+                ("priority", models.SmallIntegerField(default=10)),
+                ("attempts", models.SmallIntegerField(default=0)),
+                ("send_after", models.BigIntegerField()),
+                ("last_error", models.TextField(null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["priority", "send_after"],
+                        name="outbox_priority_send_after",
+                    )
+                ],
+            },
+        ),
+    ]
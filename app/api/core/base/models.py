@@ -0,0 +1,159 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models, router
+
+from core.base.functions.time import seconds_from_now_timestamp
+
+
+class LookupQuerySet(models.QuerySet):
+    """
+    A queryset for looking up single rows by a unique column.
+    """
+
+    def one(self):
+        """
+        Returns a row matched by this queryset, or None. Unlike `first()` this doesn't order by pk, which the
+        lookups don't need, so Postgres can stop at the first index entry instead of sorting what it found.
+        """
+        for obj in self[:1]:
+            return obj
+        return None
+
+    async def aone(self):
+        async for obj in self[:1]:
+            return obj
+        return None
+
+
+class ReplicaQuerySet(models.QuerySet):
+    """
+    A queryset whose lookups may be read from a read replica, see `config.routers.PrimaryReplicaRouter`.
+    """
+
+    def read_only(self, **lookups):
+        """
+        Filters by the exact `lookups` and lets the router read the result from a replica, unless a row with one of
+        the lookup values was recently written. Don't use it to read rows that are then consumed or written, as the
+        replica may still have rows the primary has already deleted or changed.
+        """
+        queryset = self.filter(**lookups)
+        queryset._hints = {**queryset._hints, "read_only": True, "lookups": lookups}
+        return queryset
+
+
+class ConsumeOnceQuerySet(models.QuerySet):
+    """
+    A queryset for rows that may only be read once, such as secrets and verification tokens.
+    """
+
+    def _consume_db(self) -> str:
+        # the rows are deleted, so this always runs where writes go.
+        return self._db or router.db_for_write(self.model, **self._hints)
+
+    def consume_sql(self) -> tuple:
+        """
+        Returns the `DELETE ... RETURNING` statement and its parameters that `consume()` runs, or None if the
+        filters can't match any rows.
+        """
+        assert not self.query.is_sliced, "Cannot consume a sliced queryset."
+        assert self.query.where, "Refusing to consume a queryset without filters."
+
+        db = self._consume_db()
+        quote_name = connections[db].ops.quote_name
+
+        try:
+            where, params = self.query.get_compiler(db).compile(self.query.where)
+        except EmptyResultSet:
+            return None
+
+        sql = "DELETE FROM {} WHERE {} RETURNING {}".format(
+            quote_name(self.model._meta.db_table),
+            where,
+            ", ".join(
+                quote_name(field.column) for field in self.model._meta.concrete_fields
+            ),
+        )
+
+        return sql, params
+
+    def consume(self):
+        """
+        Deletes the rows matched by this queryset and returns them, in a single `DELETE ... RETURNING` statement.
+
+        The rows are claimed and removed at the same time. When two requests race for the same row, only one of
+        them gets it back and the other gets an empty list, so a single-use row is never handed out twice.
+
+        Returns:
+            list: Model instances for the rows that were deleted.
+        """
+        statement = self.consume_sql()
+        if statement is None:
+            return []
+
+        sql, params = statement
+        db = self._consume_db()
+        connection = connections[db]
+        fields = self.model._meta.concrete_fields
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        # raw rows skip the usual query compiler, so apply the field converters ourselves.
+        columns = [field.get_col(self.model._meta.db_table) for field in fields]
+        converters = [
+            connection.ops.get_db_converters(column)
+            + column.get_db_converters(connection)
+            for column in columns
+        ]
+
+        instances = []
+        for row in rows:
+            values = []
+            for value, column, column_converters in zip(row, columns, converters):
+                for converter in column_converters:
+                    value = converter(value, column, connection)
+                values.append(value)
+
+            instances.append(
+                self.model.from_db(db, [field.attname for field in fields], values)
+            )
+
+        return instances
+
+    async def aconsume(self):
+        return await sync_to_async(self.consume)()
+
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be rendered and handed to the ESP by the `send_queued_mail` worker.
+
+    Rows only live until they are sent (or run out of attempts), after which they are deleted so that no
+    email addresses are kept around.
+    """
+
+    # lower numbers are sent first.
+    PRIORITY_VERIFICATION = 0
+    PRIORITY_NOTIFICATION = 10
+
+    subject = models.TextField()
+    template_name = models.TextField()
+    context = models.JSONField(default=dict)
+    recipient_list = models.JSONField(default=list)
+    priority = models.SmallIntegerField(default=PRIORITY_NOTIFICATION)
+    attempts = models.SmallIntegerField(default=0)
+    send_after = models.BigIntegerField()
+    last_error = models.TextField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["priority", "send_after"], name="outbox_priority_send_after"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.send_after:
+            self.send_after = seconds_from_now_timestamp(0)
+        super().save(*args, **kwargs)
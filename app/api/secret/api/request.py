@@ -1,17 +1,23 @@
-from uuid import uuid4
+from adrf.decorators import api_view
 from rest_framework import serializers, status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import parser_classes
 from rest_framework.response import Response
 
+from core.base.functions.ids import parse_uuid, uuid7
 from secret.models import Secret
-from secret.func import burn_now
+from secret.storage import acreate_secret
 from django.urls import re_path
 from django.conf import settings
 
 from secret.api.serializers import (
+    OCTET_STREAM_PARSERS,
     BaseSerializer,
+    BytesField,
     SerializerWithEmailResponse,
-    handle_passphrase,
+    UUIDStringField,
+    ahandle_passphrase,
+    is_octet_stream,
+    octet_stream_data,
 )
 
 
@@ -23,22 +29,23 @@ class RequestIn(BaseSerializer):
     sender_email = serializers.EmailField(required=False)
     verified_token = serializers.CharField(required=False)
 
-    def is_valid(self, raise_exception=False):
-        self.initial_data = handle_passphrase(self.initial_data)
+    async def ais_valid(self, raise_exception=False):
+        self.initial_data = await ahandle_passphrase(self.initial_data)
         return super().is_valid(raise_exception=raise_exception)
 
-    def create(self, validated_data):
-        validated_data["request_id"] = str(uuid4())
+    async def acreate(self, validated_data):
+        validated_data["request_id"] = uuid7()
         request_url = f"{settings.UI_HOSTNAME}{settings.UI_FULFIL_REQUEST_URI}{validated_data.get('request_id')}"
 
-        self.send_verified_email(
+        await self.asend_verified_email(
             context_from_serializer=["sender_email"],
             additional_context={"request_url": request_url},
             template_name="secret-request",
             subject="Secret Burner: Somebody is requesting a secret from you",
         )
 
-        return Secret.objects.create(**validated_data)
+        # requests are always kept in Postgres, see RedisSecretStore.accepts().
+        return await acreate_secret(**validated_data)
 
 
 class RequestOut(SerializerWithEmailResponse):
@@ -48,24 +55,25 @@ class RequestOut(SerializerWithEmailResponse):
 
 
 class RequestFulfilmentRetrievalIn(BaseSerializer):
-    request_id = serializers.CharField(max_length=40)
+    request_id = UUIDStringField(max_length=40)
 
-    def save(self, **kwargs):
+    async def asave(self, **kwargs):
         request_id = self.validated_data.get("request_id")
-        secret = Secret.objects.filter(request_id=request_id).first()
+        secret = request_id and (
+            await Secret.objects.live()
+            .filter(request_id=request_id)
+            .without_payload()
+            .aone()
+        )
 
         if not secret:
             raise serializers.ValidationError("request not found.")
 
-        if burn_now(secret.burn_at):
-            secret.delete()
-            raise serializers.ValidationError("request not found.")
-
         if secret.fulfilment_id:
             raise serializers.ValidationError("request not found.")
 
-        secret.fulfilment_id = uuid4()
-        secret.save()
+        secret.fulfilment_id = uuid7()
+        await secret.asave(update_fields=["fulfilment_id"])
 
         return secret
 
@@ -84,11 +92,14 @@ class RequestFulfilmentIn(BaseSerializer):
     sender_email = serializers.EmailField(required=False)
     verified_token = serializers.CharField(required=False)
 
-    def update(self, instance: Secret, validated_data):
+    async def aupdate(self, instance: Secret, validated_data):
+        # the request was loaded without its payload, which is replaced as a whole.
         instance.secret_text = validated_data.get("secret_text")
-        instance.save()
+        instance.secret_codec = validated_data.get("secret_codec")
+        instance.secret_blob = validated_data.get("secret_blob")
+        await instance.asave(update_fields=Secret.PAYLOAD_FIELDS)
 
-        self.send_verified_email(
+        await self.asend_verified_email(
             context_from_serializer=["sender_email"],
             template_name="request-fulfilled",
             subject="Secret Burner: Your secret request has been fulfilled",
@@ -97,17 +108,32 @@ class RequestFulfilmentIn(BaseSerializer):
         return instance
 
 
+class RequestFulfilmentBytesIn(RequestFulfilmentIn):
+    """
+    A fulfilment sent as a raw application/octet-stream body, see `SecretBytesIn`.
+    """
+
+    secret_text = None
+    secret_bytes = BytesField(max_length=512000)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        attrs["secret_blob"] = attrs.pop("secret_bytes")
+        attrs["secret_codec"] = Secret.BINARY_CODEC
+        return attrs
+
+
 class RequestFulfilmentOut(SerializerWithEmailResponse):
     request_id = serializers.CharField(max_length=40)
     burn_at = serializers.IntegerField()
 
 
 @api_view(["POST"])
-def handle_store_request(request):
+async def handle_store_request(request):
     request_data = RequestIn(data=request.data)
 
-    if request_data.is_valid(raise_exception=True):
-        secret = request_data.save()
+    if await request_data.ais_valid(raise_exception=True):
+        secret = await request_data.asave()
         response_data = RequestOut(
             secret, email_response=request_data.get_email_response()
         ).data
@@ -115,27 +141,39 @@ def handle_store_request(request):
 
 
 @api_view(["POST"])
-def handle_retrieve_request_fulfilment(request):
+async def handle_retrieve_request_fulfilment(request):
     request_data = RequestFulfilmentRetrievalIn(data=request.data)
 
     if request_data.is_valid(raise_exception=True):
-        secret = request_data.save()
+        secret = await request_data.asave()
         response_data = RequestFulfilmentRetrievalOut(secret).data
         return Response(response_data)
 
 
 @api_view(["POST"])
-def handle_fulfil_request(request):
-    secret = Secret.objects.filter(
-        fulfilment_id=request.data.get("fulfilment_id")
-    ).first()
+@parser_classes(OCTET_STREAM_PARSERS)
+async def handle_fulfil_request(request):
+    if is_octet_stream(request):
+        serializer_class = RequestFulfilmentBytesIn
+        data = octet_stream_data(request, "secret_bytes")
+    else:
+        serializer_class = RequestFulfilmentIn
+        data = request.data
+
+    fulfilment_id = parse_uuid(data.get("fulfilment_id"))
+    secret = fulfilment_id and (
+        await Secret.objects.live()
+        .filter(fulfilment_id=fulfilment_id)
+        .without_payload()
+        .aone()
+    )
     if not secret:
         raise serializers.ValidationError("request not found or never existed")
 
-    request_data = RequestFulfilmentIn(secret, data=request.data)
+    request_data = serializer_class(secret, data=data)
 
     if request_data.is_valid(raise_exception=True):
-        secret = request_data.save()
+        secret = await request_data.asave()
         response_data = RequestFulfilmentOut(
             secret, email_response=request_data.get_email_response()
         ).data
@@ -1,17 +1,48 @@
+from adrf.decorators import api_view
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from rest_framework.decorators import parser_classes, renderer_classes
+from rest_framework.exceptions import UnsupportedMediaType
 from rest_framework import serializers, status
-from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
 from secret.api.serializers import (
+    OCTET_STREAM_PARSERS,
+    OCTET_STREAM_RENDERERS,
     BaseSerializer,
+    BytesField,
     SerializerWithEmailResponse,
-    handle_passphrase,
+    UUIDStringField,
+    ahandle_passphrase,
+    is_octet_stream,
+    octet_stream_data,
 )
 
-from django.contrib.auth.hashers import check_password
-
-from secret.models import Secret
-from secret.func import burn_now
+from core.base.api.renderers import (
+    CamelCaseORJSONRenderer,
+    OctetStreamRenderer,
+    StreamedString,
+)
+from core.base.exception_handler.exception_handler import (
+    format_error_data,
+    format_field_errors,
+)
+from core.base.functions.hashing import acheck_password
+from core.base.functions.ids import uuid7
+from core.base.functions.mail import aqueue_mails
+
+from secret.attachments import get_attachment_store, iter_attachment, iter_base64
+from secret.exceptions import AttachmentTooLargeError
+from secret.models import Secret, set_burn_at
+from secret.storage import (
+    acreate_secret,
+    acreate_secrets,
+    aconsume_secret,
+    aconsume_secrets,
+    aget_secret,
+    astatus_secrets,
+)
 from django.urls import re_path
 from django.conf import settings
 
@@ -26,24 +57,87 @@ class SecretIn(BaseSerializer):
     sender_email = serializers.EmailField(required=False)
     verified_token = serializers.CharField(required=False)
 
-    def is_valid(self, raise_exception=False):
-        self.initial_data = handle_passphrase(self.initial_data)
+    async def ais_valid(self, raise_exception=False):
+        self.initial_data = await ahandle_passphrase(self.initial_data)
         return super().is_valid(raise_exception=raise_exception)
 
-    def create(self, validated_data):
-        secret = Secret.objects.create(**validated_data)
+    async def acreate(self, validated_data):
+        secret = await acreate_secret(**validated_data)
+        await self.asend_verified_email(**self.secret_email(secret))
+
+        return secret
+
+    def secret_email(self, secret):
         secret_url = (
             f"{settings.UI_HOSTNAME}{settings.UI_VIEW_SECRET_URL}{secret.secret_id}"
         )
 
-        self.send_verified_email(
-            context_from_serializer=["sender_email"],
-            additional_context={"secret_url": secret_url},
-            template_name="secret-ready",
-            subject="Secret Burner: Somebody has sent you a secret",
-        )
+        return {
+            "context_from_serializer": ["sender_email"],
+            "additional_context": {"secret_url": secret_url},
+            "template_name": "secret-ready",
+            "subject": "Secret Burner: Somebody has sent you a secret",
+        }
+
+
+class SecretBytesIn(SecretIn):
+    """
+    A secret sent as a raw application/octet-stream body, e.g. ciphertext the client encrypted itself, stored as
+    the bytes it was sent as. See `octet_stream_data` for how the other fields are sent.
+    """
+
+    secret_text = None
+    secret_bytes = BytesField(max_length=512000)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        attrs["secret_blob"] = attrs.pop("secret_bytes")
+        attrs["secret_codec"] = Secret.BINARY_CODEC
+        return attrs
 
-        return secret
+
+class SecretAttachmentIn(SecretIn):
+    """
+    A secret whose payload is a file sent as the raw application/octet-stream body. The body is written to the
+    attachment store (see `secret.attachments`) as it is read, so the file is never held in memory. The other
+    fields are sent as for `SecretBytesIn`, with the file's name as `attachment_name`.
+    """
+
+    secret_text = None
+    attachment_name = serializers.CharField(max_length=255)
+
+    async def acreate(self, validated_data):
+        stream = validated_data.pop("stream")
+        store = get_attachment_store()
+
+        if stream is None:
+            raise serializers.ValidationError(
+                {"attachment": ["This field may not be blank."]}
+            )
+
+        # the attachment is stored under the secret's id and burn_at, so they are set before the secret is.
+        validated_data["secret_id"] = uuid7()
+        validated_data["burn_at"] = set_burn_at(validated_data["expiry_seconds"])
+
+        try:
+            validated_data["attachment_size"] = await sync_to_async(store.write)(
+                validated_data["secret_id"],
+                validated_data["burn_at"],
+                stream,
+                settings.SECRET_ATTACHMENT_CHUNK_SIZE,
+                settings.SECRET_ATTACHMENT_MAX_BYTES,
+            )
+        except AttachmentTooLargeError as e:
+            raise serializers.ValidationError({"attachment": [str(e)]})
+
+        try:
+            return await super().acreate(validated_data)
+
+        except BaseException:
+            await sync_to_async(store.delete)(
+                validated_data["secret_id"], validated_data["burn_at"]
+            )
+            raise
 
 
 class SecretOut(SerializerWithEmailResponse):
@@ -51,26 +145,86 @@ class SecretOut(SerializerWithEmailResponse):
     burn_at = serializers.IntegerField()
 
 
+class BulkSecretIn(serializers.Serializer):
+    """
+    A batch of secrets, e.g. the same credentials for several recipients. Fields sent next to `secrets` are shared
+    by every item, and each item may override them. Each item is validated and answered on its own, like a
+    request to `handle_store_secret`.
+    """
+
+    secrets = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_secrets(self, value):
+        if len(value) > settings.SECRET_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"Ensure this field has no more than {settings.SECRET_BULK_MAX_ITEMS} elements."
+            )
+        return value
+
+    async def asave(self, **kwargs):
+        shared = {
+            key: value for key, value in self.initial_data.items() if key != "secrets"
+        }
+        # keyed by passphrase, so each distinct one is hashed once for the whole batch.
+        hashed = {}
+
+        items = []
+        for data in self.validated_data["secrets"]:
+            # merged first, so an item's empty or null passphrase overrides the shared one.
+            data = {**shared, **data}
+            passphrase = data.pop("passphrase", None)
+
+            if passphrase not in hashed:
+                hashed[passphrase] = await ahandle_passphrase(
+                    {"passphrase": passphrase}
+                )
+
+            item = SecretIn(data={**data, **hashed[passphrase]})
+            items.append((item, await item.ais_valid()))
+
+        valid = [item for item, is_valid in items if is_valid]
+        secrets = dict(
+            zip(valid, await acreate_secrets([item.validated_data for item in valid]))
+        )
+
+        emails = []
+        for item, secret in secrets.items():
+            email = await item.abuild_verified_email(**item.secret_email(secret))
+
+            if email:
+                emails.append(email)
+                item.set_email_response("queued")
+
+        await aqueue_mails(emails)
+
+        results = []
+        for item, _ in items:
+            if item in secrets:
+                results.append(
+                    SecretOut(
+                        secrets[item], email_response=item.get_email_response()
+                    ).data
+                )
+            else:
+                results.append({**format_field_errors(item.errors), "code": "invalid"})
+
+        return results
+
+
 class SecretRetrieveIn(BaseSerializer):
-    secret_id = serializers.CharField(max_length=40)
+    secret_id = UUIDStringField(max_length=40)
     passphrase = serializers.CharField(max_length=500, required=False)
 
-    def save(self, **kwargs):
+    async def asave(self, **kwargs):
         secret_id = self.validated_data.get("secret_id")
         passphrase = self.validated_data.get("passphrase")
 
-        secret = Secret.objects.filter(secret_id=secret_id).first()
+        async def verify(passphrase_hash):
+            return await acheck_password(password=passphrase, encoded=passphrase_hash)
 
-        if not secret:
-            raise serializers.ValidationError("secret not found")
-
-        if secret.passphrase_hash and not check_password(
-            password=passphrase, encoded=secret.passphrase_hash
-        ):
-            raise serializers.ValidationError("secret not found")
+        secret = await aconsume_secret(secret_id, verify)
 
-        if burn_now(secret.burn_at):
-            secret.delete()
+        if not secret:
             raise serializers.ValidationError("secret not found")
 
         return secret
@@ -84,11 +238,11 @@ class SecretRetrieveOut(BaseSerializer):
 
 
 class SecretRetrieveCheckIn(BaseSerializer):
-    secret_id = serializers.CharField(max_length=40)
+    secret_id = UUIDStringField(max_length=40)
 
-    def save(self, **kwargs):
+    async def asave(self, **kwargs):
         secret_id = self.validated_data.get("secret_id")
-        secret = Secret.objects.filter(secret_id=secret_id).first()
+        secret = await aget_secret(secret_id)
 
         if not secret:
             raise serializers.ValidationError("secret not found")
@@ -98,14 +252,217 @@ class SecretRetrieveCheckIn(BaseSerializer):
 
 class SecretRetrieveCheckOut(BaseSerializer):
     passphrase_protected = serializers.BooleanField()
+    # only answered for secrets with an attachment.
+    attachment_name = serializers.CharField(required=False)
+    attachment_size = serializers.IntegerField(required=False)
+
+
+class BulkSecretIdsIn(serializers.Serializer):
+    secret_ids = serializers.ListField(
+        child=UUIDStringField(max_length=40), allow_empty=False
+    )
+
+    def validate_secret_ids(self, value):
+        if len(value) > settings.SECRET_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"Ensure this field has no more than {settings.SECRET_BULK_MAX_ITEMS} elements."
+            )
+        return value
+
+    def results(self, found: dict, answer):
+        """
+        Returns `answer(secret_id, found[secret_id])` for each requested id in order, keyed by the id as it was
+        sent. An id sent twice is only answered once by consuming endpoints, see `aconsume_secrets`.
+        """
+        return [
+            {"secret_id": sent, **answer(secret_id, found.get(secret_id))}
+            for sent, secret_id in zip(
+                self.initial_data["secret_ids"], self.validated_data["secret_ids"]
+            )
+        ]
+
+
+class BulkSecretCheckOut(serializers.Serializer):
+    secret_id = serializers.CharField()
+    exists = serializers.BooleanField()
+    passphrase_protected = serializers.BooleanField(allow_null=True)
+    burn_at = serializers.IntegerField(allow_null=True)
+
+
+def retrieve_flags(secret) -> dict:
+    """
+    Returns how a burned `secret` is encrypted, as answered by /api/secret/retrieve/ next to its text.
+    """
+    response_obj = {
+        "burn_at": secret.burn_at,
+        "passphrase_encrypted": False,
+        "pki_encrypted": False,
+    }
+
+    if secret.request_id and secret.public_key:
+        response_obj["pki_encrypted"] = True
+
+    elif not secret.request_id and secret.public_key:
+        response_obj["pki_encrypted"] = True
+
+    elif not secret.request_id and secret.passphrase_hash:
+        response_obj["passphrase_encrypted"] = True
+    else:
+        # Nothing to do.
+        pass
+
+    return response_obj
+
+
+def retrieve_response(secret) -> dict:
+    """
+    Returns the body /api/secret/retrieve/ answers with for a burned `secret`.
+    """
+    return SecretRetrieveOut(
+        {"secret_text": secret.get_secret_text(), **retrieve_flags(secret)}
+    ).data
+
+
+def retrieve_headers(secret) -> dict:
+    """
+    Returns `retrieve_flags` as the headers of a raw application/octet-stream answer, e.g. X-Burn-At.
+    """
+    return {
+        "X-"
+        + key.replace("_", "-").title(): (
+            str(value).lower() if isinstance(value, bool) else str(value)
+        )
+        for key, value in retrieve_flags(secret).items()
+    }
+
+
+def stream_response(chunks, blocking: bool = False, **kwargs) -> StreamingHttpResponse:
+    """
+    Returns a response sending each of `chunks` as soon as it's read, under ASGI. When reading them `blocking`,
+    e.g. from files, each is read in a thread so the event loop isn't held up.
+    """
+    if not blocking:
+
+        async def content():
+            for chunk in chunks:
+                yield chunk
+
+        return StreamingHttpResponse(content(), **kwargs)
+
+    chunks = iter(chunks)
+    read = sync_to_async(next, thread_sensitive=False)
+    close = sync_to_async(
+        getattr(chunks, "close", lambda: None), thread_sensitive=False
+    )
+
+    async def content():
+        try:
+            while (chunk := await read(chunks, None)) is not None:
+                yield chunk
+
+        finally:
+            await close()
+
+    return StreamingHttpResponse(content(), **kwargs)
+
+
+def stream_retrieve_response(
+    secret, text_chunks=None, blocking: bool = False
+) -> StreamingHttpResponse:
+    """
+    Returns the same body as `retrieve_response`, written out while the secret's text is read a piece at a time
+    from the stored (and possibly compressed) payload. The text is never held decompressed, escaped or encoded
+    as a whole, so a retrieval needs about `SECRET_STREAM_CHUNK_SIZE` of memory on top of the stored row.
+
+    Parameters:
+        secret (Secret): The burned secret.
+        text_chunks (iterable of str, optional): The text's pieces, if not read from the secret itself.
+        blocking (bool): Whether reading `text_chunks` blocks, see `stream_response`.
+    """
+    if text_chunks is None:
+        text_chunks = secret.iter_secret_text(settings.SECRET_STREAM_CHUNK_SIZE)
+
+    data = {"secret_text": StreamedString(text_chunks), **retrieve_flags(secret)}
+    chunks = CamelCaseORJSONRenderer().render_stream(data)
+
+    return stream_response(chunks, blocking, content_type="application/json")
+
+
+def stream_results(results: list):
+    """
+    Renders `{"results": results}` a piece at a time, like `stream_retrieve_response` does for one secret, for
+    results that may hold `StreamedString`s.
+    """
+    renderer = CamelCaseORJSONRenderer()
+    separator = b'{"results":['
+
+    for result in results:
+        yield separator
+        yield from renderer.render_stream(result)
+        separator = b","
+
+    yield b"]}" if separator == b"," else b'{"results":[]}'
+
+
+async def attachment_retrieve_response(secret, raw: bool) -> StreamingHttpResponse:
+    """
+    Burns the attachment of a burned `secret` and streams it, as it was sent when `raw`, otherwise as the
+    base64 `secret_text` of the usual JSON body.
+    """
+    store = get_attachment_store()
+    files = store and await sync_to_async(store.open)(secret.secret_id, secret.burn_at)
+
+    # attachments were turned off since, or it was purged between the secret being found and burned.
+    if files is None:
+        raise serializers.ValidationError("secret not found")
+
+    blocks = iter_attachment(files, settings.SECRET_STREAM_CHUNK_SIZE)
+
+    if not raw:
+        return stream_retrieve_response(secret, iter_base64(blocks), blocking=True)
+
+    response = stream_response(
+        blocks,
+        blocking=True,
+        content_type="application/octet-stream",
+        headers=retrieve_headers(secret),
+    )
+    response["Content-Length"] = str(secret.attachment_size)
+    response["Content-Disposition"] = content_disposition_header(
+        as_attachment=True, filename=secret.attachment_name
+    )
+    return response
 
 
 @api_view(["POST"])
-def handle_store_secret(request):
-    request_data = SecretIn(data=request.data)
+@parser_classes(OCTET_STREAM_PARSERS)
+async def handle_store_secret(request):
+    if is_octet_stream(request):
+        request_data = SecretBytesIn(data=octet_stream_data(request, "secret_bytes"))
+    else:
+        request_data = SecretIn(data=request.data)
+
+    if await request_data.ais_valid(raise_exception=True):
+        secret = await request_data.asave()
+        response_data = SecretOut(
+            secret, email_response=request_data.get_email_response()
+        ).data
+        return Response(response_data, status=status.HTTP_201_CREATED)
 
-    if request_data.is_valid(raise_exception=True):
-        secret = request_data.save()
+
+@api_view(["POST"])
+async def handle_store_attachment(request):
+    if not is_octet_stream(request):
+        raise UnsupportedMediaType(request.content_type)
+
+    if not get_attachment_store():
+        raise serializers.ValidationError("attachments are not enabled")
+
+    request_data = SecretAttachmentIn(data=octet_stream_data(request))
+
+    if await request_data.ais_valid(raise_exception=True):
+        # the body is read by the serializer, never parsed into request.data.
+        secret = await request_data.asave(stream=request.stream)
         response_data = SecretOut(
             secret, email_response=request_data.get_email_response()
         ).data
@@ -113,11 +470,20 @@ def handle_store_secret(request):
 
 
 @api_view(["POST"])
-def handle_retrieve_secret_check(request):
+async def handle_store_secrets(request):
+    request_data = BulkSecretIn(data=request.data)
+
+    if request_data.is_valid(raise_exception=True):
+        results = await request_data.asave()
+        return Response({"results": results}, status=status.HTTP_201_CREATED)
+
+
+@api_view(["POST"])
+async def handle_retrieve_secret_check(request):
     request_serializer = SecretRetrieveCheckIn(data=request.data)
 
     if request_serializer.is_valid(raise_exception=True):
-        secret = request_serializer.save()
+        secret = await request_serializer.asave()
 
         response_obj = {
             "passphrase_protected": False,
@@ -126,39 +492,102 @@ def handle_retrieve_secret_check(request):
         if secret.passphrase_hash:
             response_obj["passphrase_protected"] = True
 
+        if secret.attachment_size is not None:
+            response_obj["attachment_name"] = secret.attachment_name
+            response_obj["attachment_size"] = secret.attachment_size
+
         response_data = SecretRetrieveCheckOut(response_obj).data
         return Response(response_data)
 
 
 @api_view(["POST"])
-def handle_retrieve_secret(request):
-    request_serializer = SecretRetrieveIn(data=request.data)
+@parser_classes(OCTET_STREAM_PARSERS)
+@renderer_classes(OCTET_STREAM_RENDERERS)
+async def handle_retrieve_secret(request):
+    if is_octet_stream(request):
+        request_serializer = SecretRetrieveIn(data=octet_stream_data(request))
+    else:
+        request_serializer = SecretRetrieveIn(data=request.data)
 
     if request_serializer.is_valid(raise_exception=True):
-        secret = request_serializer.save()
+        secret = await request_serializer.asave()
+        # asked for with "Accept: application/octet-stream".
+        raw = isinstance(request.accepted_renderer, OctetStreamRenderer)
 
-        response_obj = {
-            "secret_text": secret.secret_text,
-            "burn_at": secret.burn_at,
-            "passphrase_encrypted": False,
-            "pki_encrypted": False,
-        }
+        if secret.attachment_size is not None:
+            return await attachment_retrieve_response(secret, raw)
 
-        if secret.request_id and secret.public_key:
-            response_obj["pki_encrypted"] = True
+        if raw:
+            return Response(secret.get_secret_bytes(), headers=retrieve_headers(secret))
 
-        elif not secret.request_id and secret.public_key:
-            response_obj["pki_encrypted"] = True
+        if secret.payload_size() >= settings.SECRET_STREAM_THRESHOLD:
+            return stream_retrieve_response(secret)
 
-        elif not secret.request_id and secret.passphrase_hash:
-            response_obj["passphrase_encrypted"] = True
-        else:
-            # Nothing to do.
-            pass
+        return Response(retrieve_response(secret))
 
-        response_data = SecretRetrieveOut(response_obj).data
-        secret.delete()
-        return Response(response_data)
+
+@api_view(["POST"])
+async def handle_retrieve_secrets_check(request):
+    request_serializer = BulkSecretIdsIn(data=request.data)
+
+    if request_serializer.is_valid(raise_exception=True):
+        found = await astatus_secrets(request_serializer.validated_data["secret_ids"])
+
+        def answer(secret_id, found_status):
+            if found_status is None:
+                return {"exists": False, "passphrase_protected": None, "burn_at": None}
+
+            return {"exists": True, **found_status}
+
+        results = BulkSecretCheckOut(
+            request_serializer.results(found, answer), many=True
+        ).data
+        return Response({"results": results})
+
+
+@api_view(["POST"])
+async def handle_retrieve_secrets(request):
+    """
+    Burns and answers each secret in `secret_ids` like /api/secret/retrieve/, streamed once their payloads add
+    up to SECRET_STREAM_THRESHOLD. Secrets are burned all at once per store, not across stores, see
+    `aconsume_secrets`.
+    """
+    request_serializer = BulkSecretIdsIn(data=request.data)
+
+    if request_serializer.is_valid(raise_exception=True):
+        found = await aconsume_secrets(request_serializer.validated_data["secret_ids"])
+        not_found, _ = format_error_data("secret not found", code="invalid")
+
+        def answer(secret_id, secret):
+            if secret is None:
+                return not_found
+
+            # each secret is only handed out once, to the first time its id was sent.
+            del found[secret_id]
+
+            if streamed:
+                return {
+                    "secret_text": StreamedString(
+                        secret.iter_secret_text(settings.SECRET_STREAM_CHUNK_SIZE)
+                    ),
+                    **retrieve_flags(secret),
+                }
+
+            return retrieve_response(secret)
+
+        # up to SECRET_BULK_MAX_ITEMS large secrets would otherwise be decompressed and rendered at once.
+        streamed = (
+            sum(secret.payload_size() for secret in found.values())
+            >= settings.SECRET_STREAM_THRESHOLD
+        )
+        results = request_serializer.results(found, answer)
+
+        if streamed:
+            return stream_response(
+                stream_results(results), content_type="application/json"
+            )
+
+        return Response({"results": results})
 
 
 urlpatterns = [
@@ -167,14 +596,34 @@ urlpatterns = [
         handle_store_secret,
         name="handle_store_secret",
     ),
+    re_path(
+        r"^attachment/$",
+        handle_store_attachment,
+        name="handle_store_attachment",
+    ),
+    re_path(
+        r"^bulk/$",
+        handle_store_secrets,
+        name="handle_store_secrets",
+    ),
     re_path(
         r"^retrieve/$",
         handle_retrieve_secret,
         name="handle_retrieve_secret",
     ),
+    re_path(
+        r"^retrieve/bulk/$",
+        handle_retrieve_secrets,
+        name="handle_retrieve_secrets",
+    ),
     re_path(
         r"^check/$",
         handle_retrieve_secret_check,
         name="handle_retrieve_secret_check",
     ),
+    re_path(
+        r"^check/bulk/$",
+        handle_retrieve_secrets_check,
+        name="handle_retrieve_secrets_check",
+    ),
 ]
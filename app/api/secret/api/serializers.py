@@ -1,11 +1,61 @@
-from rest_framework.serializers import Serializer, CharField
-from django.contrib.auth.hashers import make_password
+from adrf.serializers import Serializer
+from rest_framework.fields import Field, empty
+from rest_framework.serializers import CharField
+from rest_framework.settings import api_settings
+from core.base.api.parsers import OctetStreamParser
+from core.base.api.renderers import CamelCaseORJSONRenderer, OctetStreamRenderer
 from core.base.functions.data import pop_if_in
-from core.base.functions.mail import render_and_send_mail
-from secret.func import check_verification, pop_if_in
+from core.base.functions.hashing import amake_password
+from core.base.functions.ids import parse_uuid
+from core.base.functions.mail import aqueue_mail
+from secret.func import acheck_verification, pop_if_in
 from secret.exceptions import EmailVerificationError
 
 
+class UUIDStringField(CharField):
+    """
+    An ID sent by the client, parsed into a UUID. Any string is accepted, as it was when IDs were stored as text,
+    and one that isn't a UUID becomes None, to be answered like an unknown ID. Check for None before querying, as
+    filtering a nullable column by None matches every row where it is NULL.
+    """
+
+    def run_validation(self, data=empty):
+        # parsed after the CharField validation, so max_length applies to the string.
+        return parse_uuid(super().run_validation(data))
+
+
+class BytesField(Field):
+    """
+    A raw application/octet-stream body, see `octet_stream_data`. Validated like a CharField, with `max_length`
+    counted in bytes.
+    """
+
+    default_error_messages = {
+        "invalid": "Not a valid application/octet-stream body.",
+        "blank": "This field may not be blank.",
+        "max_length": "Ensure this field has no more than {max_length} bytes.",
+    }
+
+    def __init__(self, max_length=None, **kwargs):
+        self.max_length = max_length
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, bytes):
+            self.fail("invalid")
+
+        if not data:
+            self.fail("blank")
+
+        if self.max_length is not None and len(data) > self.max_length:
+            self.fail("max_length", max_length=self.max_length)
+
+        return data
+
+    def to_representation(self, value):
+        return bytes(value)
+
+
 class BaseSerializer(Serializer):
 
     def __init__(self, *args, **kwargs):
@@ -32,17 +82,21 @@ class BaseSerializer(Serializer):
         attrs["passphrase_hash"] = self.initial_data.get("passphrase_hash")
         return attrs
 
-    def send_verified_email(
+    async def abuild_verified_email(
         self,
         template_name,
         subject,
         context_from_serializer=None,
         additional_context=None,
     ):
+        """
+        Checks the sender's email verification and returns the keyword arguments for `aqueue_mail`, or None if
+        there is no email to send. A failed verification is set as the email response.
+        """
         try:
             if all([self._recipient_email, self._sender_email]):
                 # this can raise an EmailVerificationError
-                verified = check_verification(
+                verified = await acheck_verification(
                     verified_token=self._verified_token,
                     sender_email=self._sender_email,
                     recipient_email=self._recipient_email,
@@ -65,20 +119,24 @@ class BaseSerializer(Serializer):
                     if additional_context:
                         final_context = final_context | additional_context
 
-                    render_and_send_mail(
-                        subject=subject,
-                        template_name=template_name,
-                        context=final_context,
-                        recipient_list=[self._recipient_email],
-                    )
-
-                    self.set_email_response("ok")
+                    return {
+                        "subject": subject,
+                        "template_name": template_name,
+                        "context": final_context,
+                        "recipient_list": [self._recipient_email],
+                    }
 
         except EmailVerificationError as e:
             self.set_email_response(str(e))
 
-        except Exception as e:
-            raise e
+        return None
+
+    async def asend_verified_email(self, *args, **kwargs):
+        email = await self.abuild_verified_email(*args, **kwargs)
+
+        if email:
+            await aqueue_mail(**email)
+            self.set_email_response("queued")
 
     def get_email_response(self):
         return self._email_response
@@ -103,10 +161,57 @@ class SerializerWithEmailResponse(BaseSerializer):
         return response
 
 
-def handle_passphrase(initial_data):
+async def ahandle_passphrase(initial_data):
     passphrase = pop_if_in(initial_data, "passphrase")
 
     if passphrase:
-        initial_data["passphrase_hash"] = make_password(passphrase)
+        initial_data["passphrase_hash"] = await amake_password(passphrase)
 
     return initial_data
+
+
+# for views that also take and answer with raw bodies, see `octet_stream_data`.
+OCTET_STREAM_PARSERS = [*api_settings.DEFAULT_PARSER_CLASSES, OctetStreamParser]
+OCTET_STREAM_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, OctetStreamRenderer]
+
+# fields of a raw body request sent as headers, so that they aren't logged with the URL.
+OCTET_STREAM_HEADERS = {
+    "passphrase": "X-Passphrase",
+    "verified_token": "X-Verified-Token",
+}
+
+
+def is_octet_stream(request) -> bool:
+    return request.content_type.split(";")[0].strip() == OctetStreamParser.media_type
+
+
+def octet_stream_data(request, body_field=None) -> dict:
+    """
+    Returns the fields of a request sent with a raw application/octet-stream body, as the view would get them
+    from a JSON body. The fields in `OCTET_STREAM_HEADERS` are read from their headers, the rest from the
+    camelCase query string, and the body itself becomes `body_field`.
+
+    Parameters:
+        request (Request): The request, with a body parsed by `OctetStreamParser` (or none).
+        body_field (str): The field the body is sent as, if the view takes one.
+
+    Returns:
+        dict: The request's fields, with empty values as None.
+    """
+    data = {}
+
+    for key, value in request.query_params.items():
+        field = CamelCaseORJSONRenderer.translator.underscore(key)
+
+        if field not in OCTET_STREAM_HEADERS:
+            data[field] = value or None
+
+    for field, header in OCTET_STREAM_HEADERS.items():
+        if request.headers.get(header):
+            data[field] = request.headers[header]
+
+    if body_field:
+        # an empty body isn't parsed at all.
+        data[body_field] = request.data if isinstance(request.data, bytes) else b""
+
+    return data
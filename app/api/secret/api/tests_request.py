@@ -1,5 +1,9 @@
 from rest_framework.test import APITestCase
 from rest_framework import status
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from secret.models import Secret, set_burn_at
 from uuid import uuid4
@@ -112,6 +116,34 @@ class HandleRetrieveRequestFulfilmentTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data["detail"], "request not found.")
 
+    def test_04a_retrieve_fulfilment_invalid_request_id(self):
+        # a plain secret, whose request_id and fulfilment_id are NULL.
+        plain = Secret.objects.create(secret_text="plain", expiry_seconds=3600)
+
+        url = reverse("api:request:handle_retrieve_request")
+        response = self.client.post(url, {"request_id": "not-a-uuid"}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["detail"], "request not found.")
+
+        plain.refresh_from_db()
+        self.assertIsNone(plain.fulfilment_id)
+
+    def test_05_retrieve_fulfilment_without_payload(self):
+        payload = {"request_id": self.secret.request_id}
+        url = reverse("api:request:handle_retrieve_request")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        select, update = [query["sql"] for query in queries.captured_queries]
+        self.assertNotIn("secret_text", select)
+        self.assertNotIn("secret_blob", select)
+        self.assertIn('SET "fulfilment_id"', update)
+        self.assertNotIn("secret_text", update)
+
 
 class HandleFulfilRequestTest(APITestCase):
 
@@ -157,3 +189,85 @@ class HandleFulfilRequestTest(APITestCase):
         # Assert response
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data["detail"], "request not found or never existed")
+
+    def test_02a_fulfil_request_invalid_fulfilment_id(self):
+        # a plain secret, whose request_id and fulfilment_id are NULL.
+        plain = Secret.objects.create(secret_text="plain", expiry_seconds=3600)
+        payload = {
+            "request_id": "x",
+            "fulfilment_id": "zzz",
+            "secret_text": "This is the secret text.",
+        }
+
+        url = reverse("api:request:handle_fulfil_request")
+        with self.assertNumQueries(0):
+            response = self.client.post(url, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["detail"], "request not found or never existed")
+
+        plain.refresh_from_db()
+        self.assertEqual(plain.get_secret_text(), "plain")
+
+    def test_03_fulfil_request_large_secret(self):
+        secret_text = "KEY=value\n" * 1000 + "END=1"
+        payload = {
+            "request_id": self.secret.request_id,
+            "fulfilment_id": self.secret.fulfilment_id,
+            "secret_text": secret_text,
+        }
+
+        url = reverse("api:request:handle_fulfil_request")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # the request is looked up without its payload, and only the payload is written.
+        select, update = [query["sql"] for query in queries.captured_queries]
+        self.assertNotIn("secret_text", select)
+        self.assertNotIn("expiry_seconds", update)
+
+        self.secret.refresh_from_db()
+        self.assertIsNone(self.secret.secret_text)
+        self.assertEqual(self.secret.secret_codec, "zlib")
+        self.assertEqual(self.secret.get_secret_text(), secret_text)
+
+    def test_04_fulfil_request_bytes(self):
+        payload = bytes(range(256)) * 4
+
+        url = reverse("api:request:handle_fulfil_request")
+        response = self.client.post(
+            f"{url}?requestId={self.secret.request_id}&fulfilmentId={self.secret.fulfilment_id}",
+            payload,
+            content_type="application/octet-stream",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["request_id"], str(self.secret.request_id))
+
+        self.secret.refresh_from_db()
+        self.assertIsNone(self.secret.secret_text)
+        self.assertEqual(self.secret.secret_codec, Secret.BINARY_CODEC)
+        self.assertEqual(self.secret.get_secret_bytes(), payload)
+
+    @override_settings(
+        DATABASE_REPLICAS=["replica_1"],
+        DATABASE_ROUTERS=["config.routers.PrimaryReplicaRouter"],
+    )
+    def test_04_fulfil_request_reads_primary(self):
+        # not sticky, so a read_only() lookup would go to the replica.
+        cache.clear()
+        payload = {
+            "request_id": self.secret.request_id,
+            "fulfilment_id": self.secret.fulfilment_id,
+            "secret_text": "This is the secret text.",
+        }
+
+        url = reverse("api:request:handle_fulfil_request")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # the lookup and the write both ran on the primary.
+        self.assertEqual(len(queries.captured_queries), 2)
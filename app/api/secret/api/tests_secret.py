@@ -1,10 +1,22 @@
+import base64
+import json
+import secrets
 import time
+from unittest.mock import patch
 from rest_framework.test import APITestCase
 from rest_framework import status
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from secret.models import Secret
+from core.base.api.renderers import CamelCaseORJSONRenderer
+from core.base.functions.crypto import token_digest
+from core.base.functions.hashing import amake_password
+from core.base.models import OutboxEmail
+from secret.func import hmac_email_binding
+from secret.models import Secret, Verification
 from uuid import uuid4
-from django.contrib.auth.hashers import make_password
+from django.contrib.auth.hashers import check_password, make_password
 
 
 class HandleStoreSecretTest(APITestCase):
@@ -53,6 +65,182 @@ class HandleStoreSecretTest(APITestCase):
             "Ensure this value is greater than or equal to 60.",
         )
 
+    def test_03_store_large_secret_compressed(self):
+        secret_text = "KEY=value\n" * 1000 + "END=1"
+        payload = {"secret_text": secret_text, "expiry_seconds": 3600}
+
+        url = reverse("api:secret:handle_store_secret")
+        response = self.client.post(url, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # the text is stored compressed, not as plain text.
+        secret = Secret.objects.get(secret_id=response.data["secret_id"])
+        self.assertIsNone(secret.secret_text)
+        self.assertEqual(secret.secret_codec, "zlib")
+        self.assertLess(len(secret.secret_blob), len(secret_text))
+
+        url = reverse("api:secret:handle_retrieve_secret")
+        response = self.client.post(url, {"secret_id": secret.secret_id}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["secret_text"], secret_text)
+
+
+class HandleStoreSecretsTest(APITestCase):
+
+    def verify(self, token, recipient_email):
+        Verification.objects.create(
+            code="123456",
+            verified_token_digest=token_digest(token),
+            sender_email_hash=hmac_email_binding("sender@example.com"),
+            recipient_email_hash=hmac_email_binding(recipient_email),
+        )
+
+    @patch("secret.api.serializers.amake_password", wraps=amake_password)
+    def test_01_store_secrets(self, mock_make_password):
+        payload = {
+            "secret_text": "shared credentials",
+            "expiry_seconds": 3600,
+            "passphrase": "shared-passphrase",
+            "secrets": [
+                {},
+                {"secret_text": "other credentials"},
+                {"expiry_seconds": 30},
+            ],
+        }
+
+        url = reverse("api:secret:handle_store_secrets")
+        response = self.client.post(url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # the shared passphrase was hashed once.
+        self.assertEqual(mock_make_password.call_count, 1)
+
+        created, other, invalid = response.data["results"]
+        self.assertEqual(
+            invalid,
+            {
+                "detail": "expiry_seconds: Ensure this value is greater than or equal to 60.",
+                "errors": [
+                    {
+                        "field": "expiry_seconds",
+                        "detail": "Ensure this value is greater than or equal to 60.",
+                    }
+                ],
+                "code": "invalid",
+            },
+        )
+
+        url = reverse("api:secret:handle_retrieve_secret")
+        for result, secret_text in [
+            (created, "shared credentials"),
+            (other, "other credentials"),
+        ]:
+            secret = Secret.objects.get(secret_id=result["secret_id"])
+            self.assertEqual(secret.burn_at, result["burn_at"])
+
+            response = self.client.post(
+                url,
+                {"secret_id": result["secret_id"], "passphrase": "shared-passphrase"},
+                format="json",
+            )
+            self.assertEqual(response.data["secret_text"], secret_text)
+
+    @patch("secret.api.serializers.amake_password", wraps=amake_password)
+    def test_01a_store_secrets_item_passphrases(self, mock_make_password):
+        payload = {
+            "secret_text": "shared credentials",
+            "expiry_seconds": 3600,
+            "passphrase": "shared-passphrase",
+            "secrets": [
+                {"passphrase": None},
+                {"passphrase": ""},
+                {"passphrase": "own-passphrase"},
+                {"passphrase": "own-passphrase"},
+                {},
+            ],
+        }
+
+        url = reverse("api:secret:handle_store_secrets")
+        response = self.client.post(url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # each distinct passphrase was hashed once.
+        self.assertEqual(mock_make_password.call_count, 2)
+
+        secrets = [
+            Secret.objects.get(secret_id=result["secret_id"])
+            for result in response.data["results"]
+        ]
+        self.assertEqual(
+            [
+                secret.passphrase_hash
+                and check_password(passphrase, secret.passphrase_hash)
+                for secret, passphrase in zip(
+                    secrets,
+                    [
+                        None,
+                        None,
+                        "own-passphrase",
+                        "own-passphrase",
+                        "shared-passphrase",
+                    ],
+                )
+            ],
+            [None, None, True, True, True],
+        )
+
+    @override_settings(ALLOW_EMAIL=True)
+    def test_02_store_secrets_for_recipients(self):
+        self.verify("token-1", "one@example.com")
+        self.verify("token-2", "two@example.com")
+
+        payload = {
+            "secret_text": "shared credentials",
+            "expiry_seconds": 3600,
+            "sender_email": "sender@example.com",
+            "secrets": [
+                {"recipient_email": "one@example.com", "verified_token": "token-1"},
+                {"recipient_email": "two@example.com", "verified_token": "token-2"},
+                {"recipient_email": "three@example.com", "verified_token": "token-2"},
+            ],
+        }
+
+        url = reverse("api:secret:handle_store_secrets")
+        response = self.client.post(url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(
+            [result["email_response"] for result in response.data["results"]],
+            ["queued", "queued", "email verification failed"],
+        )
+        self.assertEqual(
+            sorted(OutboxEmail.objects.values_list("recipient_list", flat=True)),
+            [["one@example.com"], ["two@example.com"]],
+        )
+
+        # every secret was created, including the one whose email wasn't sent.
+        self.assertEqual(Secret.objects.count(), 3)
+
+    @override_settings(SECRET_BULK_MAX_ITEMS=2)
+    def test_03_store_secrets_invalid(self):
+        url = reverse("api:secret:handle_store_secrets")
+
+        for secrets, detail in [
+            ([], "secrets: This list may not be empty."),
+            ([{}, {}, {}], "secrets: Ensure this field has no more than 2 elements."),
+        ]:
+            response = self.client.post(
+                url,
+                {"secret_text": "text", "expiry_seconds": 3600, "secrets": secrets},
+                format="json",
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data["detail"], detail)
+
+        self.assertEqual(Secret.objects.count(), 0)
+
 
 class HandleRetrieveSecretTest(APITestCase):
 
@@ -163,10 +351,20 @@ class HandleRetrieveSecretTest(APITestCase):
         self.assertIn("detail", response.data)
         self.assertEqual(response.data["detail"], "secret not found")
 
-        # Check that the secret was deleted after expiration
-        self.assertFalse(
-            Secret.objects.filter(secret_id=self.secret.secret_id).exists()
-        )
+        # Expired secrets are filtered out in SQL and left for the expiry job, reading them has no side effects.
+        self.assertTrue(Secret.objects.filter(secret_id=self.secret.secret_id).exists())
+
+    def test_03a_retrieve_secret_only_once(self):
+        payload = {"secret_id": self.secret_no_passphrase.secret_id}
+        url = reverse("api:secret:handle_retrieve_secret")
+
+        response = self.client.post(url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # The secret was claimed and deleted by the first read.
+        response = self.client.post(url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["detail"], "secret not found")
 
     def test_04_retrieve_secret_not_found(self):
         # API request payload for retrieving a non-existent secret
@@ -314,3 +512,366 @@ class HandleRetrieveSecretTest(APITestCase):
         # Check that the response contains validation error for non-existent secret
         self.assertIn("detail", response.data)
         self.assertEqual(response.data["detail"], "secret not found")
+
+    def test_12_retrieve_secret_check_id_formats(self):
+        url = reverse("api:secret:handle_retrieve_secret_check")
+
+        # IDs are stored as UUIDs, but are still accepted as any string UUID.
+        for secret_id in [
+            str(self.secret.secret_id).upper(),
+            str(self.secret.secret_id).replace("-", ""),
+        ]:
+            response = self.client.post(url, {"secret_id": secret_id}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # and a string that isn't a UUID is answered like an unknown ID.
+        response = self.client.post(url, {"secret_id": "not-a-uuid"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["detail"], "secret not found")
+
+    def test_13_retrieve_secret_check_without_payload(self):
+        url = reverse("api:secret:handle_retrieve_secret_check")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                url, {"secret_id": self.secret.secret_id}, format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        (select,) = [query["sql"] for query in queries.captured_queries]
+        self.assertNotIn("secret_text", select)
+        self.assertNotIn("secret_blob", select)
+
+
+class HandleRetrieveSecretsTest(APITestCase):
+
+    def setUp(self):
+        self.plain, self.other = [
+            Secret.objects.create(secret_text=text, expiry_seconds=3600)
+            for text in ["first", "second"]
+        ]
+        self.protected = Secret.objects.create(
+            secret_text="protected",
+            expiry_seconds=3600,
+            passphrase_hash=make_password("test-passphrase"),
+        )
+        self.expired = Secret.objects.create(
+            secret_text="expired", expiry_seconds=3600, burn_at=int(time.time()) - 10
+        )
+        self.secret_ids = [
+            str(secret.secret_id)
+            for secret in [self.plain, self.protected, self.expired, self.other]
+        ] + ["not-a-uuid"]
+
+    def test_01_check_secrets(self):
+        url = reverse("api:secret:handle_retrieve_secrets_check")
+
+        # one query, for the columns answered.
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                url, {"secret_ids": self.secret_ids}, format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [dict(result) for result in response.data["results"]],
+            [
+                {
+                    "secret_id": self.secret_ids[0],
+                    "exists": True,
+                    "passphrase_protected": False,
+                    "burn_at": self.plain.burn_at,
+                },
+                {
+                    "secret_id": self.secret_ids[1],
+                    "exists": True,
+                    "passphrase_protected": True,
+                    "burn_at": self.protected.burn_at,
+                },
+                {
+                    "secret_id": self.secret_ids[2],
+                    "exists": False,
+                    "passphrase_protected": None,
+                    "burn_at": None,
+                },
+                {
+                    "secret_id": self.secret_ids[3],
+                    "exists": True,
+                    "passphrase_protected": False,
+                    "burn_at": self.other.burn_at,
+                },
+                {
+                    "secret_id": "not-a-uuid",
+                    "exists": False,
+                    "passphrase_protected": None,
+                    "burn_at": None,
+                },
+            ],
+        )
+
+        # nothing was burned.
+        self.assertEqual(Secret.objects.count(), 4)
+
+    def test_02_retrieve_secrets(self):
+        url = reverse("api:secret:handle_retrieve_secrets")
+        secret_ids = self.secret_ids + [self.secret_ids[0]]
+
+        # one DELETE burns every secret that isn't passphrase protected.
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {"secret_ids": secret_ids}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+
+        self.assertEqual(
+            [result.get("secret_text") for result in results],
+            ["first", None, None, "second", None, None],
+        )
+        self.assertEqual(results[0]["burn_at"], self.plain.burn_at)
+        self.assertEqual(results[0]["secret_id"], self.secret_ids[0])
+
+        # passphrase protected secrets have to be retrieved one at a time, with their passphrase.
+        for result in results[1:3] + results[4:]:
+            self.assertEqual(result["detail"], "secret not found")
+            self.assertEqual(result["errors"], [{"detail": "secret not found"}])
+
+        self.assertEqual(
+            set(Secret.objects.values_list("secret_id", flat=True)),
+            {self.protected.secret_id, self.expired.secret_id},
+        )
+
+        response = self.client.post(
+            url, {"secret_ids": self.secret_ids[:1]}, format="json"
+        )
+        self.assertEqual(response.data["results"][0]["detail"], "secret not found")
+
+    @override_settings(SECRET_STREAM_THRESHOLD=8, SECRET_STREAM_CHUNK_SIZE=2)
+    async def test_02a_retrieve_secrets_streamed(self):
+        url = reverse("api:secret:handle_retrieve_secrets")
+        secret_ids = self.secret_ids + [self.secret_ids[0]]
+
+        response = await self.async_client.post(
+            url, {"secretIds": secret_ids}, content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+        not_found = {
+            "code": "invalid",
+            "detail": "secret not found",
+            "errors": [{"detail": "secret not found"}],
+        }
+        flags = {"passphraseEncrypted": False, "pkiEncrypted": False}
+        self.assertEqual(
+            json.loads(b"".join([chunk async for chunk in response.streaming_content])),
+            {
+                "results": [
+                    {
+                        "secretId": self.secret_ids[0],
+                        "secretText": "first",
+                        "burnAt": self.plain.burn_at,
+                        **flags,
+                    },
+                    {"secretId": self.secret_ids[1], **not_found},
+                    {"secretId": self.secret_ids[2], **not_found},
+                    {
+                        "secretId": self.secret_ids[3],
+                        "secretText": "second",
+                        "burnAt": self.other.burn_at,
+                        **flags,
+                    },
+                    {"secretId": "not-a-uuid", **not_found},
+                    {"secretId": self.secret_ids[0], **not_found},
+                ]
+            },
+        )
+        self.assertEqual(await Secret.objects.acount(), 2)
+
+    @override_settings(SECRET_BULK_MAX_ITEMS=2)
+    def test_03_invalid(self):
+        for url in [
+            reverse("api:secret:handle_retrieve_secrets_check"),
+            reverse("api:secret:handle_retrieve_secrets"),
+        ]:
+            response = self.client.post(
+                url, {"secret_ids": self.secret_ids}, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(
+                response.data["detail"],
+                "secret_ids: Ensure this field has no more than 2 elements.",
+            )
+
+        self.assertEqual(Secret.objects.count(), 4)
+
+
+class StreamRetrieveSecretTest(APITestCase):
+
+    async def retrieve(self, secret_id):
+        return await self.async_client.post(
+            reverse("api:secret:handle_retrieve_secret"),
+            {"secretId": str(secret_id)},
+            content_type="application/json",
+        )
+
+    @override_settings(SECRET_STREAM_THRESHOLD=4096, SECRET_STREAM_CHUNK_SIZE=1000)
+    async def test_01_large_secrets_streamed(self):
+        # random text, so it is still large once compressed.
+        text = secrets.token_urlsafe(20000) + ' "ünïcödé" \u2028'
+
+        for compression in ["zlib", "none"]:
+            with override_settings(SECRET_COMPRESSION=compression):
+                secret = await Secret.objects.acreate(
+                    secret_text=text, expiry_seconds=3600, public_key="key"
+                )
+
+            response = await self.retrieve(secret.secret_id)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response["Content-Type"], "application/json")
+
+            # the same body as a rendered response.
+            content = b"".join([chunk async for chunk in response.streaming_content])
+            self.assertEqual(
+                content,
+                CamelCaseORJSONRenderer().render(
+                    {
+                        "secret_text": text,
+                        "burn_at": secret.burn_at,
+                        "passphrase_encrypted": False,
+                        "pki_encrypted": True,
+                    }
+                ),
+            )
+            self.assertFalse(
+                await Secret.objects.filter(secret_id=secret.secret_id).aexists()
+            )
+
+    @override_settings(SECRET_STREAM_THRESHOLD=4096)
+    async def test_02_small_secrets_rendered(self):
+        # well compressed, so small as stored.
+        secret = await Secret.objects.acreate(
+            secret_text="KEY=value\n" * 1000 + "END=1", expiry_seconds=3600
+        )
+
+        response = await self.retrieve(secret.secret_id)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.json()["secretText"], "KEY=value\n" * 1000 + "END=1")
+
+
+class OctetStreamSecretTest(APITestCase):
+
+    # ciphertext as a client would send it, which isn't valid UTF-8.
+    payload = bytes(range(256)) * 4
+
+    def store(self, body, query="expirySeconds=3600", **headers):
+        return self.client.post(
+            f"{reverse('api:secret:handle_store_secret')}?{query}",
+            body,
+            content_type="application/octet-stream",
+            **headers,
+        )
+
+    def retrieve(self, secret_id, accept="application/octet-stream", **headers):
+        return self.client.post(
+            f"{reverse('api:secret:handle_retrieve_secret')}?secretId={secret_id}",
+            content_type="application/octet-stream",
+            HTTP_ACCEPT=accept,
+            **headers,
+        )
+
+    def test_01_store_and_retrieve_bytes(self):
+        response = self.store(self.payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # stored as sent, not compressed or encoded.
+        secret = Secret.objects.get(secret_id=response.data["secret_id"])
+        self.assertEqual(secret.secret_codec, Secret.BINARY_CODEC)
+        self.assertEqual(bytes(secret.secret_blob), self.payload)
+        self.assertIsNone(secret.secret_text)
+
+        response = self.retrieve(secret.secret_id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/octet-stream")
+        self.assertEqual(response.content, self.payload)
+        self.assertEqual(response["X-Burn-At"], str(secret.burn_at))
+        self.assertEqual(response["X-Passphrase-Encrypted"], "false")
+        self.assertEqual(response["X-Pki-Encrypted"], "false")
+
+        self.assertFalse(Secret.objects.filter(secret_id=secret.secret_id).exists())
+
+    def test_02_passphrase_header(self):
+        response = self.store(self.payload, HTTP_X_PASSPHRASE="test-passphrase")
+        secret_id = response.data["secret_id"]
+
+        # the passphrase is only read from the header.
+        response = self.client.post(
+            f"{reverse('api:secret:handle_retrieve_secret')}"
+            f"?secretId={secret_id}&passphrase=test-passphrase",
+            content_type="application/octet-stream",
+            HTTP_ACCEPT="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json()["detail"], "secret not found")
+
+        response = self.retrieve(secret_id, HTTP_X_PASSPHRASE="test-passphrase")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, self.payload)
+        self.assertEqual(response["X-Passphrase-Encrypted"], "true")
+
+    def test_03_json_and_bytes_interchangeable(self):
+        # bytes retrieved as JSON are base64 encoded, as a JSON client would have sent them.
+        secret_id = self.store(self.payload).data["secret_id"]
+        response = self.client.post(
+            reverse("api:secret:handle_retrieve_secret"),
+            {"secret_id": secret_id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(base64.b64decode(response.data["secret_text"]), self.payload)
+
+        # text retrieved as bytes is UTF-8.
+        secret = Secret.objects.create(secret_text="ünïcödé", expiry_seconds=3600)
+        response = self.retrieve(secret.secret_id)
+        self.assertEqual(response.content, "ünïcödé".encode("utf-8"))
+
+    @override_settings(SECRET_STREAM_THRESHOLD=4096, SECRET_STREAM_CHUNK_SIZE=1000)
+    async def test_04_large_bytes_streamed_as_json(self):
+        secret = await Secret.objects.acreate(
+            secret_codec=Secret.BINARY_CODEC,
+            secret_blob=self.payload * 10,
+            expiry_seconds=3600,
+        )
+
+        response = await self.async_client.post(
+            reverse("api:secret:handle_retrieve_secret"),
+            {"secretId": str(secret.secret_id)},
+            content_type="application/json",
+        )
+        self.assertTrue(response.streaming)
+
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(
+            base64.b64decode(json.loads(content)["secretText"]), self.payload * 10
+        )
+
+    def test_05_invalid(self):
+        for body, query, field, detail in [
+            (b"", "expirySeconds=3600", "secret_bytes", "This field may not be blank."),
+            (
+                b"x" * 512001,
+                "expirySeconds=3600",
+                "secret_bytes",
+                "Ensure this field has no more than 512000 bytes.",
+            ),
+            (self.payload, "", "expiry_seconds", "This field is required."),
+        ]:
+            response = self.store(body, query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json()["errors"][0]["field"], field)
+            self.assertEqual(response.json()["errors"][0]["detail"], detail)
+
+        self.assertFalse(Secret.objects.exists())
@@ -5,7 +5,7 @@ from secret.exceptions import EmailVerificationError
 from secret.api.serializers import (
     BaseSerializer,
     SerializerWithEmailResponse,
-    handle_passphrase,
+    ahandle_passphrase,
 )
 
 
@@ -26,10 +26,10 @@ class BaseSerializerTest(APITestCase):
         self.assertEqual(serializer._recipient_email, "to@example.com")
         self.assertEqual(serializer._verified_token, "some-token")
 
-    def test_02_handle_passphrase(self):
-        # Test that the passphrase is hashed correctly by handle_passphrase
+    async def test_02_handle_passphrase(self):
+        # Test that the passphrase is hashed correctly by ahandle_passphrase
         initial_data = {"passphrase": "my_secret_passphrase"}
-        result = handle_passphrase(initial_data)
+        result = await ahandle_passphrase(initial_data)
 
         # Ensure the passphrase was removed and passphrase_hash was added
         self.assertNotIn("passphrase", result)
@@ -41,12 +41,12 @@ class BaseSerializerTest(APITestCase):
         )
 
     @patch("core.base.functions.mail.settings")
-    @patch("secret.api.serializers.render_and_send_mail")
-    @patch("secret.api.serializers.check_verification")
-    def test_03_send_verified_email_success(
+    @patch("secret.api.serializers.aqueue_mail")
+    @patch("secret.api.serializers.acheck_verification")
+    async def test_03_send_verified_email_success(
         self,
         mock_check_verification,
-        mock_render_and_send_mail,
+        mock_queue_mail,
         mock_settings,
     ):
         # Test that email sending works when verification passes
@@ -64,8 +64,8 @@ class BaseSerializerTest(APITestCase):
         # Call is_valid to populate validated_data
         self.assertTrue(serializer.is_valid())
 
-        # Now call send_verified_email after valid data has been processed
-        serializer.send_verified_email(
+        # Now call asend_verified_email after valid data has been processed
+        await serializer.asend_verified_email(
             template_name="test-template",
             subject="Test Subject",
             context_from_serializer=["sender_email", "an_unknown_key"],
@@ -79,16 +79,17 @@ class BaseSerializerTest(APITestCase):
             recipient_email="recipient@example.com",
         )
 
-        # Ensure the email was sent
-        mock_render_and_send_mail.assert_called_once()
+        # Ensure the email was queued
+        mock_queue_mail.assert_called_once()
+        self.assertEqual(serializer.get_email_response(), "queued")
 
     @patch("core.base.functions.mail.settings")
-    @patch("core.base.functions.mail.render_and_send_mail")
+    @patch("secret.api.serializers.aqueue_mail")
     @patch(
-        "secret.api.serializers.check_verification",
+        "secret.api.serializers.acheck_verification",
         side_effect=EmailVerificationError("Verification failed"),
     )
-    def test_04_send_verified_email_verification_failure(
+    async def test_04_send_verified_email_verification_failure(
         self, mock_check_verification, mock_send_mail, mock_settings
     ):
         # Test that the email is not sent if verification fails
@@ -97,7 +98,7 @@ class BaseSerializerTest(APITestCase):
         serializer._sender_email = "from@example.com"
         serializer._recipient_email = "to@example.com"
 
-        serializer.send_verified_email(
+        await serializer.asend_verified_email(
             template_name="test-template",
             subject="Test Subject",
             context_from_serializer=["sender_email"],
@@ -113,11 +114,11 @@ class BaseSerializerTest(APITestCase):
         # Ensure that the correct email response is set
         self.assertEqual(serializer.get_email_response(), "Verification failed")
 
-    @patch("secret.api.serializers.check_verification")
+    @patch("secret.api.serializers.acheck_verification")
     @patch("core.base.functions.mail.settings")
-    @patch("core.base.functions.mail.render_and_send_mail")
-    def test_05_invalid_characters_in_template(
-        self, mock_send_mail, mock_settings, mock_check_verification
+    @patch("core.base.functions.mail.OutboxEmail")
+    async def test_05_invalid_characters_in_template(
+        self, mock_outbox_email, mock_settings, mock_check_verification
     ):
         mock_settings.ALLOW_EMAIL = True
         mock_check_verification.return_value = True
@@ -126,7 +127,7 @@ class BaseSerializerTest(APITestCase):
         serializer._recipient_email = "to@example.com"
 
         try:
-            serializer.send_verified_email(
+            await serializer.asend_verified_email(
                 template_name="test-template##",
                 subject="Test Subject",
                 context_from_serializer=["sender_email"],
@@ -135,8 +136,8 @@ class BaseSerializerTest(APITestCase):
         except Exception as e:
             self.assertEqual(str(e), "Invalid template name")
 
-        # Ensure that email function isn't called.
-        mock_send_mail.assert_not_called()
+        # Ensure that nothing was queued.
+        mock_outbox_email.objects.acreate.assert_not_called()
 
 
 class SerializerWithEmailResponseTest(APITestCase):
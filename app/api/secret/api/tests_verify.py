@@ -2,8 +2,11 @@ from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
 from unittest.mock import patch
+from core.base.models import OutboxEmail
+from core.base.functions.crypto import token_digest
 from secret.models import Verification
-from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.hashers import make_password
+from secret.func import hmac_email_binding
 from uuid import uuid4
 
 
@@ -12,7 +15,7 @@ class HandleRequestVerificationTest(APITestCase):
     @patch("core.base.functions.mail.settings")
     @patch("core.base.functions.crypto.RandomStringGenerator.generate")
     @patch("core.base.functions.mail.build_email_templates")
-    @patch("secret.api.verify.render_and_send_mail")
+    @patch("secret.api.verify.aqueue_mail")
     def test_01_request_verification_success(
         self,
         mock_send_mail,
@@ -43,16 +46,21 @@ class HandleRequestVerificationTest(APITestCase):
 
         # Ensure that a Verification object was created
         verification = Verification.objects.get()
-        self.assertTrue(
-            check_password("recipient@example.com", verification.recipient_email_hash)
+        self.assertEqual(
+            verification.recipient_email_hash,
+            hmac_email_binding("recipient@example.com"),
         )
-        self.assertTrue(
-            check_password("sender@example.com", verification.sender_email_hash)
+        self.assertEqual(
+            verification.sender_email_hash, hmac_email_binding("sender@example.com")
         )
         self.assertEqual(verification.code, "123456")
 
-        # Ensure the email was sent
+        # Ensure the email was queued ahead of any notifications
         mock_send_mail.assert_called_once()
+        self.assertEqual(
+            mock_send_mail.call_args.kwargs["priority"],
+            OutboxEmail.PRIORITY_VERIFICATION,
+        )
 
     def test_02_request_verification_no_email(self):
         # API request payload without email
@@ -101,7 +109,10 @@ class HandleVerifyRequestTest(APITestCase):
 
         # Ensure that the verification token was updated
         self.verification.refresh_from_db()
-        self.assertEqual(self.verification.verified_token, "randomly_generated_token")
+        self.assertEqual(
+            bytes(self.verification.verified_token_digest),
+            token_digest("randomly_generated_token"),
+        )
 
         # Ensure the response contains the verified token and 'ok' is True
         self.assertIn("verified_token", response.data)
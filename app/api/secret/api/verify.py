@@ -1,34 +1,38 @@
+from adrf import serializers as async_serializers
+from adrf.decorators import api_view
 from rest_framework import serializers, status
-from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from core.base.functions.mail import render_and_send_mail
+from core.base.functions.mail import aqueue_mail
+from core.base.models import OutboxEmail
 from secret.models import Verification
-from secret.api.serializers import BaseSerializer
+from secret.api.serializers import BaseSerializer, UUIDStringField
 from django.urls import re_path
 from core.base.functions.crypto import RandomStringGenerator
-from django.contrib.auth.hashers import make_password
+from secret.func import abind_email
 
 
-class VerifyEmailRequestIn(serializers.Serializer):
+class VerifyEmailRequestIn(async_serializers.Serializer):
     sender_email = serializers.EmailField(max_length=500)
     recipient_email = serializers.EmailField(max_length=500)
 
-    def create(self, validated_data):
+    async def acreate(self, validated_data):
         generator = RandomStringGenerator(
             length=6, include_alpha=False, include_symbols=False
         )
         code = generator.generate()
 
-        verification = Verification.objects.create(
+        verification = await Verification.objects.acreate(
             code=code,
-            sender_email_hash=make_password(self.validated_data.get("sender_email")),
-            recipient_email_hash=make_password(
+            sender_email_hash=await abind_email(
+                self.validated_data.get("sender_email")
+            ),
+            recipient_email_hash=await abind_email(
                 self.validated_data.get("recipient_email")
             ),
         )
 
-        render_and_send_mail(
+        await aqueue_mail(
             subject="Secret Burner: Please verify your email",
             context={
                 "code": code,
@@ -37,6 +41,7 @@ class VerifyEmailRequestIn(serializers.Serializer):
             },
             template_name="verify-email",
             recipient_list=[self.validated_data.get("sender_email")],
+            priority=OutboxEmail.PRIORITY_VERIFICATION,
         )
 
         return verification
@@ -47,13 +52,15 @@ class VerifyEmailRequestOut(BaseSerializer):
 
 
 class VerifyEmailIn(BaseSerializer):
-    verify_id = serializers.CharField(max_length=40)
+    verify_id = UUIDStringField(max_length=40)
     code = serializers.CharField(max_length=20)
 
-    def create(self, validated_data):
-        verification = Verification.objects.filter(
-            verify_id=validated_data.get("verify_id")
-        ).first()
+    async def acreate(self, validated_data):
+        verification = (
+            await Verification.objects.live()
+            .filter(verify_id=validated_data.get("verify_id"))
+            .aone()
+        )
 
         if not verification:
             raise serializers.ValidationError("verification failed")
@@ -62,8 +69,8 @@ class VerifyEmailIn(BaseSerializer):
             raise serializers.ValidationError("verification failed")
 
         generator = RandomStringGenerator(length=128, include_symbols=True)
-        verification.verified_token = generator.generate()
-        verification.save()
+        verification.set_verified_token(generator.generate())
+        await verification.asave(update_fields=["verified_token_digest"])
 
         return verification
 
@@ -74,21 +81,21 @@ class VerifyEmailOut(BaseSerializer):
 
 
 @api_view(["POST"])
-def handle_request_verification(request):
+async def handle_request_verification(request):
     request_serializer = VerifyEmailRequestIn(data=request.data)
 
     if request_serializer.is_valid(raise_exception=True):
-        verification = request_serializer.save()
+        verification = await request_serializer.asave()
         response_data = VerifyEmailRequestOut(verification).data
         return Response(response_data, status=status.HTTP_201_CREATED)
 
 
 @api_view(["POST"])
-def handle_verify_request(request):
+async def handle_verify_request(request):
     request_data = VerifyEmailIn(data=request.data)
 
     if request_data.is_valid(raise_exception=True):
-        verification = request_data.save()
+        verification = await request_data.asave()
         response_data = VerifyEmailOut(
             {
                 "ok": True if verification.verified_token else False,
@@ -0,0 +1,300 @@
+import base64
+import itertools
+import math
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.base.functions.metrics import Collected
+from secret.exceptions import AttachmentTooLargeError
+from secret.partitions import PARTITION_INTERVALS, partition_bounds
+
+_stats = {"stored": 0, "burned": 0, "purged": 0}
+_stats_lock = threading.Lock()
+
+
+def _record(outcome: str, count: int = 1):
+    with _stats_lock:
+        _stats[outcome] += count
+
+
+def attachment_stats() -> dict:
+    """
+    Returns how many attachments were stored, burned by being downloaded, and purged once expired, since the
+    process started.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+Collected(
+    "secretburner_attachments_total",
+    "Attachments stored, burned by being downloaded and purged once expired.",
+    attachment_stats,
+    type="counter",
+    label="outcome",
+)
+
+
+class AttachmentStore(ABC):
+    """
+    Where the files attached to secrets are kept, in chunks, until the secret is burned or expires. A store must
+    implement every abstract method before it can be created.
+
+    Attachments are addressed by their secret's id and burn_at, so expired ones can be found and deleted without
+    the database, e.g. when pg_cron purges the secrets themselves. None of the methods hold a whole file in
+    memory, and they all block, so async callers run them in a thread.
+    """
+
+    @abstractmethod
+    def write(self, secret_id, burn_at: int, stream, chunk_size: int, max_bytes: int):
+        """
+        Stores what's read from `stream`, `chunk_size` bytes at a time. Nothing is stored if reading or writing
+        fails part way.
+
+        Parameters:
+            secret_id (UUID): The secret the file is attached to.
+            burn_at (int): The secret's burn_at.
+            stream (file-like): The file, e.g. the body of the request.
+            chunk_size (int): The most bytes read and written at a time.
+            max_bytes (int): The largest file accepted.
+
+        Returns:
+            int: The file's size in bytes.
+
+        Raises:
+            AttachmentTooLargeError: The file is larger than `max_bytes`.
+        """
+
+    @abstractmethod
+    def open(self, secret_id, burn_at: int):
+        """
+        Burns the attachment and returns its chunks, in order, as an iterable of binary files. Each is only
+        opened when it is reached and is deleted as it is, so a download holds one file open at a time. Returns
+        None if there is no such attachment.
+        """
+
+    @abstractmethod
+    def delete(self, secret_id, burn_at: int):
+        """
+        Deletes the attachment, if there is one.
+        """
+
+    @abstractmethod
+    def purge_expired(self) -> tuple:
+        """
+        Deletes the attachments of expired secrets.
+
+        Returns:
+            tuple: The number of attachments deleted and their size in bytes.
+        """
+
+
+class FileSystemAttachmentStore(AttachmentStore):
+    """
+    Keeps each attachment as a directory of numbered chunk files, at `<location>/<hour>/<burn_at>_<secret_id>/`,
+    where hour is the start of the UTC hour the secret burns in (see `secret.partitions`). A purge only looks in
+    the hours that have started, and deletes the hours that have passed as a whole.
+
+    An attachment is written to a `.partial` directory that is renamed once complete, so a reader never sees
+    part of one. It is burned by renaming it into `<location>/.burning/`, where only the download that burned
+    it reads and deletes it.
+    """
+
+    # a download still reading a burned attachment after this long has been abandoned.
+    BURNING_MAX_SECONDS = 86400
+
+    def __init__(self, location: str):
+        self.location = location
+
+    def bucket(self, burn_at: int) -> str:
+        return os.path.join(self.location, str(partition_bounds(burn_at, "hour")[0]))
+
+    def path(self, secret_id, burn_at: int) -> str:
+        return os.path.join(self.bucket(burn_at), f"{burn_at}_{secret_id}")
+
+    def write(self, secret_id, burn_at: int, stream, chunk_size: int, max_bytes: int):
+        path = self.path(secret_id, burn_at)
+        partial = f"{path}.partial"
+        os.makedirs(partial, mode=0o700)
+        size = 0
+
+        try:
+            for index in itertools.count():
+                chunk = stream.read(chunk_size) if stream else b""
+
+                if not chunk:
+                    break
+
+                size += len(chunk)
+
+                if size > max_bytes:
+                    raise AttachmentTooLargeError(max_bytes)
+
+                # readable only by this user, like the database's own files.
+                descriptor = os.open(
+                    os.path.join(partial, f"{index:08d}"),
+                    os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                    0o600,
+                )
+                with os.fdopen(descriptor, "wb") as chunk_file:
+                    chunk_file.write(chunk)
+
+            os.rename(partial, path)
+
+        except BaseException:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+
+        _record("stored")
+        return size
+
+    def burning(self) -> str:
+        return os.path.join(self.location, ".burning")
+
+    def open(self, secret_id, burn_at: int):
+        os.makedirs(self.burning(), mode=0o700, exist_ok=True)
+        # named for when it was burned, see purge_expired.
+        burning = os.path.join(
+            self.burning(), f"{math.floor(timezone.now().timestamp())}_{secret_id}"
+        )
+
+        try:
+            # only one of several downloads racing for the attachment can move it.
+            os.rename(self.path(secret_id, burn_at), burning)
+        except FileNotFoundError:
+            return None
+
+        _record("burned")
+        return self._iter_chunks(burning, sorted(os.listdir(burning)))
+
+    @staticmethod
+    def _iter_chunks(path: str, names: list):
+        try:
+            for name in names:
+                chunk_path = os.path.join(path, name)
+
+                with open(chunk_path, "rb") as chunk_file:
+                    # still readable once deleted.
+                    os.unlink(chunk_path)
+                    yield chunk_file
+
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def delete(self, secret_id, burn_at: int):
+        shutil.rmtree(self.path(secret_id, burn_at), ignore_errors=True)
+
+    def purge_expired(self) -> tuple:
+        # expired like the rows `live()` leaves out.
+        now = math.ceil(timezone.now().timestamp())
+        count, size = 0, 0
+
+        try:
+            buckets = os.listdir(self.location)
+        except FileNotFoundError:
+            return count, size
+
+        # burned attachments whose download was abandoned, e.g. when the process serving it was stopped.
+        for path, _ in self._expired(self.burning(), now - self.BURNING_MAX_SECONDS):
+            shutil.rmtree(path, ignore_errors=True)
+
+        for bucket in buckets:
+            if not bucket.isdigit() or int(bucket) >= now:
+                continue
+
+            bucket_path = os.path.join(self.location, bucket)
+
+            # partial attachments too, e.g. when the process writing one was stopped.
+            for path, path_size in self._expired(bucket_path, now):
+                size += path_size
+                shutil.rmtree(path, ignore_errors=True)
+                count += 1
+
+            if int(bucket) + PARTITION_INTERVALS["hour"] <= now:
+                try:
+                    os.rmdir(bucket_path)
+                except OSError:
+                    # still being written to, or already gone.
+                    pass
+
+        _record("purged", count)
+        return count, size
+
+    @staticmethod
+    def _expired(directory: str, before: int):
+        """
+        Returns the path and size of each attachment directory in `directory` named for a time before `before`.
+        Anything else, e.g. a stray file, is left alone.
+        """
+        try:
+            entries = list(os.scandir(directory))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        for entry in entries:
+            stamp = entry.name.split("_", 1)[0]
+
+            if not stamp.isdigit() or int(stamp) >= before or not entry.is_dir():
+                continue
+
+            try:
+                size = sum(chunk.stat().st_size for chunk in os.scandir(entry.path))
+            except FileNotFoundError:
+                # purged or burned in the meantime.
+                continue
+
+            yield entry.path, size
+
+
+def get_attachment_store():
+    """
+    Returns the SECRET_ATTACHMENT_STORE at SECRET_ATTACHMENT_LOCATION, or None when attachments are turned off.
+    """
+    if not settings.SECRET_ATTACHMENT_LOCATION:
+        return None
+
+    return import_string(settings.SECRET_ATTACHMENT_STORE)(
+        settings.SECRET_ATTACHMENT_LOCATION
+    )
+
+
+def iter_attachment(files, block_size: int):
+    """
+    Returns the contents of the chunk files from `AttachmentStore.open`, `block_size` bytes at a time, closing
+    each file once it has been read. The reads block, see `stream_response`.
+    """
+    try:
+        for chunk_file in files:
+            with chunk_file:
+                while block := chunk_file.read(block_size):
+                    yield block
+
+    finally:
+        # deletes what's left when the download stops part way.
+        if hasattr(files, "close"):
+            files.close()
+
+
+def iter_base64(blocks):
+    """
+    Returns `blocks` of bytes base64 encoded a piece at a time, in pieces that join into the base64 of the whole.
+    """
+    remainder = b""
+
+    for block in blocks:
+        block = remainder + block
+        # whole groups of 3 bytes, the rest is carried over to the next block.
+        cut = len(block) - len(block) % 3
+        remainder = block[cut:]
+
+        if cut:
+            yield base64.b64encode(block[:cut]).decode("ascii")
+
+    if remainder:
+        yield base64.b64encode(remainder).decode("ascii")
@@ -1,2 +1,8 @@
 class EmailVerificationError(Exception):
     pass
+
+
+class AttachmentTooLargeError(Exception):
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"Ensure the attachment has no more than {max_bytes} bytes.")
@@ -1,33 +1,220 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
-from django.contrib.auth.hashers import check_password
-from .models import Verification
+from django.utils.crypto import constant_time_compare, salted_hmac
+from core.base.functions.crypto import token_digest
+from core.base.functions.hashing import acheck_password, amake_password
+from core.base.functions.metrics import Collected, cached_collect
+from .attachments import get_attachment_store
+from .models import Secret, Verification
+from .partitions import maintain_partitions
 from .exceptions import EmailVerificationError
 
+HMAC_EMAIL_BINDING_PREFIX = "hmac_sha256$"
+
+logger = logging.getLogger(__name__)
+
 
 def burn_now(burn_at: int):
     return burn_at < timezone.now().timestamp()
 
 
-def check_verification(verified_token: str, sender_email: str, recipient_email: str):
-    verification = Verification.objects.filter(verified_token=verified_token).first()
+def hmac_email_binding(email: str) -> str:
+    """
+    Binds an email address to a verification with an HMAC keyed from `SECRET_KEY`.
+
+    The verification only needs to prove that a token was issued for a given pair of addresses, so a keyed
+    digest is enough and, unlike Argon2, costs next to nothing to create and check.
+
+    Parameters:
+        email (str): The email address to bind.
+
+    Returns:
+        str: The prefixed hex digest to store on the verification.
+    """
+    digest = salted_hmac(
+        "secret.Verification.email_binding", email, algorithm="sha256"
+    ).hexdigest()
+    return f"{HMAC_EMAIL_BINDING_PREFIX}{digest}"
+
+
+async def abind_email(email: str) -> str:
+    if settings.EMAIL_BINDING_MODE == "argon2":
+        return await amake_password(email)
+
+    return hmac_email_binding(email)
+
+
+async def acheck_email_binding(email: str, binding: str) -> bool:
+    if binding.startswith(HMAC_EMAIL_BINDING_PREFIX):
+        return constant_time_compare(hmac_email_binding(email), binding)
+
+    # Verifications created before the switch to HMAC (or in "argon2" mode) hold a password hash. These are
+    # only valid for EMAIL_VERIFICATION_EXPIRY_SECONDS so this path is short-lived after an upgrade.
+    return await acheck_password(email, binding)
+
+
+async def acheck_verification(
+    verified_token: str, sender_email: str, recipient_email: str
+):
+    # a missing token must not match the verifications that haven't been verified yet.
+    if not verified_token:
+        raise EmailVerificationError("email verification failed")
+
+    verifications = Verification.objects.live().filter(
+        verified_token_digest=token_digest(verified_token)
+    )
+
+    # HMAC bindings can be matched inside the DELETE, so the token is checked and used up in one statement.
+    if await verifications.filter(
+        sender_email_hash=hmac_email_binding(sender_email),
+        recipient_email_hash=hmac_email_binding(recipient_email),
+    ).aconsume():
+        return True
+
+    # Otherwise this is either the wrong pair of addresses, or a verification bound with Argon2.
+    verification = await verifications.aone()
 
     # make sure this token is valid.
     if not verification:
         raise EmailVerificationError("email verification failed")
 
     # ensure the email is only sent to the correct recipient and from the verified sender.
-    if not check_password(sender_email, verification.sender_email_hash):
+    if not await acheck_email_binding(sender_email, verification.sender_email_hash):
         raise EmailVerificationError("email verification failed")
 
-    if not check_password(recipient_email, verification.recipient_email_hash):
+    if not await acheck_email_binding(
+        recipient_email, verification.recipient_email_hash
+    ):
         raise EmailVerificationError("email verification failed")
 
-    # Get rid of this now. It's used.
-    verification.delete()
+    # Get rid of this now. It's used. If somebody else got to it first, it's not ours to use.
+    if not await verifications.filter(pk=verification.pk).aconsume():
+        raise EmailVerificationError("email verification failed")
 
     return True
 
 
+def purge_expired(chunk_size: int = None):
+    """
+    Deletes expired secrets and verifications, and the attachments of expired secrets. Used when pg_cron is not
+    available to do it in the database, and for attachments, which pg_cron can't delete.
+
+    Partitioned tables (see secret.partitions) first have their expired partitions dropped and upcoming ones
+    created, then any expired rows left in the current or default partition are deleted as usual.
+
+    Parameters:
+        chunk_size (int, optional): Rows deleted per statement. Defaults to `EXPIRY_PURGE_CHUNK_SIZE`.
+
+    Returns:
+        dict: The number of rows and bytes freed, keyed by model name, with the attachments deleted as
+              "Attachment" rows. Partitioned tables also report the number of `partitions` created and dropped.
+    """
+    chunk_size = chunk_size or settings.EXPIRY_PURGE_CHUNK_SIZE
+    result = {}
+
+    for model in [Secret, Verification]:
+        try:
+            partitions = maintain_partitions(model)
+        except Exception as e:
+            # the expired rows are still deleted one by one below.
+            logger.error("Failed to maintain %s partitions: %s", model.__name__, e)
+            partitions = {"created": 0, "dropped": 0, "bytes": 0}
+
+        rows, size = model.objects.purge_expired(chunk_size)
+        result[model.__name__] = {"rows": rows, "bytes": size + partitions["bytes"]}
+
+        if partitions["created"] or partitions["dropped"]:
+            result[model.__name__]["partitions"] = {
+                "created": partitions["created"],
+                "dropped": partitions["dropped"],
+            }
+
+    # attachments expire with their secrets, whether or not this process purged the secrets.
+    attachment_store = get_attachment_store()
+
+    if attachment_store:
+        count, size = attachment_store.purge_expired()
+        result["Attachment"] = {"rows": count, "bytes": size}
+
+    return result
+
+
+def start_expiry_scheduler(interval: int = None):
+    """
+    Starts a daemon thread that runs `purge_expired` every `interval` seconds in the current process.
+
+    Parameters:
+        interval (int, optional): Seconds between runs. Defaults to `EXPIRY_PURGE_INTERVAL_SECONDS`.
+
+    Returns:
+        threading.Thread: The scheduler thread.
+    """
+    interval = interval or settings.EXPIRY_PURGE_INTERVAL_SECONDS
+
+    def run():
+        while True:
+            try:
+                result = purge_expired()
+
+                if any(
+                    purged["rows"] or "partitions" in purged
+                    for purged in result.values()
+                ):
+                    logger.info("Purged expired rows: %s", result)
+
+            except Exception as e:
+                logger.error("Failed to purge expired rows: %s", e)
+
+            finally:
+                close_old_connections()
+
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="expiry-scheduler", daemon=True)
+    thread.start()
+
+    return thread
+
+
+def live_counts() -> dict:
+    """
+    Returns the number of live secrets in Postgres, in one query: plain `secret`s, `request`s (including their
+    fulfilments) and secrets with an `attachment`, which are also counted as secrets or requests, and the
+    `attachment_bytes` those attachments hold. Secrets kept in the hot store aren't counted.
+    """
+    return Secret.objects.live().aggregate(
+        secret=Count("secret_id", filter=Q(request_id__isnull=True)),
+        request=Count("secret_id", filter=Q(request_id__isnull=False)),
+        attachment=Count("secret_id", filter=Q(attachment_size__isnull=False)),
+        attachment_bytes=Sum("attachment_size", default=0),
+    )
+
+
+# one query for both metrics.
+_live_counts = cached_collect(live_counts, settings.METRICS_LIVE_SECONDS)
+
+Collected(
+    "secretburner_live_secrets",
+    "Secrets in Postgres that haven't been burned or expired, by kind.",
+    lambda: {
+        kind: count
+        for kind, count in _live_counts().items()
+        if kind != "attachment_bytes"
+    },
+    label="kind",
+)
+Collected(
+    "secretburner_live_attachment_bytes",
+    "Bytes held by the attachments of live secrets.",
+    lambda: _live_counts()["attachment_bytes"],
+)
+
+
 def pop_if_in(obj, key):
     if key in obj:
         return obj.pop(key)
@@ -0,0 +1,79 @@
+import secrets
+import time
+
+from django.core.management.base import BaseCommand
+
+from secret.models import Secret
+
+
+def time_per_call(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the /api/secret/check/ lookup loading the whole row with the lookup it makes now, which "
+        "leaves out the secret's text, with large secrets stored."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=512000,
+            help="Characters of secret text in each secret.",
+        )
+        parser.add_argument(
+            "--secrets",
+            type=int,
+            default=20,
+            help="Large secrets stored and looked up in turn.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=200,
+            help="Lookups made each way.",
+        )
+
+    def handle(self, *args, **options):
+        # random text, which compresses about as well as a real key or certificate bundle does.
+        stored = [
+            Secret(
+                secret_text=secrets.token_urlsafe(options["size"])[: options["size"]],
+                expiry_seconds=3600,
+            )
+            for _ in range(options["secrets"])
+        ]
+        for secret in stored:
+            secret.prepare()
+
+        Secret.objects.bulk_create(stored)
+        secret_ids = [secret.secret_id for secret in stored]
+        lookups = iter(secret_ids * (options["iterations"] + 1))
+
+        def check(queryset):
+            # the lookup /api/secret/check/ makes, see PostgresSecretStore.aget.
+            return queryset.live().filter(secret_id=next(lookups)).one().passphrase_hash
+
+        cases = [
+            ("whole row", lambda: check(Secret.objects.all())),
+            ("without payload", lambda: check(Secret.objects.without_payload())),
+        ]
+
+        try:
+            results = []
+            for name, lookup in cases:
+                seconds = time_per_call(lookup, options["iterations"])
+                results.append(seconds)
+                self.stdout.write(f"{name}: {seconds * 1000:.3f} ms per check")
+        finally:
+            Secret.objects.filter(secret_id__in=secret_ids).delete()
+
+        self.stdout.write(
+            f"{options['secrets']} secrets of {options['size']} characters, {options['iterations']} iterations, "
+            f"without payload is {results[0] / results[1]:.1f}x faster"
+        )
@@ -0,0 +1,92 @@
+import secrets
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from core.base.api.renderers import CamelCaseORJSONRenderer, StreamedString
+from secret.api.secret import retrieve_flags, retrieve_response
+from secret.models import Secret
+
+
+def measure(fn, iterations: int) -> tuple[float, int]:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    seconds = (time.perf_counter() - started) / iterations
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the time and peak memory of rendering a large secret for /api/secret/retrieve/ as one body "
+        "with streaming it in chunks, for text stored compressed and uncompressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=512000,
+            help="Characters of secret text in the secret.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=20,
+            help="Responses rendered each way.",
+        )
+
+    def handle(self, *args, **options):
+        renderer = CamelCaseORJSONRenderer()
+
+        def rendered(secret):
+            return lambda: renderer.render(retrieve_response(secret))
+
+        def streamed(secret):
+            def stream():
+                # as stream_retrieve_response renders it.
+                data = {
+                    "secret_text": StreamedString(
+                        secret.iter_secret_text(settings.SECRET_STREAM_CHUNK_SIZE)
+                    ),
+                    **retrieve_flags(secret),
+                }
+                for _ in renderer.render_stream(data):
+                    pass
+
+            return stream
+
+        texts = [
+            ("ascii", secrets.token_urlsafe(options["size"])[: options["size"]]),
+            ("non-ascii", ("ünïcödé " * options["size"])[: options["size"]]),
+        ]
+
+        for text_name, text in texts:
+            for compression in ["none", "zlib"]:
+                with override_settings(SECRET_COMPRESSION=compression):
+                    secret = Secret(secret_text=text, expiry_seconds=3600)
+                    secret.prepare()
+
+                results = []
+                for name, fn in [
+                    ("rendered", rendered(secret)),
+                    ("streamed", streamed(secret)),
+                ]:
+                    seconds, peak = measure(fn, options["iterations"])
+                    results.append(peak)
+                    self.stdout.write(
+                        f"{text_name}, {compression}, {name}: {seconds * 1000:.3f} ms, "
+                        f"{peak / 1024:.0f} KiB peak"
+                    )
+
+                self.stdout.write(
+                    f"{text_name}, {compression}: streamed peak is {results[0] / results[1]:.1f}x lower"
+                )
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from secret.func import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Deletes expired secrets and verifications in chunks. Use this when pg_cron is not available."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.EXPIRY_PURGE_CHUNK_SIZE,
+            help="Maximum number of rows deleted per statement.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=None,
+            help="Keep running, purging every INTERVAL seconds.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                result = purge_expired(chunk_size=options["chunk_size"])
+
+                for model_name, purged in result.items():
+                    message = f"{model_name}: purged {purged['rows']} row(s), {purged['bytes']} bytes freed"
+
+                    if "partitions" in purged:
+                        message += (
+                            f", {purged['partitions']['dropped']} partition(s) dropped"
+                            f", {purged['partitions']['created']} created"
+                        )
+
+                    self.stdout.write(message)
+
+                if not options["interval"]:
+                    break
+
+                time.sleep(options["interval"])
+
+        except KeyboardInterrupt:
+            pass
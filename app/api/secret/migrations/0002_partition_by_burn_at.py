@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import migrations
+
+from secret.partitions import partition_table, unpartition_table
+
+
+def partition_tables(apps, schema_editor):
+    # partitioning is opt in, the plain tables from 0001_initial are kept otherwise.
+    if not settings.PARTITION_EXPIRING_TABLES:
+        return
+
+    for model_name in ["Secret", "Verification"]:
+        partition_table(
+            apps.get_model("secret", model_name),
+            using=schema_editor.connection.alias,
+        )
+
+
+def unpartition_tables(apps, schema_editor):
+    for model_name in ["Secret", "Verification"]:
+        unpartition_table(
+            apps.get_model("secret", model_name),
+            using=schema_editor.connection.alias,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("secret", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("secret", "0002_partition_by_burn_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="secret",
+            name="secret_blob",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name="secret",
+            name="secret_codec",
+            field=models.TextField(null=True),
+        ),
+    ]
@@ -0,0 +1,68 @@
+import core.base.functions.ids
+from django.db import migrations, models
+
+from secret.uuid_keys import convert_to_text, convert_to_uuid
+
+INDEXED = {
+    "Secret": ["request_id", "fulfilment_id"],
+    "Verification": [],
+}
+
+
+def to_uuid(apps, schema_editor):
+    for model_name, indexed in INDEXED.items():
+        convert_to_uuid(
+            schema_editor, apps.get_model("secret", model_name), indexed=indexed
+        )
+
+
+def to_text(apps, schema_editor):
+    for model_name, indexed in INDEXED.items():
+        convert_to_text(
+            schema_editor, apps.get_model("secret", model_name), indexed=indexed
+        )
+
+
+class Migration(migrations.Migration):
+    # the columns are converted online in several transactions, see secret.uuid_keys.
+    atomic = False
+
+    dependencies = [
+        ("secret", "0003_secret_compression"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(to_uuid, to_text)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="secret",
+                    name="secret_id",
+                    field=models.UUIDField(
+                        default=core.base.functions.ids.uuid7,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="secret",
+                    name="request_id",
+                    field=models.UUIDField(db_index=True, null=True),
+                ),
+                migrations.AlterField(
+                    model_name="secret",
+                    name="fulfilment_id",
+                    field=models.UUIDField(db_index=True, null=True),
+                ),
+                migrations.AlterField(
+                    model_name="verification",
+                    name="verify_id",
+                    field=models.UUIDField(
+                        default=core.base.functions.ids.uuid7,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+            ],
+        ),
+    ]
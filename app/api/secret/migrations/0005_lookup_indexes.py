@@ -0,0 +1,177 @@
+from django.db import migrations, models
+
+from secret.partitions import is_partitioned
+
+# the partial unique indexes that replace the full indexes on these mostly NULL columns.
+UNIQUE_LOOKUPS = [
+    ("Secret", "request_id", "secret_request_id_unique"),
+    ("Secret", "fulfilment_id", "secret_fulfilment_id_unique"),
+    ("Verification", "verified_token_digest", "verification_token_digest_unique"),
+]
+
+# the indexes (and their "_like" indexes for text columns) that are dropped. Verification.code is only ever
+# compared after looking the verification up by verify_id.
+DROPPED_INDEXES = [
+    ("Secret", "request_id", False),
+    ("Secret", "fulfilment_id", False),
+    ("Verification", "verified_token", True),
+    ("Verification", "code", True),
+]
+
+
+def index_names(schema_editor, model, column, text):
+    table = model._meta.db_table
+    names = [schema_editor._create_index_name(table, [column], suffix="")]
+    if text:
+        names.append(schema_editor._create_index_name(table, [column], suffix="_like"))
+    return names
+
+
+def execute(schema_editor, model, sql):
+    # indexes on partitioned tables can't be built or dropped concurrently, so there they are built and dropped
+    # with plain statements, which block writes to the table while they run. The migration still isn't atomic.
+    if is_partitioned(model, schema_editor.connection.alias):
+        sql = sql.replace(" CONCURRENTLY", "")
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+def forwards(apps, schema_editor):
+    qn = schema_editor.connection.ops.quote_name
+    Verification = apps.get_model("secret", "Verification")
+    table = qn(Verification._meta.db_table)
+
+    # verified tokens are now looked up by digest, see core.base.functions.crypto.token_digest.
+    execute(
+        schema_editor,
+        Verification,
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS verified_token_digest bytea",
+    )
+    execute(
+        schema_editor,
+        Verification,
+        f"""
+        UPDATE {table} SET verified_token_digest = sha256(convert_to(verified_token, 'UTF8'))
+        WHERE verified_token IS NOT NULL AND verified_token_digest IS NULL
+        """,
+    )
+
+    for model_name, column, name in UNIQUE_LOOKUPS:
+        model = apps.get_model("secret", model_name)
+        columns = qn(column)
+        if is_partitioned(model, schema_editor.connection.alias):
+            columns += ", burn_at"
+
+        execute(
+            schema_editor,
+            model,
+            f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {qn(name)} "
+            f"ON {qn(model._meta.db_table)} ({columns}) WHERE {qn(column)} IS NOT NULL",
+        )
+
+    for model_name, column, text in DROPPED_INDEXES:
+        model = apps.get_model("secret", model_name)
+        for name in index_names(schema_editor, model, column, text):
+            execute(
+                schema_editor, model, f"DROP INDEX CONCURRENTLY IF EXISTS {qn(name)}"
+            )
+
+
+def backwards(apps, schema_editor):
+    qn = schema_editor.connection.ops.quote_name
+
+    for model_name, column, text in DROPPED_INDEXES:
+        model = apps.get_model("secret", model_name)
+        table = qn(model._meta.db_table)
+        index, *like = index_names(schema_editor, model, column, text)
+
+        execute(
+            schema_editor,
+            model,
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {qn(index)} ON {table} ({qn(column)})",
+        )
+        for name in like:
+            execute(
+                schema_editor,
+                model,
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {qn(name)} "
+                f"ON {table} ({qn(column)} text_pattern_ops)",
+            )
+
+    for model_name, _, name in UNIQUE_LOOKUPS:
+        model = apps.get_model("secret", model_name)
+        execute(schema_editor, model, f"DROP INDEX CONCURRENTLY IF EXISTS {qn(name)}")
+
+    Verification = apps.get_model("secret", "Verification")
+    execute(
+        schema_editor,
+        Verification,
+        f"ALTER TABLE {qn(Verification._meta.db_table)} DROP COLUMN verified_token_digest",
+    )
+
+
+class Migration(migrations.Migration):
+    # indexes are built and dropped concurrently, which can't be done in a transaction.
+    atomic = False
+
+    dependencies = [
+        ("secret", "0004_uuid_keys"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(forwards, backwards)],
+            state_operations=[
+                migrations.AddField(
+                    model_name="verification",
+                    name="verified_token_digest",
+                    field=models.BinaryField(null=True),
+                ),
+                migrations.AlterField(
+                    model_name="secret",
+                    name="request_id",
+                    field=models.UUIDField(null=True),
+                ),
+                migrations.AlterField(
+                    model_name="secret",
+                    name="fulfilment_id",
+                    field=models.UUIDField(null=True),
+                ),
+                migrations.AlterField(
+                    model_name="verification",
+                    name="verified_token",
+                    field=models.TextField(null=True),
+                ),
+                migrations.AlterField(
+                    model_name="verification",
+                    name="code",
+                    field=models.TextField(max_length=20),
+                ),
+                migrations.AddConstraint(
+                    model_name="secret",
+                    constraint=models.UniqueConstraint(
+                        condition=models.Q(("request_id__isnull", False)),
+                        fields=("request_id",),
+                        name="secret_request_id_unique",
+                    ),
+                ),
+                migrations.AddConstraint(
+                    model_name="secret",
+                    constraint=models.UniqueConstraint(
+                        condition=models.Q(("fulfilment_id__isnull", False)),
+                        fields=("fulfilment_id",),
+                        name="secret_fulfilment_id_unique",
+                    ),
+                ),
+                migrations.AddConstraint(
+                    model_name="verification",
+                    constraint=models.UniqueConstraint(
+                        condition=models.Q(("verified_token_digest__isnull", False)),
+                        fields=("verified_token_digest",),
+                        name="verification_token_digest_unique",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # verified tokens are only kept as the digest added in 0005_lookup_indexes.
+
+    dependencies = [
+        ("secret", "0005_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="verification",
+            name="verified_token",
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("secret", "0006_remove_verification_verified_token"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="secret",
+            name="attachment_name",
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name="secret",
+            name="attachment_size",
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
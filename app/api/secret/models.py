@@ -1,7 +1,16 @@
-from uuid import uuid4
-from django.db import models
+import base64
+
+from django.db import connections, models, router
 from django.utils import timezone
 from django.conf import settings
+from core.base.functions.compression import (
+    compress_text,
+    decompress_text,
+    iter_decompress_text,
+)
+from core.base.functions.crypto import token_digest
+from core.base.functions.ids import uuid7
+from core.base.models import ConsumeOnceQuerySet, LookupQuerySet, ReplicaQuerySet
 import math
 
 
@@ -11,33 +20,241 @@ def set_burn_at(seconds: int):
     )
 
 
+class BurnableQuerySet(ConsumeOnceQuerySet, ReplicaQuerySet, LookupQuerySet):
+    def live(self):
+        """
+        Excludes rows whose burn_at has passed, so that expired rows are never loaded.
+        """
+        return self.filter(burn_at__gte=math.ceil(timezone.now().timestamp()))
+
+    def purge_expired_chunk(self, chunk_size: int):
+        """
+        Deletes up to `chunk_size` expired rows, oldest first.
+
+        Rows are picked through the burn_at index with `FOR UPDATE SKIP LOCKED`, so several processes can purge
+        the same table at once without waiting on each other or on a request that is consuming a row.
+
+        Parameters:
+            chunk_size (int): The most rows to delete in this statement.
+
+        Returns:
+            tuple: The number of rows deleted and their size in bytes.
+        """
+        connection = connections[
+            self._db or router.db_for_write(self.model, **self._hints)
+        ]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        pk = connection.ops.quote_name(self.model._meta.pk.column)
+
+        sql = f"""
+            WITH deleted AS (
+                DELETE FROM {table}
+                WHERE {pk} IN (
+                    SELECT {pk} FROM {table}
+                    WHERE burn_at < %s
+                    ORDER BY burn_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING pg_column_size({table}.*) AS size
+            )
+            SELECT COUNT(*), COALESCE(SUM(size), 0) FROM deleted
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [math.ceil(timezone.now().timestamp()), chunk_size])
+            rows, size = cursor.fetchone()
+
+        return rows, int(size)
+
+    def purge_expired(self, chunk_size: int):
+        """
+        Deletes every expired row in chunks of `chunk_size`, each in its own short transaction.
+
+        Returns:
+            tuple: The number of rows deleted and their size in bytes.
+        """
+        total_rows, total_size = 0, 0
+
+        while True:
+            rows, size = self.purge_expired_chunk(chunk_size)
+            total_rows += rows
+            total_size += size
+
+            if rows < chunk_size:
+                return total_rows, total_size
+
+
+class SecretQuerySet(BurnableQuerySet):
+    def without_payload(self):
+        """
+        Defers the secret's text, which can be up to 512 KB, so that reads that only need the metadata don't fetch
+        and detoast it. Only the consume-once read of /api/secret/retrieve/ needs the text.
+        """
+        return self.defer(*Secret.PAYLOAD_FIELDS)
+
+
 class Secret(models.Model):
-    secret_id = models.TextField(primary_key=True, default=uuid4)
+    secret_id = models.UUIDField(primary_key=True, default=uuid7)
     secret_text = models.TextField(null=True)
+    # large secrets are stored compressed here instead of in secret_text, and binary ones as they were sent, see
+    # get_secret_text().
+    secret_codec = models.TextField(null=True)
+    secret_blob = models.BinaryField(null=True)
     expiry_seconds = models.IntegerField(default=3600)
     burn_at = models.BigIntegerField(db_index=True)
     passphrase_hash = models.TextField(null=True)
     public_key = models.TextField(null=True)
-    request_id = models.TextField(null=True, db_index=True)
-    fulfilment_id = models.TextField(null=True, db_index=True)
+    # most secrets aren't requests, so these are indexed by partial unique indexes that leave out the NULLs.
+    request_id = models.UUIDField(null=True)
+    fulfilment_id = models.UUIDField(null=True)
+    # a file attached to the secret is kept in chunks outside the database, see secret.attachments.
+    attachment_name = models.TextField(null=True)
+    attachment_size = models.BigIntegerField(null=True)
+
+    objects = SecretQuerySet.as_manager()
+
+    # the columns holding the secret's text, see SecretQuerySet.without_payload().
+    PAYLOAD_FIELDS = ("secret_text", "secret_codec", "secret_blob")
+
+    # the secret_codec of a secret sent as raw bytes (application/octet-stream), kept in secret_blob as it is.
+    BINARY_CODEC = "binary"
+
+    # read-only lookups by these go to the primary for a while after the secret is saved.
+    replica_sticky_fields = ("secret_id", "fulfilment_id")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["request_id"],
+                condition=models.Q(request_id__isnull=False),
+                name="secret_request_id_unique",
+            ),
+            models.UniqueConstraint(
+                fields=["fulfilment_id"],
+                condition=models.Q(fulfilment_id__isnull=False),
+                name="secret_fulfilment_id_unique",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
+        self.prepare()
+        super().save(*args, **kwargs)
+
+    def prepare(self):
+        """
+        Sets burn_at from expiry_seconds if it isn't set, and moves large text into secret_blob compressed. Called
+        before the secret is stored, in Postgres or elsewhere (see `secret.storage`).
+        """
         if not self.burn_at:
             self.burn_at = set_burn_at(seconds=int(self.expiry_seconds))
-        super().save(*args, **kwargs)
+
+        # a secret loaded without its payload keeps the text it has.
+        if "secret_text" in self.get_deferred_fields():
+            return
+
+        if self.secret_text is not None:
+            codec, compressed = compress_text(
+                self.secret_text,
+                codec=settings.SECRET_COMPRESSION,
+                threshold=settings.SECRET_COMPRESSION_THRESHOLD,
+            )
+
+            if codec:
+                self.secret_text = None
+                self.secret_codec = codec
+                self.secret_blob = compressed
+
+    def get_secret_text(self):
+        """
+        Returns the secret's text, decompressing it if it was stored compressed. Rows without a codec hold plain
+        text in secret_text. A secret sent as raw bytes is returned base64 encoded, as a JSON client would have
+        sent it.
+        """
+        if self.secret_codec == self.BINARY_CODEC:
+            return base64.b64encode(self.secret_blob).decode("ascii")
+
+        if self.secret_codec:
+            return decompress_text(self.secret_codec, self.secret_blob)
+
+        return self.secret_text
+
+    def iter_secret_text(self, chunk_size: int):
+        """
+        Returns the secret's text in pieces of about `chunk_size` characters, like `get_secret_text()` but without
+        decompressing or copying the whole text at once.
+        """
+        if self.secret_codec == self.BINARY_CODEC:
+            # whole groups of 3 bytes, so the pieces join into the same base64 as get_secret_text().
+            data = memoryview(self.secret_blob)
+            step = max(chunk_size // 4, 1) * 3
+            return (
+                base64.b64encode(data[offset : offset + step]).decode("ascii")
+                for offset in range(0, len(data), step)
+            )
+
+        if self.secret_codec:
+            return iter_decompress_text(self.secret_codec, self.secret_blob, chunk_size)
+
+        text = self.secret_text or ""
+        return (
+            text[offset : offset + chunk_size]
+            for offset in range(0, len(text), chunk_size)
+        )
+
+    def get_secret_bytes(self) -> bytes:
+        """
+        Returns the secret as bytes: a secret sent as raw bytes as it was sent, and text encoded as UTF-8.
+        """
+        if self.secret_codec == self.BINARY_CODEC:
+            return bytes(self.secret_blob)
+
+        return self.get_secret_text().encode("utf-8")
+
+    def payload_size(self) -> int:
+        """
+        Returns the size of the secret's text as stored, compressed or not.
+        """
+        if self.secret_codec:
+            return len(self.secret_blob)
+
+        return len(self.secret_text or "")
 
 
 class Verification(models.Model):
-    verify_id = models.TextField(primary_key=True, default=uuid4)
+    verify_id = models.UUIDField(primary_key=True, default=uuid7)
     burn_at = models.BigIntegerField(db_index=True)
-    code = models.TextField(max_length=20, db_index=True)
-    verified_token = models.TextField(null=True, db_index=True)
+    code = models.TextField(max_length=20)
+    # only the token's digest is stored, see set_verified_token().
+    verified_token_digest = models.BinaryField(null=True)
     sender_email_hash = models.TextField(null=False)
     recipient_email_hash = models.TextField(null=False)
 
+    objects = BurnableQuerySet.as_manager()
+
+    # the token given to set_verified_token(), which is not saved.
+    verified_token = None
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["verified_token_digest"],
+                condition=models.Q(verified_token_digest__isnull=False),
+                name="verification_token_digest_unique",
+            ),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.burn_at:
             self.burn_at = set_burn_at(
                 seconds=settings.EMAIL_VERIFICATION_EXPIRY_SECONDS
             )
         super().save(*args, **kwargs)
+
+    def set_verified_token(self, token: str):
+        """
+        Marks the verification as verified by `token`. Only the token's digest is saved, and the token itself is
+        kept on this instance as `verified_token` so it can be given to the sender.
+        """
+        self.verified_token = token
+        self.verified_token_digest = token_digest(token)
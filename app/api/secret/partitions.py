@@ -0,0 +1,333 @@
+import math
+import re
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+PARTITION_INTERVALS = {"hour": 3600, "day": 86400}
+
+_BOUND_PATTERN = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+_UNIQUE_COLUMNS_PATTERN = re.compile(
+    r"^(CREATE UNIQUE INDEX .+? USING \w+ \()([^)]*)\)"
+)
+
+
+def partition_bounds(timestamp: int, interval: str) -> tuple:
+    """
+    Returns the [start, end) range, in epoch seconds, of the partition that holds `timestamp`.
+
+    Ranges are aligned to UTC hours or days so every process computes the same boundaries.
+    """
+    seconds = PARTITION_INTERVALS[interval]
+    start = timestamp - timestamp % seconds
+    return start, start + seconds
+
+
+def partition_name(table: str, start: int) -> str:
+    return f"{table}_p{datetime.fromtimestamp(start, tz=dt_timezone.utc):%Y%m%d%H}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def is_partitioned(model, using: str = "default") -> bool:
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+
+    return bool(row) and row[0] == "p"
+
+
+def list_partitions(model, using: str = "default") -> list:
+    """
+    Lists the range partitions of `model`'s table, oldest first. The default partition is not included.
+
+    Returns:
+        list: (name, start, end) tuples, with the bounds in epoch seconds.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [model._meta.db_table],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_PATTERN.search(bound)
+        if match:
+            partitions.append((name, int(match.group(1)), int(match.group(2))))
+
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _lock_partitions(cursor, table: str):
+    """
+    Takes a transaction level advisory lock on `table`'s partitions, so that processes listing and then creating
+    or dropping them (e.g. the expiry scheduler of every worker) take turns instead of racing each other.
+    """
+    cursor.execute(
+        "SELECT pg_advisory_xact_lock(hashtext(%s))", [f"partitions:{table}"]
+    )
+
+
+def _free_range(partitions: list, start: int, end: int) -> tuple:
+    """
+    Returns the last part of [start, end) that no existing partition covers, e.g. after `PARTITION_INTERVAL` was
+    changed and the partitions already made don't line up with the new ones. Earlier parts have mostly passed
+    already. The range is empty (start >= end) if it is covered completely.
+    """
+    free = (end, end)
+    cursor = start
+
+    for _, existing_start, existing_end in partitions:
+        if existing_end <= cursor or existing_start >= end:
+            continue
+
+        if existing_start > cursor:
+            free = (cursor, existing_start)
+
+        cursor = max(cursor, existing_end)
+
+    if cursor < end:
+        free = (cursor, end)
+
+    return free
+
+
+def _with_partition_key(definition: str, partitioned: bool) -> str:
+    # like the primary key, unique indexes on a partitioned table have to include burn_at.
+    match = _UNIQUE_COLUMNS_PATTERN.match(definition)
+    if not match:
+        return definition
+
+    columns = [c.strip() for c in match.group(2).split(",") if c.strip() != "burn_at"]
+    if partitioned:
+        columns.append("burn_at")
+
+    return f"{match.group(1)}{', '.join(columns)}){definition[match.end():]}"
+
+
+def _index_definitions(cursor, table: str, partitioned: bool) -> list:
+    """
+    Returns the CREATE INDEX statements for `table`'s indexes, changed to suit the table once it is (or is no
+    longer) `partitioned`.
+    """
+    # the primary key is rebuilt separately since a partitioned table's key has to include burn_at.
+    cursor.execute(
+        """
+        SELECT indexdef FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = %s
+        AND indexname NOT IN (
+            SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'
+        )
+        """,
+        [table, table],
+    )
+    return [
+        _with_partition_key(row[0].replace(" ON ONLY ", " ON "), partitioned)
+        for row in cursor.fetchall()
+    ]
+
+
+def create_partition(model, start: int, end: int, using: str = "default") -> str:
+    """
+    Creates the partition for [start, end) unless it already exists. Where existing partitions overlap the range,
+    e.g. ones made before `PARTITION_INTERVAL` changed, only the last part they leave free is created.
+
+    Any rows for that range that were parked in the default partition (because their burn_at was further ahead
+    than the partitions made so far) are moved into the new partition before it is attached.
+
+    Returns:
+        str: The partition name, or None if the range is already covered.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        _lock_partitions(cursor, table)
+        start, end = _free_range(list_partitions(model, using), start, end)
+
+        if start >= end:
+            return None
+
+        name = partition_name(table, start)
+
+        cursor.execute(
+            f"CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {qn(default_partition_name(table))}
+                WHERE burn_at >= %s AND burn_at < %s
+                RETURNING *
+            )
+            INSERT INTO {qn(name)} SELECT * FROM moved
+            """,
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+
+    return name
+
+
+def create_upcoming_partitions(
+    model, interval: str = None, ahead: int = None, using: str = "default"
+) -> list:
+    """
+    Makes sure the current partition and the next `ahead` ones exist, so that new rows never land in the
+    default partition.
+
+    Parameters:
+        model: Secret or Verification.
+        interval (str, optional): "hour" or "day". Defaults to `PARTITION_INTERVAL`.
+        ahead (int, optional): Partitions to create past the current one. Defaults to `PARTITION_PREMAKE`.
+
+    Returns:
+        list: The names of the partitions that were created.
+    """
+    interval = interval or settings.PARTITION_INTERVAL
+    ahead = settings.PARTITION_PREMAKE if ahead is None else ahead
+    seconds = PARTITION_INTERVALS[interval]
+
+    start, _ = partition_bounds(math.floor(timezone.now().timestamp()), interval)
+    created = []
+
+    for i in range(ahead + 1):
+        name = create_partition(
+            model, start + i * seconds, start + (i + 1) * seconds, using
+        )
+        if name:
+            created.append(name)
+
+    return created
+
+
+def drop_expired_partitions(model, using: str = "default") -> tuple:
+    """
+    Drops every partition whose range ends at or before now. Each one only holds expired rows, so removing it is
+    a catalog operation instead of a row by row delete.
+
+    Returns:
+        tuple: The number of partitions dropped and the bytes they used.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    now = math.ceil(timezone.now().timestamp())
+
+    dropped, size = 0, 0
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        _lock_partitions(cursor, table)
+
+        for name, _, end in list_partitions(model, using):
+            if end > now:
+                continue
+
+            cursor.execute("SELECT pg_total_relation_size(to_regclass(%s))", [name])
+            size += cursor.fetchone()[0]
+            cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+            cursor.execute(f"DROP TABLE {qn(name)}")
+            dropped += 1
+
+    return dropped, size
+
+
+def partition_table(model, interval: str = None, using: str = "default"):
+    """
+    Rebuilds `model`'s table as a table partitioned by range on burn_at and copies the existing rows over.
+
+    The primary key becomes (pk, burn_at) because Postgres requires the partition key in every unique constraint.
+    Primary keys are UUIDs so they stay unique in practice, and Django still addresses rows by pk alone.
+    Rows outside the partitions created here go to a default partition, which the expiry purge empties.
+    """
+    if is_partitioned(model, using):
+        return
+
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    staging = f"{table}_partitioned"
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        indexes = _index_definitions(cursor, table, partitioned=True)
+
+        cursor.execute(f"""
+            CREATE TABLE {qn(staging)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+            PARTITION BY RANGE (burn_at)
+            """)
+        cursor.execute(
+            f"CREATE TABLE {qn(default_partition_name(table))} PARTITION OF {qn(staging)} DEFAULT"
+        )
+        cursor.execute(f"INSERT INTO {qn(staging)} SELECT * FROM {qn(table)}")
+        cursor.execute(f"DROP TABLE {qn(table)}")
+        cursor.execute(f"ALTER TABLE {qn(staging)} RENAME TO {qn(table)}")
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ADD PRIMARY KEY ({qn(model._meta.pk.column)}, burn_at)"
+        )
+
+        for index in indexes:
+            cursor.execute(index)
+
+        create_upcoming_partitions(model, interval=interval, using=using)
+
+
+def unpartition_table(model, using: str = "default"):
+    """
+    Reverses `partition_table`, copying the rows back into a plain table keyed on pk alone.
+    """
+    if not is_partitioned(model, using):
+        return
+
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    staging = f"{table}_unpartitioned"
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        indexes = _index_definitions(cursor, table, partitioned=False)
+
+        cursor.execute(
+            f"CREATE TABLE {qn(staging)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(f"INSERT INTO {qn(staging)} SELECT * FROM {qn(table)}")
+        cursor.execute(f"DROP TABLE {qn(table)} CASCADE")
+        cursor.execute(f"ALTER TABLE {qn(staging)} RENAME TO {qn(table)}")
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ADD PRIMARY KEY ({qn(model._meta.pk.column)})"
+        )
+
+        for index in indexes:
+            cursor.execute(index)
+
+
+def maintain_partitions(model, using: str = "default") -> dict:
+    """
+    Drops expired partitions and creates the upcoming ones. Does nothing if the table is not partitioned.
+
+    Returns:
+        dict: The number of partitions `created` and `dropped`, and the `bytes` the dropped ones used.
+    """
+    if not is_partitioned(model, using):
+        return {"created": 0, "dropped": 0, "bytes": 0}
+
+    dropped, size = drop_expired_partitions(model, using)
+    created = create_upcoming_partitions(model, using=using)
+
+    return {"created": len(created), "dropped": dropped, "bytes": size}
@@ -0,0 +1,514 @@
+import base64
+import json
+import logging
+import math
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.base.functions.database import mark_written
+from core.base.functions.ids import uuid7
+from core.base.functions.metrics import Collected
+from secret.models import Secret
+
+logger = logging.getLogger(__name__)
+
+_stats = {"hot_created": 0, "primary_created": 0, "hot_errors": 0}
+_stats_lock = threading.Lock()
+
+
+def _record(outcome: str):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def store_stats() -> dict:
+    """
+    Returns how many secrets were created in the hot store (`hot_created`) and in Postgres (`primary_created`),
+    and how many hot store calls failed (`hot_errors`), since the process started.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+Collected(
+    "secretburner_secret_store_total",
+    "Secrets created in the hot store and in Postgres, and failed hot store calls.",
+    store_stats,
+    type="counter",
+    label="outcome",
+)
+
+
+class SecretStore(ABC):
+    """
+    Where the secrets of /api/secret/ are kept. A store must implement every abstract method before it can be
+    created.
+
+    `verify` is an async callable given a secret's passphrase hash, which returns whether the passphrase the
+    reader gave matches it. It is only called for passphrase protected secrets.
+    """
+
+    def accepts(self, fields: dict) -> bool:
+        """
+        Returns whether a secret created with `fields` may be kept in this store.
+        """
+        return True
+
+    @abstractmethod
+    async def acreate(self, **fields) -> Secret:
+        """
+        Creates and returns a secret with `fields`.
+        """
+
+    async def acreate_many(self, items: list) -> list:
+        """
+        Creates a secret for each dict of fields in `items`, returned in the same order.
+        """
+        return [await self.acreate(**fields) for fields in items]
+
+    @abstractmethod
+    async def aget(self, secret_id) -> Secret:
+        """
+        Returns the live secret with `secret_id` without burning it, or None. Its text may not be loaded.
+        """
+
+    @abstractmethod
+    async def aconsume(self, secret_id, verify) -> Secret:
+        """
+        Burns and returns the live secret with `secret_id` if its passphrase is verified, or returns None. Only
+        one of several concurrent readers gets the secret back.
+        """
+
+    @abstractmethod
+    async def astatus_many(self, secret_ids: list) -> dict:
+        """
+        Returns the `passphrase_protected` and `burn_at` of each live secret in `secret_ids`, keyed by secret id.
+        Secrets that aren't found are left out.
+        """
+
+    @abstractmethod
+    async def aconsume_many(self, secret_ids: list) -> dict:
+        """
+        Burns and returns the live secrets in `secret_ids` that aren't passphrase protected, keyed by secret id.
+        """
+
+
+class PostgresSecretStore(SecretStore):
+    """
+    Keeps secrets as `Secret` rows. Expired rows are filtered out by `live()` and deleted by `purge_expired`.
+    """
+
+    async def acreate(self, **fields) -> Secret:
+        return await Secret.objects.acreate(**fields)
+
+    async def acreate_many(self, items: list) -> list:
+        secrets = [Secret(**fields) for fields in items]
+
+        # bulk_create skips Secret.save(), which sets burn_at and compresses the text.
+        for secret in secrets:
+            secret.prepare()
+
+        secrets = await Secret.objects.abulk_create(secrets)
+
+        # bulk_create doesn't send post_save either, which keeps new rows' lookups off the replicas.
+        if settings.DATABASE_REPLICAS:
+            await sync_to_async(mark_written)(*secrets)
+
+        return secrets
+
+    async def aget(self, secret_id) -> Secret:
+        return (
+            await Secret.objects.live()
+            .read_only(secret_id=secret_id)
+            .without_payload()
+            .aone()
+        )
+
+    async def aconsume(self, secret_id, verify) -> Secret:
+        secrets = Secret.objects.live().filter(secret_id=secret_id)
+
+        # Most secrets are not passphrase protected, so try to claim one of those in a single statement first.
+        consumed = await secrets.filter(passphrase_hash__isnull=True).aconsume()
+
+        if not consumed:
+            passphrase_hash = await secrets.values_list(
+                "passphrase_hash", flat=True
+            ).aone()
+
+            if not passphrase_hash or not await verify(passphrase_hash):
+                return None
+
+            # only burn the secret the passphrase was checked against.
+            consumed = await secrets.filter(passphrase_hash=passphrase_hash).aconsume()
+
+        return consumed[0] if consumed else None
+
+    async def astatus_many(self, secret_ids: list) -> dict:
+        # only the columns answered, through the primary key index.
+        rows = (
+            Secret.objects.live()
+            .read_only(secret_id__in=secret_ids)
+            .values_list(
+                "secret_id",
+                "burn_at",
+                ExpressionWrapper(
+                    Q(passphrase_hash__isnull=False), output_field=BooleanField()
+                ),
+            )
+        )
+
+        return {
+            secret_id: {"passphrase_protected": protected, "burn_at": burn_at}
+            async for secret_id, burn_at, protected in rows
+        }
+
+    async def aconsume_many(self, secret_ids: list) -> dict:
+        # one DELETE ... RETURNING, so all of them are burned or none are. Attachments are left for
+        # /api/secret/retrieve/, which streams them.
+        consumed = (
+            await Secret.objects.live()
+            .filter(
+                secret_id__in=secret_ids,
+                passphrase_hash__isnull=True,
+                attachment_size__isnull=True,
+            )
+            .aconsume()
+        )
+
+        return {secret.secret_id: secret for secret in consumed}
+
+
+class RedisSecretStore(SecretStore):
+    """
+    Keeps short-lived, small secrets as Redis strings, which Redis expires by itself at the secret's burn_at.
+    Needs Redis 6.2 or later.
+
+    A stored secret is never changed, so a reader can GET it to check the passphrase and then burn it with
+    GETDEL, which deletes and returns it in one command. When readers race, only one of them gets it back from
+    GETDEL.
+    """
+
+    def __init__(self, location: str):
+        import redis
+
+        self.client = redis.Redis.from_url(
+            location,
+            socket_connect_timeout=settings.SECRET_HOT_STORE_SOCKET_TIMEOUT,
+            socket_timeout=settings.SECRET_HOT_STORE_SOCKET_TIMEOUT,
+        )
+
+    def key(self, secret_id) -> str:
+        return f"secret:{secret_id}"
+
+    def accepts(self, fields: dict) -> bool:
+        # requests are updated when fulfilled and looked up by request and fulfilment id, which only Postgres does.
+        if fields.get("request_id") or fields.get("fulfilment_id"):
+            return False
+
+        # attachments are only recorded in Postgres, see secret.attachments.
+        if fields.get("attachment_size") is not None:
+            return False
+
+        if fields.get("expiry_seconds", 0) > settings.SECRET_HOT_STORE_MAX_SECONDS:
+            return False
+
+        text = fields.get("secret_text") or ""
+        size = len(text.encode("utf-8")) + len(fields.get("secret_blob") or b"")
+        return size <= settings.SECRET_HOT_STORE_MAX_BYTES
+
+    def dumps(self, secret: Secret) -> bytes:
+        return json.dumps(
+            {
+                "secret_text": secret.secret_text,
+                "secret_codec": secret.secret_codec,
+                "secret_blob": (
+                    base64.b64encode(secret.secret_blob).decode()
+                    if secret.secret_blob
+                    else None
+                ),
+                "expiry_seconds": secret.expiry_seconds,
+                "burn_at": secret.burn_at,
+                "passphrase_hash": secret.passphrase_hash,
+                "public_key": secret.public_key,
+            }
+        ).encode()
+
+    def loads(self, secret_id, value: bytes) -> Secret:
+        data = json.loads(value)
+
+        if data["secret_blob"] is not None:
+            data["secret_blob"] = base64.b64decode(data["secret_blob"])
+
+        return Secret(secret_id=secret_id, **data)
+
+    def live(self, secret: Secret) -> bool:
+        # Redis expires keys a little after their time, see `Secret.objects.live()`.
+        return secret.burn_at >= math.ceil(timezone.now().timestamp())
+
+    async def acreate(self, **fields) -> Secret:
+        return (await self.acreate_many([fields]))[0]
+
+    async def acreate_many(self, items: list) -> list:
+        secrets = [Secret(secret_id=uuid7(), **fields) for fields in items]
+        pipe = self.client.pipeline(transaction=False)
+
+        for secret in secrets:
+            secret.prepare()
+
+            # the key expires once burn_at has passed, at the same second `live()` stops returning it.
+            pipe.set(
+                self.key(secret.secret_id),
+                self.dumps(secret),
+                exat=secret.burn_at + 1,
+                nx=True,
+            )
+
+        await sync_to_async(pipe.execute, thread_sensitive=False)()
+        return secrets
+
+    async def aget(self, secret_id) -> Secret:
+        value = await sync_to_async(self.client.get, thread_sensitive=False)(
+            self.key(secret_id)
+        )
+        if value is None:
+            return None
+
+        secret = self.loads(secret_id, value)
+        return secret if self.live(secret) else None
+
+    async def aconsume(self, secret_id, verify) -> Secret:
+        secret = await self.aget(secret_id)
+
+        if not secret:
+            return None
+
+        if secret.passphrase_hash and not await verify(secret.passphrase_hash):
+            return None
+
+        value = await sync_to_async(self.client.getdel, thread_sensitive=False)(
+            self.key(secret_id)
+        )
+
+        return self.loads(secret_id, value) if value is not None else None
+
+    async def aget_many(self, secret_ids: list) -> dict:
+        values = await sync_to_async(self.client.mget, thread_sensitive=False)(
+            [self.key(secret_id) for secret_id in secret_ids]
+        )
+
+        secrets = {
+            secret_id: self.loads(secret_id, value)
+            for secret_id, value in zip(secret_ids, values)
+            if value is not None
+        }
+
+        return {
+            secret_id: secret
+            for secret_id, secret in secrets.items()
+            if self.live(secret)
+        }
+
+    async def astatus_many(self, secret_ids: list) -> dict:
+        return {
+            secret_id: {
+                "passphrase_protected": bool(secret.passphrase_hash),
+                "burn_at": secret.burn_at,
+            }
+            for secret_id, secret in (await self.aget_many(secret_ids)).items()
+        }
+
+    async def aconsume_many(self, secret_ids: list) -> dict:
+        unprotected = [
+            secret_id
+            for secret_id, secret in (await self.aget_many(secret_ids)).items()
+            if not secret.passphrase_hash
+        ]
+
+        if not unprotected:
+            return {}
+
+        # GETDELs in one MULTI/EXEC transaction, so all of them are burned at once.
+        pipe = self.client.pipeline(transaction=True)
+        for secret_id in unprotected:
+            pipe.getdel(self.key(secret_id))
+
+        values = await sync_to_async(pipe.execute, thread_sensitive=False)()
+
+        return {
+            secret_id: self.loads(secret_id, value)
+            for secret_id, value in zip(unprotected, values)
+            if value is not None
+        }
+
+
+@lru_cache(maxsize=None)
+def get_hot_store():
+    """
+    Returns the store configured by `SECRET_HOT_STORE` for short-lived secrets, or None if there isn't one.
+    """
+    if not settings.SECRET_HOT_STORE_LOCATION:
+        return None
+
+    return import_string(settings.SECRET_HOT_STORE)(settings.SECRET_HOT_STORE_LOCATION)
+
+
+primary_store = PostgresSecretStore()
+
+
+def _stores() -> list:
+    hot_store = get_hot_store()
+    return [hot_store, primary_store] if hot_store else [primary_store]
+
+
+async def acreate_secret(**fields) -> Secret:
+    """
+    Creates a secret in the hot store if it accepts it, otherwise in Postgres. Postgres is also used when the hot
+    store can't be reached.
+    """
+    hot_store = get_hot_store()
+
+    if hot_store and hot_store.accepts(fields):
+        try:
+            secret = await hot_store.acreate(**fields)
+            _record("hot_created")
+            return secret
+
+        except Exception as e:
+            logger.warning("Secret hot store unavailable, using Postgres: %s", e)
+            _record("hot_errors")
+
+    secret = await primary_store.acreate(**fields)
+    _record("primary_created")
+    return secret
+
+
+async def acreate_secrets(items: list) -> list:
+    """
+    Creates a secret for each dict of fields in `items`, in as few round trips as possible: the ones the hot store
+    accepts in one pipeline, and the rest in one Postgres insert. See `acreate_secret`.
+
+    Returns:
+        list: The secrets, in the same order as `items`.
+    """
+    hot_store = get_hot_store()
+    secrets = [None] * len(items)
+    primary = list(range(len(items)))
+
+    if hot_store:
+        hot = [index for index in primary if hot_store.accepts(items[index])]
+
+        if hot:
+            try:
+                created = await hot_store.acreate_many([items[index] for index in hot])
+
+                for index, secret in zip(hot, created):
+                    secrets[index] = secret
+                    _record("hot_created")
+
+                primary = [index for index in primary if secrets[index] is None]
+
+            except Exception as e:
+                logger.warning("Secret hot store unavailable, using Postgres: %s", e)
+                _record("hot_errors")
+
+    if primary:
+        created = await primary_store.acreate_many([items[index] for index in primary])
+
+        for index, secret in zip(primary, created):
+            secrets[index] = secret
+            _record("primary_created")
+
+    return secrets
+
+
+async def _afind(method: str, *args) -> Secret:
+    # secret ids are unique across the stores, so the first store that has the secret holds it.
+    for store in _stores():
+        try:
+            secret = await getattr(store, method)(*args)
+
+        except Exception as e:
+            if store is primary_store:
+                raise
+
+            logger.warning("Secret hot store unavailable, skipping it: %s", e)
+            _record("hot_errors")
+            continue
+
+        if secret is not None:
+            return secret
+
+    return None
+
+
+async def _afind_many(method: str, secret_ids: list) -> dict:
+    remaining = list(dict.fromkeys(secret_id for secret_id in secret_ids if secret_id))
+    found = {}
+
+    for store in _stores():
+        if not remaining:
+            break
+
+        try:
+            found.update(await getattr(store, method)(remaining))
+
+        except Exception as e:
+            if store is primary_store:
+                raise
+
+            logger.warning("Secret hot store unavailable, skipping it: %s", e)
+            _record("hot_errors")
+            continue
+
+        remaining = [secret_id for secret_id in remaining if secret_id not in found]
+
+    return found
+
+
+async def astatus_secrets(secret_ids: list) -> dict:
+    """
+    Returns the `passphrase_protected` and `burn_at` of each live secret in `secret_ids`, keyed by secret id,
+    with one lookup per store.
+    """
+    return await _afind_many("astatus_many", secret_ids)
+
+
+async def aconsume_secrets(secret_ids: list) -> dict:
+    """
+    Burns and returns the live secrets in `secret_ids` that aren't passphrase protected, keyed by secret id.
+    Only one of several concurrent readers gets each secret back.
+
+    The burn is all-or-nothing per store, not across them: the hot store burns the secrets it holds in one
+    transaction, then the primary store burns the rest in one DELETE. When the hot store is unavailable its
+    secrets are left unburned and answered as not found. When the primary store fails after the hot store
+    burned its secrets, those are gone and the request fails, as they can't be put back unread.
+    """
+    return await _afind_many("aconsume_many", secret_ids)
+
+
+async def aget_secret(secret_id) -> Secret:
+    """
+    Returns the live secret with `secret_id` from whichever store holds it without burning it, or None.
+    """
+    if secret_id is None:
+        return None
+
+    return await _afind("aget", secret_id)
+
+
+async def aconsume_secret(secret_id, verify) -> Secret:
+    """
+    Burns and returns the live secret with `secret_id` from whichever store holds it, or returns None. See
+    `SecretStore` for `verify`.
+    """
+    if secret_id is None:
+        return None
+
+    return await _afind("aconsume", secret_id, verify)
@@ -4,6 +4,7 @@ import math
 
 from rest_framework.test import APITestCase
 from rest_framework import status
+from django.urls import resolve
 from django.utils import timezone
 from django.contrib.auth.hashers import check_password
 
@@ -179,4 +180,55 @@ class RequestAPITests(APITestCase):
             request_id=response_data.get("requestId")
         ).first()
         self.assertIsNotNone(secret.request_id)
-        self.assertEqual(secret.secret_id, response_data.get("secretId"))
+        self.assertEqual(str(secret.secret_id), response_data.get("secretId"))
+
+
+class AsyncViewTests(APITestCase):
+
+    def test_001_handlers_are_async(self):
+        # Every endpoint should be dispatched natively on the event loop rather than through sync_to_async.
+        for url in [
+            URLS.store_secret,
+            URLS.retrieve_secret,
+            "/api/secret/check/",
+            URLS.store_request,
+            "/api/request/retrieve/",
+            URLS.fulfil_request,
+            URLS.request_verification,
+            URLS.verify,
+        ]:
+            view = resolve(url).func
+            self.assertTrue(view.view_class.view_is_async, url)
+
+
+class ConsumeOnceTests(APITestCase):
+
+    def test_001_consume_returns_and_deletes(self):
+        secret = Secret.objects.create(secret_text=DEFAULT_SECRET_TEXT)
+
+        consumed = Secret.objects.filter(secret_id=secret.secret_id).consume()
+
+        self.assertEqual(len(consumed), 1)
+        self.assertEqual(consumed[0].secret_id, secret.secret_id)
+        self.assertEqual(consumed[0].secret_text, DEFAULT_SECRET_TEXT)
+        self.assertEqual(consumed[0].burn_at, secret.burn_at)
+
+        # a second claim gets nothing back.
+        self.assertEqual(
+            Secret.objects.filter(secret_id=secret.secret_id).consume(), []
+        )
+        self.assertFalse(Secret.objects.filter(secret_id=secret.secret_id).exists())
+
+    def test_002_consume_skips_expired(self):
+        secret = Secret.objects.create(secret_text=DEFAULT_SECRET_TEXT, burn_at=1)
+
+        self.assertEqual(
+            Secret.objects.live().filter(secret_id=secret.secret_id).consume(), []
+        )
+        self.assertTrue(Secret.objects.filter(secret_id=secret.secret_id).exists())
+
+    def test_003_consume_requires_filters(self):
+        with self.assertRaises(AssertionError):
+            Secret.objects.all().consume()
+
+        self.assertEqual(Secret.objects.filter(secret_id__in=[]).consume(), [])
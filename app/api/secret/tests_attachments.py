@@ -0,0 +1,303 @@
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.base.functions.ids import uuid7
+from secret.attachments import (
+    AttachmentStore,
+    FileSystemAttachmentStore,
+    iter_attachment,
+    iter_base64,
+)
+from secret.exceptions import AttachmentTooLargeError
+from secret.func import purge_expired
+from secret.models import Secret, set_burn_at
+
+
+class TempLocationMixin:
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+
+    def stored_paths(self) -> list:
+        return [
+            os.path.relpath(os.path.join(root, name), self.location)
+            for root, _, names in os.walk(self.location)
+            for name in names
+        ]
+
+
+class FileSystemAttachmentStoreTest(TempLocationMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = FileSystemAttachmentStore(self.location)
+
+    def test_01_written_in_chunks_and_burned(self):
+        secret_id, burn_at = uuid7(), set_burn_at(600)
+        content = os.urandom(2500)
+
+        size = self.store.write(secret_id, burn_at, io.BytesIO(content), 1000, 10000)
+        self.assertEqual(size, 2500)
+
+        # three chunks, under the hour the secret burns in.
+        hour = burn_at - burn_at % 3600
+        self.assertEqual(
+            sorted(self.stored_paths()),
+            [
+                os.path.join(str(hour), f"{burn_at}_{secret_id}", f"{index:08d}")
+                for index in range(3)
+            ],
+        )
+
+        blocks = iter_attachment(self.store.open(secret_id, burn_at), 1000)
+        self.assertIsNone(self.store.open(secret_id, burn_at))
+
+        # each chunk is deleted as it is reached.
+        first = next(blocks)
+        self.assertEqual(len(self.stored_paths()), 2)
+        self.assertTrue(
+            all(path.startswith(".burning") for path in self.stored_paths())
+        )
+
+        self.assertEqual(first + b"".join(blocks), content)
+        self.assertEqual(self.stored_paths(), [])
+
+    def test_01a_download_stopped_part_way(self):
+        secret_id, burn_at = uuid7(), set_burn_at(600)
+        self.store.write(secret_id, burn_at, io.BytesIO(b"x" * 2500), 1000, 10000)
+
+        blocks = iter_attachment(self.store.open(secret_id, burn_at), 1000)
+        next(blocks)
+        blocks.close()
+
+        self.assertEqual(self.stored_paths(), [])
+
+    def test_02_too_large(self):
+        with self.assertRaises(AttachmentTooLargeError):
+            self.store.write(
+                uuid7(), set_burn_at(600), io.BytesIO(b"x" * 2001), 1000, 2000
+            )
+
+        # nothing is left behind, not even the partial chunks.
+        self.assertEqual(self.stored_paths(), [])
+
+    def test_03_purge_expired(self):
+        expired, live = uuid7(), uuid7()
+        self.store.write(expired, set_burn_at(60), io.BytesIO(b"x" * 10), 1000, 2000)
+        self.store.write(live, set_burn_at(7200), io.BytesIO(b"y" * 10), 1000, 2000)
+
+        # stray files are left alone.
+        bucket = os.path.dirname(self.store.path(live, set_burn_at(7200)))
+        for stray in [
+            os.path.join(self.location, "README"),
+            os.path.join(self.location, "12"),
+            os.path.join(bucket, "notes.txt"),
+            os.path.join(bucket, "12_notes.txt"),
+        ]:
+            with open(stray, "w") as stray_file:
+                stray_file.write("stray")
+
+        with patch("secret.attachments.timezone.now") as now:
+            now.return_value.timestamp.return_value = time.time() + 3600
+            self.assertEqual(self.store.purge_expired(), (1, 10))
+
+        self.assertEqual(
+            sorted(os.path.basename(path) for path in self.stored_paths()),
+            ["00000000", "12", "12_notes.txt", "README", "notes.txt"],
+        )
+        self.assertTrue(any(str(live) in path for path in self.stored_paths()))
+
+    def test_03a_purge_abandoned_downloads(self):
+        secret_id, burn_at = uuid7(), set_burn_at(600)
+        self.store.write(secret_id, burn_at, io.BytesIO(b"x" * 10), 1000, 2000)
+        self.store.open(secret_id, burn_at)
+
+        self.store.purge_expired()
+        self.assertEqual(len(self.stored_paths()), 1)
+
+        with patch("secret.attachments.timezone.now") as now:
+            now.return_value.timestamp.return_value = time.time() + 86400 * 2
+            self.store.purge_expired()
+
+        self.assertEqual(self.stored_paths(), [])
+
+    def test_04_iter_base64(self):
+        content = os.urandom(1000)
+        blocks = [content[:1], content[1:500], content[500:501], content[501:]]
+
+        self.assertEqual(
+            "".join(iter_base64(blocks)), base64.b64encode(content).decode()
+        )
+
+    def test_05_incomplete_store(self):
+        class IncompleteStore(AttachmentStore):
+            def write(self, secret_id, burn_at, stream, chunk_size, max_bytes):
+                return 0
+
+        # a missing method fails when the store is created, not part way through a request.
+        with self.assertRaisesMessage(TypeError, "purge_expired"):
+            IncompleteStore()
+
+
+class AttachmentApiTest(TempLocationMixin, APITestCase):
+
+    content = os.urandom(5000)
+
+    def setUp(self):
+        super().setUp()
+
+        settings_override = override_settings(
+            SECRET_ATTACHMENT_LOCATION=self.location,
+            SECRET_ATTACHMENT_CHUNK_SIZE=1024,
+            SECRET_STREAM_CHUNK_SIZE=700,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    async def store(
+        self, body, query="expirySeconds=3600&attachmentName=keystore.p12", **headers
+    ):
+        return await self.async_client.post(
+            f"{reverse('api:secret:handle_store_attachment')}?{query}",
+            body,
+            content_type="application/octet-stream",
+            **headers,
+        )
+
+    async def retrieve(self, secret_id, accept="application/octet-stream", **headers):
+        return await self.async_client.post(
+            f"{reverse('api:secret:handle_retrieve_secret')}?secretId={secret_id}",
+            content_type="application/octet-stream",
+            headers={"accept": accept, **headers},
+        )
+
+    async def test_01_upload_and_download(self):
+        response = await self.store(
+            self.content, headers={"x-passphrase": "test-passphrase"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        secret_id = response.json()["secretId"]
+
+        secret = await Secret.objects.aget(secret_id=secret_id)
+        self.assertEqual(secret.attachment_name, "keystore.p12")
+        self.assertEqual(secret.attachment_size, 5000)
+        self.assertIsNone(secret.secret_text)
+        self.assertEqual(len(self.stored_paths()), 5)
+
+        response = await self.async_client.post(
+            reverse("api:secret:handle_retrieve_secret_check"),
+            {"secretId": secret_id},
+            content_type="application/json",
+        )
+        self.assertEqual(
+            response.json(),
+            {
+                "passphraseProtected": True,
+                "attachmentName": "keystore.p12",
+                "attachmentSize": 5000,
+            },
+        )
+
+        response = await self.retrieve(secret_id, **{"x-passphrase": "test-passphrase"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Length"], "5000")
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="keystore.p12"'
+        )
+        self.assertEqual(response["X-Passphrase-Encrypted"], "true")
+
+        # burned as the download starts, then deleted as it's read.
+        self.assertTrue(
+            all(path.startswith(".burning") for path in self.stored_paths())
+        )
+        self.assertFalse(await Secret.objects.filter(secret_id=secret_id).aexists())
+
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(content, self.content)
+        self.assertEqual(self.stored_paths(), [])
+
+    async def test_02_download_as_json(self):
+        secret_id = (await self.store(self.content)).json()["secretId"]
+
+        response = await self.retrieve(secret_id, accept="application/json")
+        self.assertEqual(response["Content-Type"], "application/json")
+
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(
+            base64.b64decode(json.loads(content)["secretText"]), self.content
+        )
+
+    async def test_03_left_out_of_bulk_retrieval(self):
+        secret_id = (await self.store(self.content)).json()["secretId"]
+
+        response = await self.async_client.post(
+            reverse("api:secret:handle_retrieve_secrets"),
+            {"secretIds": [secret_id]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.json()["results"][0]["detail"], "secret not found")
+        self.assertEqual(len(self.stored_paths()), 5)
+
+    async def test_04_invalid(self):
+        with override_settings(SECRET_ATTACHMENT_MAX_BYTES=4096):
+            response = await self.store(self.content)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()["errors"][0]["field"], "attachment")
+        self.assertEqual(
+            response.json()["errors"][0]["detail"],
+            "Ensure the attachment has no more than 4096 bytes.",
+        )
+
+        for body, query, field in [
+            (b"", "expirySeconds=3600&attachmentName=a", "attachment"),
+            (self.content, "expirySeconds=3600", "attachment_name"),
+        ]:
+            # the test client leaves the content type out of requests without a body.
+            response = await self.store(
+                body, query, headers={"content-type": "application/octet-stream"}
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json()["errors"][0]["field"], field)
+
+        response = await self.async_client.post(
+            reverse("api:secret:handle_store_attachment"),
+            {"expirySeconds": 3600},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+        with override_settings(SECRET_ATTACHMENT_LOCATION=""):
+            response = await self.store(self.content)
+        self.assertEqual(response.json()["detail"], "attachments are not enabled")
+
+        self.assertFalse(await Secret.objects.aexists())
+        self.assertEqual(self.stored_paths(), [])
+
+
+class PurgeAttachmentsTest(TempLocationMixin, APITestCase):
+
+    def test_01_purged_with_secrets(self):
+        store = FileSystemAttachmentStore(self.location)
+        store.write(uuid7(), set_burn_at(60), io.BytesIO(b"x" * 10), 1000, 2000)
+
+        with override_settings(SECRET_ATTACHMENT_LOCATION=self.location), patch(
+            "secret.attachments.timezone.now"
+        ) as now:
+            now.return_value.timestamp.return_value = time.time() + 120
+            result = purge_expired()
+
+        self.assertEqual(result["Attachment"], {"rows": 1, "bytes": 10})
+        self.assertEqual(self.stored_paths(), [])
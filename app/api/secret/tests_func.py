@@ -1,11 +1,21 @@
+from io import StringIO
+from django.core.management import call_command
 from django.utils import timezone
 from unittest.mock import patch
 
-from secret.func import burn_now, check_verification
+from secret.func import (
+    abind_email,
+    acheck_email_binding,
+    acheck_verification,
+    burn_now,
+    hmac_email_binding,
+    purge_expired,
+)
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth.hashers import make_password
-from .models import Verification
+from core.base.functions.crypto import token_digest
+from .models import Secret, Verification
 from .exceptions import EmailVerificationError
 
 
@@ -38,13 +48,13 @@ class TestCheckVerification(TestCase):
 
         # Set up a valid verification record
         self.verification = Verification.objects.create(
-            verified_token=self.valid_token,
+            verified_token_digest=token_digest(self.valid_token),
             recipient_email_hash=self.valid_recipient_email_hash,
             sender_email_hash=self.valid_sender_email_hash,
         )
 
-    def test_01_check_verification_success(self):
-        result = check_verification(
+    async def test_01_check_verification_success(self):
+        result = await acheck_verification(
             verified_token=self.valid_token,
             sender_email=self.valid_sender_email,
             recipient_email=self.valid_recipient_email,
@@ -52,31 +62,148 @@ class TestCheckVerification(TestCase):
         self.assertTrue(result)
         # Ensure the verification record is deleted
         self.assertIsNone(
-            Verification.objects.filter(verified_token=self.valid_token).first()
+            await Verification.objects.filter(
+                verified_token_digest=token_digest(self.valid_token)
+            ).afirst()
         )
 
-    def test_02_check_verification_invalid_token(self):
+    async def test_02_check_verification_invalid_token(self):
         with self.assertRaises(EmailVerificationError):
-            check_verification(
+            await acheck_verification(
                 self.invalid_token,
                 sender_email=self.valid_sender_email,
                 recipient_email=self.valid_recipient_email,
             )
 
-    def test_03_check_verification_invalid_sender_email(self):
+    async def test_02a_check_verification_missing_token(self):
+        # an unverified verification has no token, a missing token must not match it.
+        await Verification.objects.acreate(
+            recipient_email_hash=self.valid_recipient_email_hash,
+            sender_email_hash=self.valid_sender_email_hash,
+        )
+
+        with self.assertRaises(EmailVerificationError):
+            await acheck_verification(
+                None,
+                sender_email=self.valid_sender_email,
+                recipient_email=self.valid_recipient_email,
+            )
+
+    async def test_02b_check_verification_expired(self):
+        await Verification.objects.filter(
+            verified_token_digest=token_digest(self.valid_token)
+        ).aupdate(burn_at=0)
+
+        with self.assertRaises(EmailVerificationError):
+            await acheck_verification(
+                self.valid_token,
+                sender_email=self.valid_sender_email,
+                recipient_email=self.valid_recipient_email,
+            )
+
+    async def test_03_check_verification_invalid_sender_email(self):
         wrong_sender = "wrong@example.com"
         with self.assertRaises(EmailVerificationError):
-            check_verification(
+            await acheck_verification(
                 self.valid_token,
                 sender_email=wrong_sender,
                 recipient_email=self.valid_recipient_email,
             )
 
-    def test_04_check_verification_invalid_recipient_email(self):
+    async def test_04_check_verification_invalid_recipient_email(self):
         wrong_recipient = "wrong@example.com"
         with self.assertRaises(EmailVerificationError):
-            check_verification(
+            await acheck_verification(
                 self.valid_token,
                 sender_email=self.valid_sender_email,
                 recipient_email=wrong_recipient,
             )
+
+
+class TestEmailBinding(TestCase):
+
+    async def test_01_hmac_binding(self):
+        binding = await abind_email("sender@example.com")
+
+        self.assertEqual(binding, hmac_email_binding("sender@example.com"))
+        self.assertTrue(await acheck_email_binding("sender@example.com", binding))
+        self.assertFalse(await acheck_email_binding("wrong@example.com", binding))
+
+    async def test_02_hmac_binding_is_keyed(self):
+        binding = hmac_email_binding("sender@example.com")
+
+        with override_settings(SECRET_KEY="another-secret-key"):
+            self.assertFalse(await acheck_email_binding("sender@example.com", binding))
+
+    @override_settings(EMAIL_BINDING_MODE="argon2")
+    async def test_03_argon2_binding(self):
+        binding = await abind_email("sender@example.com")
+
+        self.assertTrue(binding.startswith("argon2$"))
+        self.assertTrue(await acheck_email_binding("sender@example.com", binding))
+        self.assertFalse(await acheck_email_binding("wrong@example.com", binding))
+
+    async def test_04_check_verification_with_hmac_binding(self):
+        await Verification.objects.acreate(
+            verified_token_digest=token_digest("hmac-token"),
+            sender_email_hash=hmac_email_binding("sender@example.com"),
+            recipient_email_hash=hmac_email_binding("recipient@example.com"),
+        )
+
+        with self.assertRaises(EmailVerificationError):
+            await acheck_verification(
+                "hmac-token",
+                sender_email="sender@example.com",
+                recipient_email="wrong@example.com",
+            )
+
+        self.assertTrue(
+            await acheck_verification(
+                "hmac-token",
+                sender_email="sender@example.com",
+                recipient_email="recipient@example.com",
+            )
+        )
+
+
+class TestPurgeExpired(TestCase):
+
+    def setUp(self):
+        for _ in range(3):
+            Secret.objects.create(secret_text="expired", burn_at=1)
+        self.live_secret = Secret.objects.create(secret_text="live")
+
+        Verification.objects.create(
+            burn_at=1, sender_email_hash="x", recipient_email_hash="y"
+        )
+        self.live_verification = Verification.objects.create(
+            sender_email_hash="x", recipient_email_hash="y"
+        )
+
+    def test_01_purge_expired(self):
+        result = purge_expired(chunk_size=2)
+
+        self.assertEqual(result["Secret"]["rows"], 3)
+        self.assertGreater(result["Secret"]["bytes"], 0)
+        self.assertEqual(result["Verification"]["rows"], 1)
+
+        # only the live rows are left.
+        self.assertEqual(
+            list(Secret.objects.values_list("pk", flat=True)),
+            [self.live_secret.pk],
+        )
+        self.assertEqual(Verification.objects.count(), 1)
+
+    def test_02_purge_expired_nothing_to_do(self):
+        purge_expired()
+
+        result = purge_expired()
+        self.assertEqual(result["Secret"], {"rows": 0, "bytes": 0})
+        self.assertEqual(result["Verification"], {"rows": 0, "bytes": 0})
+
+    def test_03_purge_expired_command(self):
+        out = StringIO()
+        call_command("purge_expired", stdout=out)
+
+        self.assertIn("Secret: purged 3 row(s)", out.getvalue())
+        self.assertIn("Verification: purged 1 row(s)", out.getvalue())
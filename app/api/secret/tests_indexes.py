@@ -0,0 +1,130 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.base.functions.crypto import token_digest
+from core.base.functions.ids import uuid7
+from .models import Secret, Verification, set_burn_at
+
+
+def explain(sql: str, params) -> str:
+    with connection.cursor() as cursor:
+        # the test tables are nearly empty, where a sequential scan is always cheapest. Turned off, the planner
+        # shows the index it would use on a full table.
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(f"EXPLAIN {sql}", params)
+        return "\n".join(row[0] for row in cursor.fetchall())
+
+
+def explain_queryset(queryset) -> str:
+    return explain(*queryset.query.sql_with_params())
+
+
+class TestLookupIndexes(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # with no statistics, or those of a nearly empty table, the planner may search the burn_at index of
+        # live() and filter the rest. Analyzed with live rows, burn_at matches all of them and isn't worth it.
+        Secret.objects.bulk_create(
+            Secret(
+                secret_id=uuid7(),
+                secret_text="text",
+                expiry_seconds=3600,
+                burn_at=set_burn_at(3600),
+            )
+            for _ in range(500)
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Secret._meta.db_table}")
+
+    def assertUsesIndex(self, plan: str, column: str):
+        # recognised by the column it's searched on, since with PARTITION_EXPIRING_TABLES each partition has its
+        # own copy of the index, named after the partition.
+        self.assertRegex(plan, rf"Index Cond: \(+{column} ")
+        self.assertNotIn("Seq Scan", plan)
+        self.assertNotIn("Sort", plan)
+
+    def test_01_secret_lookups(self):
+        secret_id = uuid7()
+
+        # /api/secret/check/, and the passphrase lookup of /api/secret/retrieve/.
+        for queryset in [
+            Secret.objects.live().read_only(secret_id=secret_id)[:1],
+            Secret.objects.live()
+            .filter(secret_id=secret_id, passphrase_hash__isnull=True)
+            .values_list("passphrase_hash", flat=True)[:1],
+        ]:
+            self.assertUsesIndex(explain_queryset(queryset), "secret_id")
+
+        # the consume-once delete of /api/secret/retrieve/.
+        self.assertUsesIndex(
+            explain(*Secret.objects.live().filter(secret_id=secret_id).consume_sql()),
+            "secret_id",
+        )
+
+    def test_01a_bulk_secret_lookups(self):
+        secret_ids = [uuid7(), uuid7()]
+
+        # /api/secret/check/bulk/ and /api/secret/retrieve/bulk/.
+        self.assertUsesIndex(
+            explain_queryset(
+                Secret.objects.live()
+                .read_only(secret_id__in=secret_ids)
+                .values_list("secret_id", "burn_at")
+            ),
+            "secret_id",
+        )
+        self.assertUsesIndex(
+            explain(
+                *Secret.objects.live()
+                .filter(secret_id__in=secret_ids, passphrase_hash__isnull=True)
+                .consume_sql()
+            ),
+            "secret_id",
+        )
+
+    def test_02_request_lookups(self):
+        self.assertUsesIndex(
+            explain_queryset(Secret.objects.live().filter(request_id=uuid7())[:1]),
+            "request_id",
+        )
+        self.assertUsesIndex(
+            explain_queryset(
+                Secret.objects.live().read_only(fulfilment_id=uuid7())[:1]
+            ),
+            "fulfilment_id",
+        )
+
+    def test_03_verification_lookups(self):
+        self.assertUsesIndex(
+            explain_queryset(Verification.objects.live().filter(verify_id=uuid7())[:1]),
+            "verify_id",
+        )
+
+        verifications = Verification.objects.live().filter(
+            verified_token_digest=token_digest("token")
+        )
+        self.assertUsesIndex(
+            explain_queryset(verifications[:1]), "verified_token_digest"
+        )
+        self.assertUsesIndex(
+            explain(*verifications.consume_sql()), "verified_token_digest"
+        )
+
+    def test_04_purge_uses_burn_at_index(self):
+        queryset = Secret.objects.filter(burn_at__lt=1).order_by("burn_at")[:100]
+
+        self.assertRegex(explain_queryset(queryset), r"Index Cond: \(burn_at < ")
+
+    def test_05_lookups_are_not_ordered(self):
+        queryset = Secret.objects.live().filter(request_id=uuid7())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNone(queryset.one())
+            self.assertIsNone(queryset.first())
+
+        one, first = [query["sql"] for query in queries.captured_queries]
+        self.assertNotIn("ORDER BY", one)
+        self.assertIn("ORDER BY", first)
@@ -0,0 +1,112 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from secret.func import purge_expired
+from secret.partitions import (
+    create_partition,
+    create_upcoming_partitions,
+    drop_expired_partitions,
+    is_partitioned,
+    list_partitions,
+    partition_bounds,
+    partition_name,
+    partition_table,
+    unpartition_table,
+)
+from .models import Secret, Verification
+
+
+@override_settings(PARTITION_INTERVAL="hour", PARTITION_PREMAKE=2)
+class TestPartitions(TestCase):
+
+    def setUp(self):
+        # start from a plain table, also when the migrations partitioned it (PARTITION_EXPIRING_TABLES).
+        unpartition_table(Secret)
+
+        self.expired_secret = Secret.objects.create(secret_text="expired", burn_at=1)
+        self.live_secret = Secret.objects.create(secret_text="live")
+
+        partition_table(Secret)
+
+    def test_01_partition_bounds(self):
+        self.assertEqual(partition_bounds(7300, "hour"), (7200, 10800))
+        self.assertEqual(partition_bounds(7300, "day"), (0, 86400))
+        self.assertEqual(
+            partition_name("secret_secret", 7200), "secret_secret_p1970010102"
+        )
+
+    def test_02_partition_table_keeps_rows(self):
+        self.assertTrue(is_partitioned(Secret))
+        self.assertEqual(
+            is_partitioned(Verification), settings.PARTITION_EXPIRING_TABLES
+        )
+
+        # the current partition plus PARTITION_PREMAKE upcoming ones.
+        self.assertEqual(len(list_partitions(Secret)), 3)
+
+        self.assertEqual(Secret.objects.count(), 2)
+        self.assertEqual(Secret.objects.live().get().secret_text, "live")
+
+        # partitioning twice is a no-op.
+        partition_table(Secret)
+        self.assertEqual(len(list_partitions(Secret)), 3)
+
+    def test_03_new_rows_and_consume(self):
+        secret = Secret.objects.create(secret_text="new")
+
+        consumed = Secret.objects.filter(pk=secret.pk).consume()
+
+        self.assertEqual([s.secret_text for s in consumed], ["new"])
+        self.assertFalse(Secret.objects.filter(pk=secret.pk).exists())
+
+    def test_04_drop_expired_partitions(self):
+        start, end = partition_bounds(self.expired_secret.burn_at, "hour")
+
+        # the expired row is moved out of the default partition into the new one.
+        name = create_partition(Secret, start, end)
+        self.assertIn(name, [p[0] for p in list_partitions(Secret)])
+
+        dropped, size = drop_expired_partitions(Secret)
+
+        self.assertEqual(dropped, 1)
+        self.assertGreater(size, 0)
+        self.assertNotIn(name, [p[0] for p in list_partitions(Secret)])
+        self.assertFalse(Secret.objects.filter(pk=self.expired_secret.pk).exists())
+
+    def test_05_purge_expired(self):
+        result = purge_expired()
+
+        # the expired row was in the default partition, so it is deleted as a row.
+        self.assertEqual(result["Secret"]["rows"], 1)
+        self.assertEqual(
+            list(Secret.objects.values_list("pk", flat=True)),
+            [self.live_secret.pk],
+        )
+
+    def test_06_unpartition_table(self):
+        unpartition_table(Secret)
+
+        self.assertFalse(is_partitioned(Secret))
+        self.assertEqual(Secret.objects.count(), 2)
+
+    def test_07_interval_changed(self):
+        # the hourly partitions made in setUp overlap the daily ones, which are only made where they leave room.
+        create_upcoming_partitions(Secret, interval="day", ahead=1)
+
+        partitions = list_partitions(Secret)
+        self.assertGreater(len(partitions), 3)
+
+        for (_, _, end), (_, next_start, _) in zip(partitions, partitions[1:]):
+            self.assertEqual(end, next_start)
+
+        self.assertEqual(purge_expired()["Secret"]["rows"], 1)
+
+    def test_08_purge_survives_partition_errors(self):
+        with patch(
+            "secret.func.maintain_partitions", side_effect=RuntimeError("overlap")
+        ), self.assertLogs("secret.func", "ERROR"):
+            result = purge_expired()
+
+        self.assertEqual(result["Secret"]["rows"], 1)
@@ -0,0 +1,288 @@
+import time
+from unittest.mock import patch
+
+from django.contrib.auth.hashers import make_password
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.base.functions.ids import uuid7
+from secret.models import Secret
+from secret.storage import RedisSecretStore, SecretStore, store_stats
+
+
+class FakeRedis:
+    """
+    The Redis string commands used by RedisSecretStore, kept in a dict.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.expire_at = {}
+
+    def set(self, key, value, exat=None, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        self.expire_at[key] = exat
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def getdel(self, key):
+        self.expire_at.pop(key, None)
+        return self.values.pop(key, None)
+
+
+class FakePipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+
+        return command
+
+    def execute(self):
+        return [
+            getattr(self.client, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+
+
+class RedisSecretStoreTest(APITestCase):
+
+    def setUp(self):
+        self.store = RedisSecretStore("redis://localhost:6379/0")
+        self.store.client = FakeRedis()
+
+        patcher = patch("secret.storage.get_hot_store", return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def store_secret(self, **payload):
+        payload = {"secret_text": "short lived", "expiry_seconds": 600, **payload}
+        response = self.client.post(
+            reverse("api:secret:handle_store_secret"), payload, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data
+
+    def check(self, secret_id):
+        return self.client.post(
+            reverse("api:secret:handle_retrieve_secret_check"),
+            {"secret_id": secret_id},
+            format="json",
+        )
+
+    def retrieve(self, secret_id, **payload):
+        return self.client.post(
+            reverse("api:secret:handle_retrieve_secret"),
+            {"secret_id": secret_id, **payload},
+            format="json",
+        )
+
+    def test_01_short_lived_secret_kept_in_redis(self):
+        hot_created = store_stats()["hot_created"]
+        data = self.store_secret()
+
+        self.assertEqual(store_stats()["hot_created"], hot_created + 1)
+        self.assertFalse(Secret.objects.filter(secret_id=data["secret_id"]).exists())
+
+        # Redis expires the key once burn_at has passed.
+        key = f"secret:{data['secret_id']}"
+        self.assertEqual(self.store.client.expire_at[key], data["burn_at"] + 1)
+
+        response = self.check(data["secret_id"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["passphrase_protected"], False)
+
+        response = self.retrieve(data["secret_id"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["secret_text"], "short lived")
+        self.assertEqual(response.data["burn_at"], data["burn_at"])
+
+        # burned by the first read.
+        self.assertEqual(self.store.client.values, {})
+        response = self.retrieve(data["secret_id"])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["detail"], "secret not found")
+
+    def test_02_passphrase_protected(self):
+        data = self.store_secret(passphrase="test-passphrase")
+
+        self.assertEqual(
+            self.check(data["secret_id"]).data["passphrase_protected"], True
+        )
+
+        response = self.retrieve(data["secret_id"], passphrase="wrong-passphrase")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.retrieve(data["secret_id"])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # a wrong passphrase doesn't burn the secret.
+        response = self.retrieve(data["secret_id"], passphrase="test-passphrase")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["passphrase_encrypted"], True)
+        self.assertEqual(self.store.client.values, {})
+
+    def test_03_large_secret_compressed(self):
+        secret_text = "KEY=value\n" * 1000 + "END=1"
+        data = self.store_secret(secret_text=secret_text)
+
+        stored = self.store.client.values[f"secret:{data['secret_id']}"]
+        self.assertLess(len(stored), len(secret_text))
+
+        response = self.retrieve(data["secret_id"])
+        self.assertEqual(response.data["secret_text"], secret_text)
+
+    def test_04_kept_in_postgres(self):
+        # long-lived and large secrets.
+        for payload in [
+            {"expiry_seconds": 3601},
+            {"secret_text": "x" * 65537},
+        ]:
+            data = self.store_secret(**payload)
+            self.assertTrue(Secret.objects.filter(secret_id=data["secret_id"]).exists())
+
+        # requests, which are updated when fulfilled.
+        response = self.client.post(
+            reverse("api:request:handle_store_request"),
+            {"expiry_seconds": 600},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(
+            Secret.objects.filter(secret_id=response.data["secret_id"]).exists()
+        )
+
+        self.assertEqual(self.store.client.values, {})
+
+    def test_05_postgres_secrets_found_through_redis(self):
+        secret = Secret.objects.create(
+            secret_text="in postgres",
+            expiry_seconds=600,
+            passphrase_hash=make_password("test-passphrase"),
+        )
+
+        self.assertEqual(
+            self.check(secret.secret_id).data["passphrase_protected"], True
+        )
+
+        response = self.retrieve(secret.secret_id, passphrase="test-passphrase")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["secret_text"], "in postgres")
+        self.assertFalse(Secret.objects.filter(secret_id=secret.secret_id).exists())
+
+    def test_06_redis_unavailable(self):
+        hot_errors = store_stats()["hot_errors"]
+
+        with patch.object(self.store.client, "set", side_effect=TimeoutError("slow")):
+            data = self.store_secret()
+
+        # stored in Postgres instead, and still found while redis is down.
+        self.assertTrue(Secret.objects.filter(secret_id=data["secret_id"]).exists())
+
+        with patch.object(self.store.client, "get", side_effect=TimeoutError("slow")):
+            response = self.retrieve(data["secret_id"])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(store_stats()["hot_errors"], hot_errors + 2)
+
+    def test_07_expired_and_raced(self):
+        data = self.store_secret()
+        key = f"secret:{data['secret_id']}"
+        value = self.store.client.values[key]
+
+        # a key Redis hasn't expired yet is still not returned after burn_at.
+        with patch("secret.storage.timezone.now") as now:
+            now.return_value.timestamp.return_value = time.time() + 601
+            self.assertEqual(self.check(data["secret_id"]).status_code, 400)
+
+        # another reader burned the secret between the GET and the GETDEL.
+        with patch.object(self.store.client, "getdel", return_value=None):
+            response = self.retrieve(data["secret_id"])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.store.client.values[key], value)
+
+    def test_08_bulk_create_across_stores(self):
+        response = self.client.post(
+            reverse("api:secret:handle_store_secrets"),
+            {
+                "secret_text": "shared",
+                "expiry_seconds": 600,
+                "secrets": [{}, {"expiry_seconds": 7200}, {}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        hot, primary, hot_again = [
+            result["secret_id"] for result in response.data["results"]
+        ]
+        self.assertEqual(
+            set(self.store.client.values),
+            {f"secret:{hot}", f"secret:{hot_again}"},
+        )
+        self.assertEqual(
+            [
+                str(secret_id)
+                for secret_id in Secret.objects.values_list("pk", flat=True)
+            ],
+            [primary],
+        )
+
+    def test_09_bulk_check_and_retrieve_across_stores(self):
+        hot = self.store_secret(secret_text="hot")["secret_id"]
+        protected = self.store_secret(passphrase="test-passphrase")["secret_id"]
+        primary = self.store_secret(secret_text="primary", expiry_seconds=7200)[
+            "secret_id"
+        ]
+        secret_ids = [hot, protected, primary, str(uuid7())]
+
+        response = self.client.post(
+            reverse("api:secret:handle_retrieve_secrets_check"),
+            {"secret_ids": secret_ids},
+            format="json",
+        )
+        self.assertEqual(
+            [
+                (result["exists"], result["passphrase_protected"])
+                for result in response.data["results"]
+            ],
+            [(True, False), (True, True), (True, False), (False, None)],
+        )
+
+        response = self.client.post(
+            reverse("api:secret:handle_retrieve_secrets"),
+            {"secret_ids": secret_ids},
+            format="json",
+        )
+        self.assertEqual(
+            [result.get("secret_text") for result in response.data["results"]],
+            ["hot", None, "primary", None],
+        )
+
+        # the passphrase protected secret is left for /api/secret/retrieve/.
+        self.assertEqual(list(self.store.client.values), [f"secret:{protected}"])
+        self.assertFalse(Secret.objects.exists())
+
+    def test_10_incomplete_store(self):
+        class IncompleteStore(SecretStore):
+            async def acreate(self, **fields):
+                return None
+
+        # a missing method fails when the store is created, not part way through a request.
+        with self.assertRaisesMessage(TypeError, "aconsume"):
+            IncompleteStore()
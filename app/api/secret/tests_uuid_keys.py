@@ -0,0 +1,116 @@
+from uuid import UUID, uuid4
+
+from django.db import IntegrityError, connection, models
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import isolate_apps
+
+from secret.partitions import partition_table
+from secret.uuid_keys import convert_to_uuid
+from .models import Secret
+
+
+def column_types(table: str) -> dict:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = %s",
+            [table],
+        )
+        return dict(cursor.fetchall())
+
+
+def index_names(table: str) -> set:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+        return {row[0] for row in cursor.fetchall()}
+
+
+@isolate_apps("secret")
+class TestConvertToUUID(TransactionTestCase):
+
+    def setUp(self):
+        # a table keyed like the secrets were before 0004_uuid_keys.
+        class TextKeyed(models.Model):
+            key = models.TextField(primary_key=True)
+            reference = models.TextField(null=True, db_index=True)
+            burn_at = models.BigIntegerField()
+
+            class Meta:
+                app_label = "secret"
+                db_table = "secret_uuid_keys_test"
+
+        self.model = TextKeyed
+        self.table = TextKeyed._meta.db_table
+
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(TextKeyed)
+
+        self.ids = [str(uuid4()) for _ in range(5)]
+
+        with connection.cursor() as cursor:
+            for key in self.ids:
+                cursor.execute(
+                    f"INSERT INTO {self.table} (key, reference, burn_at) VALUES (%s, %s, 9999999999)",
+                    [key, key.upper()],
+                )
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table} CASCADE")
+
+    def test_01_convert_existing_rows(self):
+        indexes = index_names(self.table)
+
+        with connection.schema_editor(atomic=False) as schema_editor:
+            convert_to_uuid(
+                schema_editor, self.model, indexed=["reference"], chunk_size=2
+            )
+
+        types = column_types(self.table)
+        self.assertEqual(types["key"], "uuid")
+        self.assertEqual(types["reference"], "uuid")
+        self.assertFalse(any("__uuid" in column for column in types))
+
+        # the same index names, less the "_like" indexes that only text columns have.
+        self.assertEqual(
+            index_names(self.table), {i for i in indexes if not i.endswith("_like")}
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT key, reference FROM {self.table} ORDER BY key")
+            self.assertEqual(
+                cursor.fetchall(),
+                sorted((UUID(key), UUID(key)) for key in self.ids),
+            )
+
+            # the key is still the primary key.
+            with self.assertRaises(IntegrityError):
+                cursor.execute(
+                    f"INSERT INTO {self.table} (key, burn_at) VALUES (%s, 0)",
+                    [self.ids[0]],
+                )
+
+    def test_02_convert_partitioned_table(self):
+        partition_table(self.model)
+
+        with connection.schema_editor(atomic=False) as schema_editor:
+            convert_to_uuid(schema_editor, self.model, indexed=["reference"])
+
+        self.assertEqual(column_types(self.table)["key"], "uuid")
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {self.table} WHERE key = ANY(%s)",
+                [[UUID(key) for key in self.ids]],
+            )
+            self.assertEqual(cursor.fetchone()[0], 5)
+
+
+class TestUUIDKeys(TestCase):
+
+    def test_01_time_ordered_keys(self):
+        first = Secret.objects.create(secret_text="first")
+        second = Secret.objects.create(secret_text="second")
+
+        self.assertIsInstance(first.secret_id, UUID)
+        self.assertEqual(first.secret_id.version, 7)
+        self.assertLessEqual(first.secret_id.int >> 80, second.secret_id.int >> 80)
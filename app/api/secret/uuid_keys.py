@@ -0,0 +1,192 @@
+from django.db import transaction
+
+from secret.partitions import is_partitioned
+
+# rows converted per UPDATE while backfilling, each in its own transaction.
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def _shadow(column: str) -> str:
+    return f"{column}__uuid"
+
+
+def _index_name(schema_editor, table: str, column: str, suffix: str = "") -> str:
+    # the names Django gives the indexes of db_index fields, so later migrations can find them.
+    return schema_editor._create_index_name(table, [column], suffix=suffix)
+
+
+def _primary_key_name(cursor, table: str) -> str:
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+        [table],
+    )
+    return cursor.fetchone()[0]
+
+
+def convert_to_uuid(
+    schema_editor, model, indexed: list = (), chunk_size: int = BACKFILL_CHUNK_SIZE
+):
+    """
+    Changes `model`'s text primary key and its `indexed` text columns to native uuid columns, without locking
+    the table for longer than it takes to swap the columns.
+
+    Altering a column's type rewrites the whole table and its indexes under an exclusive lock, which stops every
+    request for as long as that takes. Instead this:
+
+    1. adds a nullable uuid column next to each text column, and a trigger that fills it on every insert and
+       update, so rows written by the running code are converted as they are written.
+    2. converts the existing rows in short transactions of `chunk_size` rows.
+    3. builds the new indexes with CREATE INDEX CONCURRENTLY, and proves the new primary key has no NULLs with a
+       NOT VALID check constraint that is then validated, neither of which blocks reads or writes.
+    4. in one short transaction, drops the text columns and the trigger, renames the uuid columns and indexes
+       to the old names and makes the new unique index the primary key. The validated check lets Postgres set
+       NOT NULL without scanning the table again.
+
+    Code still running against the text columns keeps working after the swap, as Postgres casts its string IDs
+    to uuid. It has to be called outside a transaction, i.e. from a non-atomic migration.
+
+    Partitioned tables (see `secret.partitions`) can't have indexes built concurrently or a primary key made
+    from an existing index, so they are altered in place instead, which rewrites each partition under lock.
+    """
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+    table, primary_key = model._meta.db_table, model._meta.pk.column
+    columns = [primary_key, *indexed]
+
+    if is_partitioned(model, connection.alias):
+        alter_column_types(schema_editor, table, columns, "uuid")
+        return
+
+    trigger = f"{table}__uuid_sync"
+
+    with connection.cursor() as cursor:
+        for column in columns:
+            cursor.execute(
+                f"ALTER TABLE {qn(table)} ADD COLUMN IF NOT EXISTS {qn(_shadow(column))} uuid"
+            )
+
+        assignments = "; ".join(
+            f"NEW.{qn(_shadow(column))} := NEW.{qn(column)}::uuid" for column in columns
+        )
+        cursor.execute(f"""
+            CREATE OR REPLACE FUNCTION {qn(trigger)}() RETURNS trigger AS $$
+            BEGIN {assignments}; RETURN NEW; END
+            $$ LANGUAGE plpgsql
+            """)
+        cursor.execute(f"DROP TRIGGER IF EXISTS {qn(trigger)} ON {qn(table)}")
+        cursor.execute(f"""
+            CREATE TRIGGER {qn(trigger)} BEFORE INSERT OR UPDATE ON {qn(table)}
+            FOR EACH ROW EXECUTE FUNCTION {qn(trigger)}()
+            """)
+
+        updates = ", ".join(
+            f"{qn(_shadow(column))} = {qn(column)}::uuid" for column in columns
+        )
+        while True:
+            cursor.execute(
+                f"""
+                UPDATE {qn(table)} SET {updates}
+                WHERE {qn(primary_key)} IN (
+                    SELECT {qn(primary_key)} FROM {qn(table)}
+                    WHERE {qn(_shadow(primary_key))} IS NULL
+                    LIMIT %s
+                )
+                """,
+                [chunk_size],
+            )
+            if cursor.rowcount < chunk_size:
+                break
+
+        new_primary_key = f"{table}__uuid_pkey"
+        cursor.execute(
+            f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {qn(new_primary_key)} "
+            f"ON {qn(table)} ({qn(_shadow(primary_key))})"
+        )
+        for column in indexed:
+            cursor.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {qn(_shadow(column))} "
+                f"ON {qn(table)} ({qn(_shadow(column))})"
+            )
+
+        not_null = f"{table}__uuid_pkey_not_null"
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} DROP CONSTRAINT IF EXISTS {qn(not_null)}"
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(not_null)} "
+            f"CHECK ({qn(_shadow(primary_key))} IS NOT NULL) NOT VALID"
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} VALIDATE CONSTRAINT {qn(not_null)}")
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"DROP TRIGGER {qn(trigger)} ON {qn(table)}")
+        cursor.execute(f"DROP FUNCTION {qn(trigger)}()")
+
+        primary_key_name = _primary_key_name(cursor, table)
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} DROP CONSTRAINT {qn(primary_key_name)}"
+        )
+
+        for column in columns:
+            # dropping a column only marks it as dropped, along with its indexes.
+            cursor.execute(f"ALTER TABLE {qn(table)} DROP COLUMN {qn(column)}")
+            cursor.execute(
+                f"ALTER TABLE {qn(table)} RENAME COLUMN {qn(_shadow(column))} TO {qn(column)}"
+            )
+
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(primary_key)} SET NOT NULL"
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} DROP CONSTRAINT {qn(not_null)}")
+        cursor.execute(
+            f"ALTER INDEX {qn(new_primary_key)} RENAME TO {qn(primary_key_name)}"
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(primary_key_name)} "
+            f"PRIMARY KEY USING INDEX {qn(primary_key_name)}"
+        )
+
+        for column in indexed:
+            cursor.execute(
+                f"ALTER INDEX {qn(_shadow(column))} "
+                f"RENAME TO {qn(_index_name(schema_editor, table, column))}"
+            )
+
+
+def convert_to_text(schema_editor, model, indexed: list = ()):
+    """
+    Reverses `convert_to_uuid`, altering the columns back to text in place.
+    """
+    alter_column_types(
+        schema_editor, model._meta.db_table, [model._meta.pk.column, *indexed], "text"
+    )
+
+
+def alter_column_types(schema_editor, table: str, columns: list, db_type: str):
+    """
+    Alters the indexed `columns` to `db_type` in one transaction, rewriting the table. Django gives indexed text
+    columns a second `_like` index for LIKE queries, which is dropped going to uuid and recreated going back to
+    text.
+    """
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for column in columns:
+            cursor.execute(
+                f"DROP INDEX IF EXISTS {qn(_index_name(schema_editor, table, column, '_like'))}"
+            )
+
+        for column in columns:
+            cursor.execute(
+                f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(column)} "
+                f"TYPE {db_type} USING {qn(column)}::{db_type}"
+            )
+
+        if db_type == "text":
+            for column in columns:
+                cursor.execute(
+                    f"CREATE INDEX {qn(_index_name(schema_editor, table, column, '_like'))} "
+                    f"ON {qn(table)} ({qn(column)} text_pattern_ops)"
+                )
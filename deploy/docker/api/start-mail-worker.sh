@@ -0,0 +1,6 @@
+#!/bin/sh
+# Sends the emails the API queues in the outbox. Run it as its own process, restarted if it stops, so mail keeps
+# being sent if it crashes.
+echo "Starting Mail Worker"
+
+exec python /app/manage.py send_queued_mail